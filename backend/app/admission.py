@@ -0,0 +1,239 @@
+"""
+Admission control for LLM generation.
+
+Token buckets limit requests and model tokens (prompt_tokens + response_tokens)
+per user and globally, and a concurrency cap limits simultaneous model calls.
+A share of the global capacity is reserved for interactive requests, so
+background work (pre-generation, prefetch) cannot starve students who are
+waiting on a slide. Requests over budget are rejected with a retry-after hint
+instead of joining an unbounded queue.
+"""
+
+import os
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+
+ADMISSION_USER_REQUESTS_PER_MINUTE = float(os.getenv("ADMISSION_USER_REQUESTS_PER_MINUTE", "20"))
+ADMISSION_GLOBAL_REQUESTS_PER_MINUTE = float(os.getenv("ADMISSION_GLOBAL_REQUESTS_PER_MINUTE", "600"))
+ADMISSION_USER_TOKENS_PER_HOUR = float(os.getenv("ADMISSION_USER_TOKENS_PER_HOUR", "300000"))
+ADMISSION_GLOBAL_TOKENS_PER_MINUTE = float(os.getenv("ADMISSION_GLOBAL_TOKENS_PER_MINUTE", "1000000"))
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+# Fraction of global capacity only interactive requests may use
+ADMISSION_INTERACTIVE_RESERVED = float(os.getenv("ADMISSION_INTERACTIVE_RESERVED", "0.25"))
+# Idle per-user buckets are dropped once there are more than this many
+ADMISSION_MAX_TRACKED_USERS = 10000
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is over budget"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Classic token bucket; post-charging may push the level below zero (debt)"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def available(self, floor: float = 0.0) -> Tuple[bool, float]:
+        """Whether the level is above floor, and the seconds until it will be"""
+        self._refill()
+        if self.level > floor:
+            return True, 0.0
+        return False, (floor - self.level + 1) / self.refill_per_second
+
+    def check(self, amount: float, floor: float = 0.0) -> Tuple[bool, float]:
+        """Whether amount can be taken while staying at or above floor"""
+        self._refill()
+        if self.level - amount >= floor:
+            return True, 0.0
+        return False, (amount + floor - self.level) / self.refill_per_second
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.level >= self.capacity
+
+
+class AdmissionController:
+    """Per-user and global request/token budgets plus a concurrency cap"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.global_requests = TokenBucket(ADMISSION_GLOBAL_REQUESTS_PER_MINUTE, ADMISSION_GLOBAL_REQUESTS_PER_MINUTE / 60)
+        self.global_tokens = TokenBucket(ADMISSION_GLOBAL_TOKENS_PER_MINUTE, ADMISSION_GLOBAL_TOKENS_PER_MINUTE / 60)
+        self.user_requests: Dict[str, TokenBucket] = {}
+        self.user_tokens: Dict[str, TokenBucket] = {}
+        self.in_flight = {"interactive": 0, "background": 0}
+        self.counters = {"admitted": 0, "rejected": 0, "tokens_charged": 0}
+
+    def _user_buckets(self, user_id: str) -> Tuple[TokenBucket, TokenBucket]:
+        if user_id not in self.user_requests:
+            if len(self.user_requests) >= ADMISSION_MAX_TRACKED_USERS:
+                self._prune_idle_users()
+            self.user_requests[user_id] = TokenBucket(
+                ADMISSION_USER_REQUESTS_PER_MINUTE, ADMISSION_USER_REQUESTS_PER_MINUTE / 60
+            )
+            self.user_tokens[user_id] = TokenBucket(
+                ADMISSION_USER_TOKENS_PER_HOUR, ADMISSION_USER_TOKENS_PER_HOUR / 3600
+            )
+        return self.user_requests[user_id], self.user_tokens[user_id]
+
+    def _prune_idle_users(self) -> None:
+        idle = [
+            user_id for user_id in self.user_requests
+            if self.user_requests[user_id].is_full and self.user_tokens[user_id].is_full
+        ]
+        for user_id in idle:
+            del self.user_requests[user_id]
+            del self.user_tokens[user_id]
+
+    def _reject(self, reason: str, retry_after: float) -> None:
+        self.counters["rejected"] += 1
+        raise AdmissionRejected(reason, retry_after)
+
+    def _try_admit(self, user_id: str, interactive: bool) -> None:
+        kind = "interactive" if interactive else "background"
+        user_requests, user_tokens = self._user_buckets(user_id)
+
+        # Background work must leave the reserved share of global capacity untouched
+        reserved = 0.0 if interactive else ADMISSION_INTERACTIVE_RESERVED
+        max_concurrent = ADMISSION_MAX_CONCURRENT
+        if not interactive:
+            max_concurrent = max(1, int(ADMISSION_MAX_CONCURRENT * (1 - ADMISSION_INTERACTIVE_RESERVED)))
+
+        if sum(self.in_flight.values()) >= ADMISSION_MAX_CONCURRENT or (
+            not interactive and self.in_flight["background"] >= max_concurrent
+        ):
+            self._reject("Too many concurrent generations", 1.0)
+
+        ok, wait = user_requests.check(1)
+        if not ok:
+            self._reject("Per-user request budget exceeded", wait)
+
+        ok, wait = self.global_requests.check(1, floor=self.global_requests.capacity * reserved)
+        if not ok:
+            self._reject("Global request budget exceeded", wait)
+
+        # Token usage is only known afterwards, so require a positive balance now
+        ok, wait = user_tokens.available()
+        if not ok:
+            self._reject("Per-user token budget exceeded", wait)
+
+        ok, wait = self.global_tokens.available(floor=self.global_tokens.capacity * reserved)
+        if not ok:
+            self._reject("Global token budget exceeded", wait)
+
+        user_requests.take(1)
+        self.global_requests.take(1)
+        self.in_flight[kind] += 1
+        self.counters["admitted"] += 1
+
+    @contextmanager
+    def admit(self, user_id: str, interactive: bool = True):
+        """
+        Hold an admission slot for one generation.
+
+        Raises:
+            AdmissionRejected: if the request is over budget
+        """
+        kind = "interactive" if interactive else "background"
+        with self._lock:
+            self._try_admit(user_id, interactive)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight[kind] -= 1
+
+    @contextmanager
+    def admit_waiting(self, user_id: str, max_wait_seconds: float = 300.0, deadline: Optional[float] = None):
+        """
+        Background admission that sleeps until budget is available (worker threads only).
+        deadline (time.monotonic()) stops the wait earlier, e.g. before the caller's own
+        timeout abandons the work.
+
+        Raises:
+            AdmissionRejected: if budget will not be available before the deadline
+        """
+        wait_deadline = time.monotonic() + max_wait_seconds
+        deadline = min(deadline, wait_deadline) if deadline is not None else wait_deadline
+        while True:
+            try:
+                with self._lock:
+                    self._try_admit(user_id, interactive=False)
+                break
+            except AdmissionRejected as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    raise
+                time.sleep(e.retry_after)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight["background"] -= 1
+
+    def charge(self, user_id: str, metadata: Optional[Dict[str, Any]]) -> int:
+        """Charge the tokens a model call actually used (cache hits are free)"""
+        if not metadata or metadata.get("cache_hit") or metadata.get("coalesced"):
+            return 0
+
+        tokens = (metadata.get("prompt_tokens") or 0) + (metadata.get("response_tokens") or 0)
+        if tokens <= 0:
+            return 0
+
+        with self._lock:
+            _, user_tokens = self._user_buckets(user_id)
+            user_tokens.take(tokens)
+            self.global_tokens.take(tokens)
+            self.counters["tokens_charged"] += tokens
+        return tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self.global_requests._refill()
+            self.global_tokens._refill()
+            return {
+                **self.counters,
+                "in_flight": dict(self.in_flight),
+                "global_requests_available": round(self.global_requests.level, 1),
+                "global_tokens_available": round(self.global_tokens.level),
+                "tracked_users": len(self.user_requests)
+            }
+
+
+# Singleton instance
+_admission_instance: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get or create the admission controller singleton"""
+    global _admission_instance
+
+    if _admission_instance is None:
+        _admission_instance = AdmissionController()
+
+    return _admission_instance
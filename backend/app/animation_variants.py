@@ -0,0 +1,377 @@
+"""
+Bandwidth-adaptive variants of rendered animations.
+
+Every client used to download the one mp4 a scene was rendered to, so students
+on weak connections waited for the full file before playback started. After a
+render is published, this stage encodes smaller renditions next to it in the
+render cache (a low-bitrate 360p mp4, a 720p mp4 for 1080p renders, and a VP9
+WebM at the source resolution, which is much smaller for Manim's flat colors)
+plus a full-resolution poster frame to show while the video loads.
+
+Renditions are recorded on the render cache entry and on slides showing the
+video (video_renditions, poster_url). select_rendition picks what to serve
+from the client hints browsers send once asked to (Save-Data, Downlink, ECT):
+constrained clients get the smallest mp4, everyone else the WebM with the mp4
+as fallback.
+
+Encoding runs ffmpeg (already required by manim) on a small background pool,
+under the same resource limits as renders, so it never delays publishing.
+
+Usage (encode variants of cache entries published before this stage existed):
+    cd backend/app
+    python animation_variants.py
+"""
+
+import os
+import json
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import cv2
+
+from render_cache import RenderCache, _atomic_publish_file
+from render_service import (
+    get_render_service, animation_url, local_animation_url, RenderService, RenderJob, QUALITY_DIRS
+)
+from render_sandbox import (
+    limited_command, limits_for, job_workdir, remove_workdir, wait_with_usage, kill_process_group
+)
+from thumbnails import generate_thumbnail
+
+ANIMATION_VARIANTS = os.getenv("ANIMATION_VARIANTS", "true").lower() == "true"
+VARIANT_WORKERS = int(os.getenv("VARIANT_WORKERS", "1"))
+VARIANT_TIMEOUT_SECONDS = float(os.getenv("VARIANT_TIMEOUT_SECONDS", "300"))
+# Below this downlink (Mbps, as reported by the Downlink client hint) clients get the smallest rendition
+VARIANT_LOW_DOWNLINK_MBPS = float(os.getenv("VARIANT_LOW_DOWNLINK_MBPS", "1.5"))
+
+# Effective connection types (ECT client hint) treated as constrained
+SLOW_CONNECTION_TYPES = {"slow-2g", "2g", "3g"}
+
+# Renditions from smallest to largest; height None keeps the source resolution,
+# and downscaling profiles are skipped for sources no taller than their height
+VARIANT_PROFILES = {
+    "360p": {
+        "format": "mp4",
+        "height": 360,
+        "args": [
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main", "-pix_fmt", "yuv420p",
+            "-b:v", "250k", "-maxrate", "300k", "-bufsize", "600k", "-movflags", "+faststart"
+        ]
+    },
+    "720p": {
+        "format": "mp4",
+        "height": 720,
+        "args": [
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main", "-pix_fmt", "yuv420p",
+            "-b:v", "1200k", "-maxrate", "1500k", "-bufsize", "3000k", "-movflags", "+faststart"
+        ]
+    },
+    "webm": {
+        "format": "webm",
+        "height": None,
+        "args": ["-c:v", "libvpx-vp9", "-b:v", "0", "-crf", "40", "-row-mt", "1", "-deadline", "good", "-cpu-used", "4"]
+    },
+}
+
+MIME_TYPES = {"mp4": "video/mp4", "webm": "video/webm"}
+
+
+def video_height(video_path: Path) -> Optional[int]:
+    """Frame height of a video, or None if it cannot be read"""
+    capture = cv2.VideoCapture(str(video_path))
+    try:
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) if capture.isOpened() else 0
+        return height or None
+    finally:
+        capture.release()
+
+
+def variant_path(video_path: Path, profile: str) -> Path:
+    """Rendition next to its source in the render cache: {key}_{profile}.{format}"""
+    return video_path.parent / f"{video_path.stem}_{profile}.{VARIANT_PROFILES[profile]['format']}"
+
+
+def poster_path_for(video_path: Path) -> Path:
+    return video_path.parent / f"{video_path.stem}_poster.jpg"
+
+
+def encode_variant(video_path: Path, profile: str, workdir: Path, quality: str) -> Path:
+    """
+    Encode one rendition into workdir with ffmpeg, under the render limits of `quality`.
+
+    Raises:
+        RuntimeError: ffmpeg failed or timed out
+    """
+    settings = VARIANT_PROFILES[profile]
+    output = workdir / f"{profile}.{settings['format']}"
+    command = ["ffmpeg", "-y", "-v", "error", "-i", str(video_path)]
+    if settings["height"]:
+        command += ["-vf", f"scale=-2:{settings['height']}"]
+    # Manim scenes are silent
+    command += settings["args"] + ["-an", str(output)]
+
+    # ffmpeg can write more than a pipe buffer of warnings; a file never blocks it
+    stderr_path = workdir / f"{profile}.stderr.log"
+    with open(stderr_path, "w") as stderr:
+        process = subprocess.Popen(
+            limited_command(command, limits_for(quality)),
+            cwd=str(workdir),
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+            start_new_session=True
+        )
+        try:
+            returncode, _ = wait_with_usage(process, VARIANT_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            kill_process_group(process)
+            # Reap it, or every timed-out encode leaves a zombie behind
+            process.wait()
+            raise RuntimeError(f"ffmpeg timed out after {VARIANT_TIMEOUT_SECONDS:.0f}s")
+
+    if returncode != 0 or not output.exists():
+        stderr_text = stderr_path.read_text(encoding="utf-8", errors="replace")[-500:]
+        raise RuntimeError(f"ffmpeg exited with {returncode}: {stderr_text}")
+    return output
+
+
+def rendition_urls(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Renditions of a cache entry as stored on slides (URLs instead of paths)"""
+    return [
+        {
+            "url": animation_url(rendition["path"]),
+            "type": MIME_TYPES[rendition["format"]],
+            "profile": rendition["profile"],
+            "height": rendition["height"],
+            "bytes": rendition["bytes"]
+        }
+        for rendition in entry.get("renditions") or []
+    ]
+
+
+def poster_url(entry: Dict[str, Any]) -> Optional[str]:
+    return animation_url(entry["poster_path"]) if entry.get("poster_path") else None
+
+
+class AnimationVariantStage:
+    """Encodes renditions and a poster for each published render in the background"""
+
+    def __init__(self, db, render_service: RenderService, workers: int = VARIANT_WORKERS):
+        self.db = db
+        self.render_service = render_service
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="animation-variants")
+        self._lock = threading.Lock()
+        self.counters = {
+            "scheduled": 0,
+            "encoded": 0,
+            "failed": 0,
+            "skipped": 0,
+            "posters": 0,
+            "source_bytes": 0,
+            "smallest_variant_bytes": 0
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def schedule(self, job: Optional[RenderJob], entry: Dict[str, Any]) -> None:
+        """Post-publish hook of the render service: encode the entry's variants later"""
+        if not ANIMATION_VARIANTS or entry.get("renditions") is not None:
+            return
+        self._count("scheduled")
+        self._pool.submit(self._run, entry)
+
+    def _run(self, entry: Dict[str, Any]) -> None:
+        try:
+            self.process_entry(entry)
+        except Exception as e:
+            self._count("failed")
+            print(f"⚠️ Variant encoding failed for {entry['key'][:12]}: {e}")
+
+    def process_entry(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Encode renditions and a poster for one cache entry, record them on the
+        entry and point slides showing its video at them.
+
+        Returns:
+            The updated cache entry, or None if it is no longer published
+        """
+        source = Path(entry["video_path"])
+        source_bytes = source.stat().st_size
+        height = video_height(source)
+        workdir = job_workdir(f"variants-{entry['key'][:16]}")
+
+        renditions = []
+        try:
+            for profile, settings in VARIANT_PROFILES.items():
+                if settings["height"] and (height is None or height <= settings["height"]):
+                    continue
+                try:
+                    encoded = encode_variant(source, profile, workdir, entry.get("quality", "l"))
+                except RuntimeError as e:
+                    self._count("failed")
+                    print(f"⚠️ {profile} variant of {entry['key'][:12]} failed: {e}")
+                    continue
+
+                size = encoded.stat().st_size
+                if size >= source_bytes:
+                    # Not worth serving: the source itself is as small
+                    self._count("skipped")
+                    continue
+                destination = variant_path(source, profile)
+                _atomic_publish_file(encoded, destination)
+                self._count("encoded")
+                renditions.append({
+                    "profile": profile,
+                    "path": str(destination),
+                    "format": settings["format"],
+                    "height": settings["height"] or height,
+                    "bytes": size
+                })
+        finally:
+            remove_workdir(workdir)
+
+        poster = generate_thumbnail(source, poster_path_for(source), width=None)
+        if poster:
+            self._count("posters")
+
+        if renditions:
+            self._count("source_bytes", source_bytes)
+            self._count("smallest_variant_bytes", min(r["bytes"] for r in renditions))
+
+        fields = {"renditions": renditions, "poster_path": poster}
+        cache: Optional[RenderCache] = self.render_service.cache
+        updated = cache.update_entry(entry["key"], fields) if cache is not None else {**entry, **fields}
+        if updated is None:
+            return None
+
+        self._publish(updated)
+        print(f"✓ Encoded {len(renditions)} variants of {entry['key'][:12]} ({source_bytes // 1024} KB source)")
+        return updated
+
+    def _publish(self, entry: Dict[str, Any]) -> None:
+        """Record renditions on slides and cached generation results showing this video"""
+        if self.db is None:
+            return
+        url = animation_url(entry["video_path"])
+        # Slides stored before the blob store link the video by its local path
+        urls = [url, local_animation_url(entry["video_path"])]
+        fields = {"video_renditions": rendition_urls(entry), "poster_url": poster_url(entry)}
+        try:
+            self.db.generated_slides.update_many({"video_url": {"$in": urls}}, {"$set": fields})
+            self.db.generation_cache.update_many(
+                {"value.video_url": {"$in": urls}},
+                {"$set": {f"value.{field}": value for field, value in fields.items()}}
+            )
+        except Exception as e:
+            print(f"⚠️ Failed to record variants of {url}: {e}")
+
+    def backfill(self) -> Dict[str, int]:
+        """Encode variants of every cache entry that has none (synchronously)"""
+        cache = self.render_service.cache
+        if cache is None:
+            return {"entries": 0, "processed": 0}
+
+        entries = []
+        for index_path in cache.root.glob("*/*.json"):
+            try:
+                entry = json.loads(index_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if entry.get("renditions") is None and Path(entry["video_path"]).exists():
+                entries.append(entry)
+
+        processed = 0
+        for entry in entries:
+            try:
+                if self.process_entry(entry) is not None:
+                    processed += 1
+            except Exception as e:
+                self._count("failed")
+                print(f"⚠️ Variant encoding failed for {entry['key'][:12]}: {e}")
+        return {"entries": len(entries), "processed": processed}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": ANIMATION_VARIANTS, "profiles": list(VARIANT_PROFILES), **self.counters}
+
+
+def client_hints(headers) -> Dict[str, Any]:
+    """Save-Data, Downlink (Mbps) and ECT client hints of a request, where sent"""
+    hints: Dict[str, Any] = {"save_data": headers.get("save-data", "").strip().lower() == "on"}
+    try:
+        hints["downlink"] = float(headers["downlink"])
+    except (KeyError, ValueError):
+        hints["downlink"] = None
+    hints["ect"] = headers.get("ect", "").strip().lower() or None
+    return hints
+
+
+def is_constrained(hints: Dict[str, Any]) -> bool:
+    return bool(
+        hints.get("save_data")
+        or hints.get("ect") in SLOW_CONNECTION_TYPES
+        or (hints.get("downlink") is not None and hints["downlink"] < VARIANT_LOW_DOWNLINK_MBPS)
+    )
+
+
+def select_rendition(slide: Dict[str, Any], hints: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Choose the video a client should load from its hints.
+
+    Constrained clients get the smallest mp4 rendition as video_url (or the
+    lowest rendered quality while renditions are being encoded). Every slide
+    with renditions gets video_sources, in the order a <video> element should
+    try them.
+    """
+    renditions = slide.get("video_renditions") or []
+    if not slide.get("video_url"):
+        return slide
+
+    if is_constrained(hints):
+        mp4s = [r for r in renditions if r["type"] == "video/mp4"]
+        if mp4s:
+            smallest = min(mp4s, key=lambda r: r["bytes"])
+            slide["video_url"] = smallest["url"]
+            slide["video_sources"] = [{"url": smallest["url"], "type": smallest["type"]}]
+            return slide
+        variants = slide.get("video_variants") or {}
+        if variants:
+            # QUALITY_DIRS lists quality flags from lowest to highest resolution
+            lowest = min(variants, key=lambda q: list(QUALITY_DIRS).index(q) if q in QUALITY_DIRS else len(QUALITY_DIRS))
+            slide["video_url"] = variants[lowest]
+            slide["video_quality"] = lowest
+        return slide
+
+    if renditions:
+        webm = [r for r in renditions if r["type"] == "video/webm"]
+        slide["video_sources"] = [{"url": r["url"], "type": r["type"]} for r in webm]
+        slide["video_sources"].append({"url": slide["video_url"], "type": "video/mp4"})
+    return slide
+
+
+# Singleton instance
+_variant_stage: Optional[AnimationVariantStage] = None
+
+
+def get_variant_stage(db=None) -> AnimationVariantStage:
+    """Get or create the variant stage singleton (hooked into the render service)"""
+    global _variant_stage
+
+    if _variant_stage is None:
+        render_service = get_render_service(db)
+        _variant_stage = AnimationVariantStage(db, render_service)
+        render_service.add_post_publish_hook(_variant_stage.schedule)
+
+    return _variant_stage
+
+
+if __name__ == "__main__":
+    from database import get_database
+
+    database = get_database()
+    report = AnimationVariantStage(database, get_render_service(database)).backfill()
+    print(f"✓ Variants: {report['processed']} of {report['entries']} cache entries encoded")
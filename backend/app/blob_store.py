@@ -0,0 +1,427 @@
+"""
+Content-addressed storage for rendered media, shared by every API node.
+
+Animations used to be served from the local MANIM_OUTPUT_DIR through a
+StaticFiles mount, so only the node that rendered a video could serve it. Now
+each published file (video, thumbnail, rendition, poster) is also put in a blob
+store under the sha256 of its content and linked as /animations/blobs/{sha256}.{ext}:
+
+- LocalBlobStore keeps blobs under BLOB_STORE_DIR (MANIM_OUTPUT_DIR/blobs by
+  default), hard-linked to the render cache files so they take no extra space.
+  Point BLOB_STORE_DIR at a shared filesystem to serve from several nodes.
+- GridFSBlobStore keeps them in MongoDB (GridFS bucket BLOB_GRIDFS_BUCKET), which
+  every node already talks to.
+
+Blobs never change, so they are served with their hash as ETag, a year-long
+immutable Cache-Control and Range support for seeking in video players. Paths
+from before the blob store (/animations/cache/...) are still served from local
+disk on the node that has them.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import mimetypes
+import threading
+from pathlib import Path
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Iterator, Optional, Tuple
+
+import gridfs
+from gridfs.errors import FileExists, NoFile
+from pymongo.errors import DuplicateKeyError
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+MANIM_OUTPUT_DIR = os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")
+BLOB_STORE = os.getenv("BLOB_STORE", "local").lower()  # local | gridfs
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(MANIM_OUTPUT_DIR, "blobs"))
+BLOB_GRIDFS_BUCKET = os.getenv("BLOB_GRIDFS_BUCKET", "animation_blobs")
+BLOB_CACHE_SECONDS = int(os.getenv("BLOB_CACHE_SECONDS", str(365 * 24 * 3600)))
+# Files from before the blob store are not content-addressed and may be replaced
+LEGACY_CACHE_SECONDS = int(os.getenv("LEGACY_CACHE_SECONDS", "3600"))
+# Hashes of published files, so a file is only read once per process
+BLOB_DIGEST_CACHE_SIZE = int(os.getenv("BLOB_DIGEST_CACHE_SIZE", "4096"))
+
+BLOB_URL_PREFIX = "/animations/blobs/"
+READ_CHUNK_BYTES = 256 * 1024
+
+# Serving a file only re-stamps its access time after this long (video players send many range requests)
+ACCESS_STAMP_RESOLUTION_SECONDS = 60
+
+
+def touch_access(path: Path) -> None:
+    """Record that a file was served: set its atime to now, keep its mtime"""
+    try:
+        st = path.stat()
+        now = time.time()
+        if now - st.st_atime >= ACCESS_STAMP_RESOLUTION_SECONDS:
+            os.utime(path, (now, st.st_mtime))
+    except OSError:
+        pass
+
+
+def content_hash(path: Path) -> str:
+    """sha256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_url(digest: str, suffix: str) -> str:
+    """URL of a blob; the suffix only gives clients (and the server) its content type"""
+    return f"{BLOB_URL_PREFIX}{digest}{suffix}"
+
+
+def parse_blob_url(url: str) -> Optional[Tuple[str, str]]:
+    """(digest, suffix) of a blob URL, or None for any other URL"""
+    if not url or not url.startswith(BLOB_URL_PREFIX):
+        return None
+    name = url[len(BLOB_URL_PREFIX):]
+    digest, dot, extension = name.partition(".")
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        return None
+    return digest, dot + extension
+
+
+class BlobStore:
+    """Content-addressed blobs: put once under their sha256, read by byte range"""
+
+    name = "base"
+
+    def __init__(self):
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put_file(self, path: Path, digest: str, content_type: str) -> None:
+        raise NotImplementedError
+
+    def size(self, digest: str) -> Optional[int]:
+        """Size in bytes, or None if the blob does not exist"""
+        raise NotImplementedError
+
+    def read_range(self, digest: str, start: int, end: int) -> Iterator[bytes]:
+        """Bytes start..end (inclusive) of a blob, in chunks"""
+        raise NotImplementedError
+
+    def delete(self, digest: str) -> None:
+        raise NotImplementedError
+
+    def touch(self, digest: str) -> None:
+        """Record that a blob was served (for LRU eviction)"""
+
+    def iter_blobs(self) -> Iterator[Dict[str, Any]]:
+        """Every blob: {digest, bytes, last_access}"""
+        raise NotImplementedError
+
+    def publish(self, path: str) -> str:
+        """Put a file in the store (if it is not there yet) and return its blob URL"""
+        path = Path(path)
+        st = path.stat()
+        memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(memo_key)
+            if digest is not None:
+                self._digests.move_to_end(memo_key)
+        if digest is None:
+            digest = content_hash(path)
+            with self._lock:
+                self._digests[memo_key] = digest
+                while len(self._digests) > BLOB_DIGEST_CACHE_SIZE:
+                    self._digests.popitem(last=False)
+        # Checked every time: the storage sweep may have removed an unreferenced blob
+        if self.size(digest) is None:
+            self.put_file(path, digest, mimetypes.guess_type(path.name)[0] or "application/octet-stream")
+        return blob_url(digest, path.suffix)
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files at {root}/{sha256[:2]}/{sha256}"""
+
+    name = "local"
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        super().__init__()
+        self.root = Path(root)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put_file(self, path: Path, digest: str, content_type: str) -> None:
+        destination = self.path_for(digest)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = destination.parent / f".{digest}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            try:
+                # Same filesystem as the render cache: share the file instead of copying it
+                os.link(path, tmp_path)
+            except OSError:
+                with open(path, "rb") as source, open(tmp_path, "wb") as target:
+                    for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                        target.write(chunk)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def size(self, digest: str) -> Optional[int]:
+        try:
+            return self.path_for(digest).stat().st_size
+        except OSError:
+            return None
+
+    def read_range(self, digest: str, start: int, end: int) -> Iterator[bytes]:
+        yield from _read_file_range(self.path_for(digest), start, end)
+
+    def delete(self, digest: str) -> None:
+        try:
+            self.path_for(digest).unlink()
+        except OSError:
+            pass
+
+    def touch(self, digest: str) -> None:
+        # Also stamps the hard-linked render cache file
+        touch_access(self.path_for(digest))
+
+    def iter_blobs(self) -> Iterator[Dict[str, Any]]:
+        """Every blob: {digest, bytes, last_access}"""
+        for path in self.root.glob("*/*"):
+            if path.name.startswith("."):
+                # A put in progress
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            yield {
+                "digest": path.name,
+                "bytes": st.st_size,
+                "last_access": datetime.fromtimestamp(max(st.st_atime, st.st_mtime))
+            }
+
+
+class GridFSBlobStore(BlobStore):
+    """Blobs in a GridFS bucket, with the sha256 as file _id"""
+
+    name = "gridfs"
+
+    def __init__(self, db, bucket_name: str = BLOB_GRIDFS_BUCKET):
+        super().__init__()
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+        self._last_touch: Dict[str, float] = {}
+
+    def put_file(self, path: Path, digest: str, content_type: str) -> None:
+        try:
+            with open(path, "rb") as source:
+                # GridFS writes the files document after the last chunk, so a blob is visible only when complete
+                self.bucket.upload_from_stream_with_id(
+                    digest,
+                    digest,
+                    source,
+                    metadata={"content_type": content_type, "last_access": datetime.now()}
+                )
+        except (FileExists, DuplicateKeyError):
+            # Another node published the same content first
+            pass
+
+    def size(self, digest: str) -> Optional[int]:
+        doc = self.files.find_one({"_id": digest}, {"length": 1})
+        return doc["length"] if doc else None
+
+    def read_range(self, digest: str, start: int, end: int) -> Iterator[bytes]:
+        stream = self.bucket.open_download_stream(digest)
+        try:
+            stream.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = stream.read(min(READ_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            stream.close()
+
+    def delete(self, digest: str) -> None:
+        try:
+            self.bucket.delete(digest)
+        except NoFile:
+            pass
+
+    def touch(self, digest: str) -> None:
+        # Video players send many range requests; stamp at most once per resolution window
+        now = time.time()
+        with self._lock:
+            if now - self._last_touch.get(digest, 0) < ACCESS_STAMP_RESOLUTION_SECONDS:
+                return
+            self._last_touch[digest] = now
+        try:
+            self.files.update_one({"_id": digest}, {"$set": {"metadata.last_access": datetime.now()}})
+        except Exception:
+            pass
+
+    def iter_blobs(self) -> Iterator[Dict[str, Any]]:
+        """Every blob: {digest, bytes, last_access}"""
+        for doc in self.files.find({}, {"length": 1, "uploadDate": 1, "metadata.last_access": 1}):
+            yield {
+                "digest": doc["_id"],
+                "bytes": doc["length"],
+                "last_access": (doc.get("metadata") or {}).get("last_access") or doc["uploadDate"]
+            }
+
+
+def _read_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class RangeNotSatisfiable(ValueError):
+    """The requested byte range lies outside the file"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) of a single-range `Range: bytes=...` header, inclusive.
+    None means serve the whole file (no header, a malformed one, or several ranges).
+
+    Raises:
+        RangeNotSatisfiable: the range starts past the end of the file
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def ranged_response(
+    headers,
+    method: str,
+    size: int,
+    etag: str,
+    content_type: str,
+    cache_control: str,
+    read_range: Callable[[int, int], Iterator[bytes]]
+) -> Response:
+    """200/206/304/416 response for a file of `size` bytes, honoring If-None-Match, Range and If-Range"""
+    response_headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes"
+    }
+    if _etag_matches(headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=response_headers)
+
+    byte_range = None
+    # If-Range: only send a part when the client's copy is still current
+    if_range = headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**response_headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        status_code = 206
+        start, end = byte_range
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response_headers["Content-Length"] = str(end - start + 1 if size else 0)
+
+    if method == "HEAD" or size == 0:
+        return Response(status_code=status_code, headers=response_headers, media_type=content_type)
+    return StreamingResponse(
+        read_range(start, end), status_code=status_code, headers=response_headers, media_type=content_type
+    )
+
+
+def animation_response(store: BlobStore, path: str, headers, method: str = "GET", root: str = MANIM_OUTPUT_DIR) -> Response:
+    """
+    Serve /animations/{path}: blobs from the store, older paths from local disk.
+    Serving marks the file as recently used for storage eviction.
+    """
+    not_found = Response(status_code=404, content="Not Found", media_type="text/plain")
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    parsed = parse_blob_url(f"/animations/{path}")
+    if parsed is not None:
+        digest, _ = parsed
+        size = store.size(digest)
+        if size is None:
+            return not_found
+        store.touch(digest)
+        return ranged_response(
+            headers, method, size, f'"{digest}"', content_type,
+            f"public, max-age={BLOB_CACHE_SECONDS}, immutable",
+            lambda start, end: store.read_range(digest, start, end)
+        )
+
+    base = Path(root).resolve()
+    file_path = (base / path).resolve()
+    if base not in file_path.parents or not file_path.is_file():
+        return not_found
+    st = file_path.stat()
+    touch_access(file_path)
+    return ranged_response(
+        headers, method, st.st_size, f'"{st.st_mtime_ns:x}-{st.st_size:x}"', content_type,
+        f"public, max-age={LEGACY_CACHE_SECONDS}",
+        lambda start, end: _read_file_range(file_path, start, end)
+    )
+
+
+# Singleton instance
+_blob_store: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store(db=None) -> BlobStore:
+    """Get or create the blob store singleton (BLOB_STORE=local or gridfs)"""
+    global _blob_store
+
+    with _blob_store_lock:
+        if _blob_store is None:
+            if BLOB_STORE == "gridfs" and db is not None:
+                _blob_store = GridFSBlobStore(db)
+            else:
+                if BLOB_STORE == "gridfs":
+                    print("⚠️ BLOB_STORE=gridfs needs a database connection, using local blob storage")
+                _blob_store = LocalBlobStore()
+            print(f"✓ Serving animations from the {_blob_store.name} blob store")
+    return _blob_store
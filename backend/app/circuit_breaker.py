@@ -0,0 +1,141 @@
+"""
+Circuit breaker for model calls.
+
+Tracks the outcome and latency of recent calls in a sliding window. When the
+error rate or the share of slow calls passes its threshold, the breaker opens
+and calls fail immediately with CircuitOpenError instead of waiting on a
+struggling provider. After a cool-down a single probe call is let through
+(half-open); its outcome closes the breaker again or re-opens it.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, Any, TypeVar
+
+T = TypeVar("T")
+
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "20"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the model while the breaker is open"""
+
+
+class CircuitBreaker:
+    """Thread-safe sliding-window circuit breaker"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        # (timestamp, succeeded, latency_seconds)
+        self._calls: deque = deque()
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _trim(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - BREAKER_WINDOW_SECONDS:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        if self.state != OPEN:
+            self.counters["opened"] += 1
+            print(f"⚠️ Circuit '{self.name}' opened")
+        self.state = OPEN
+        self.opened_at = now
+        self._probe_in_flight = False
+
+    def allow(self) -> None:
+        """
+        Check whether a call may go through right now.
+
+        Raises:
+            CircuitOpenError: while open, or while a half-open probe is already running
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= BREAKER_OPEN_SECONDS:
+                self.state = HALF_OPEN
+
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probe_in_flight):
+                self.counters["rejected"] += 1
+                retry_in = max(0.0, BREAKER_OPEN_SECONDS - (now - self.opened_at))
+                raise CircuitOpenError(f"Model circuit '{self.name}' is open (retry in {retry_in:.0f}s)")
+
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = True
+
+    def is_available(self) -> bool:
+        """Whether a call would currently be allowed (without reserving the probe)"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= BREAKER_OPEN_SECONDS
+            return not (self.state == HALF_OPEN and self._probe_in_flight)
+
+    def record(self, succeeded: bool, latency_seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.counters["calls"] += 1
+            if not succeeded:
+                self.counters["failures"] += 1
+
+            slow = latency_seconds >= BREAKER_SLOW_CALL_SECONDS
+
+            if self.state == HALF_OPEN:
+                if succeeded and not slow:
+                    print(f"✓ Circuit '{self.name}' closed")
+                    self.state = CLOSED
+                    self._probe_in_flight = False
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, succeeded, latency_seconds))
+            self._trim(now)
+
+            total = len(self._calls)
+            if self.state != CLOSED or total < BREAKER_MIN_CALLS:
+                return
+
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            slow_calls = sum(1 for _, _, latency in self._calls if latency >= BREAKER_SLOW_CALL_SECONDS)
+            if failures / total >= BREAKER_ERROR_RATE or slow_calls / total >= BREAKER_SLOW_CALL_RATE:
+                self._open(now)
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Run fn under the breaker, recording its outcome and latency"""
+        self.allow()
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            total = len(self._calls)
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            return {
+                "name": self.name,
+                "state": self.state,
+                "window_calls": total,
+                "window_error_rate": round(failures / total, 3) if total else 0.0,
+                **self.counters
+            }
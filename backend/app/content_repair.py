@@ -0,0 +1,120 @@
+"""
+Local repair of near-miss HTML generations.
+
+Model output that is almost right (bare text without tags, a missing topic
+heading, tags left open by a truncated response) used to fail validation and
+cost a full model retry. repair_html fixes these problems locally and reports
+what it changed, so only output that is actually bad is regenerated.
+"""
+
+import re
+import html
+from html.parser import HTMLParser
+from typing import List, Tuple
+
+# Elements that never take a closing tag
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# Elements whose end tag browsers infer; leaving them open is valid HTML
+OPTIONAL_END_TAGS = {"p", "li", "dt", "dd", "tr", "td", "th", "option", "thead", "tbody", "tfoot"}
+
+# Tag start with no closing '>' at the end of a truncated response
+CUT_OFF_TAG_RE = re.compile(r"<[A-Za-z/!][^>]*$")
+
+TOPIC_HEADING = '<h2 class="text-white font-bold text-xl mb-2">{topic}</h2>'
+
+
+class _TagBalanceParser(HTMLParser):
+    """Tracks which elements are still open at the end of a fragment"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.open_tags: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in self.open_tags:
+            # Closing an outer element implicitly closes everything opened inside it
+            while self.open_tags:
+                if self.open_tags.pop() == tag:
+                    break
+
+
+def strip_code_fence(text: str) -> Tuple[str, bool]:
+    """Remove a ```html ... ``` wrapper around the whole response"""
+    match = re.match(r"^\s*```[a-zA-Z]*\s*\n(.*?)\n?\s*```\s*$", text, re.DOTALL)
+    if match:
+        return match.group(1), True
+    return text, False
+
+
+def close_unbalanced_tags(fragment: str) -> Tuple[str, List[str]]:
+    """
+    Drop a tag cut off mid-way at the end and close elements left open.
+
+    Returns:
+        Tuple of (fragment, closing tags that were appended)
+    """
+    # A response cut off inside a tag ("<span class=\"te") leaves a dangling tag start;
+    # a bare '<' in text ("for x < 5") is not one
+    fragment, cut = CUT_OFF_TAG_RE.subn("", fragment)
+    if cut:
+        fragment = fragment.rstrip()
+
+    parser = _TagBalanceParser()
+    parser.feed(fragment)
+    parser.close()
+
+    unclosed = [tag for tag in reversed(parser.open_tags) if tag not in OPTIONAL_END_TAGS]
+    if unclosed:
+        fragment = fragment.rstrip() + "".join(f"</{tag}>" for tag in unclosed)
+    return fragment, unclosed
+
+
+def mentions_topic(content: str, topic: str) -> bool:
+    """Same topic check as SlideGenerator._validate_generated_content"""
+    content_lower = content.lower()
+    return any(len(word) > 3 and word in content_lower for word in topic.lower().split())
+
+
+def repair_html(content: str, topic: str) -> Tuple[str, List[str]]:
+    """
+    Fix recoverable problems in generated slide HTML.
+
+    Returns:
+        Tuple of (repaired HTML, names of the repairs applied; empty if none were needed)
+    """
+    repairs: List[str] = []
+
+    content, stripped = strip_code_fence(content)
+    if stripped:
+        repairs.append("stripped_code_fence")
+    content = content.strip()
+
+    if "<" not in content or ">" not in content:
+        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", content) if p.strip()]
+        body = "\n".join(f'  <p class="text-zinc-200">{html.escape(p)}</p>' for p in paragraphs)
+        content = f'<div class="slide-content">\n{body}\n</div>'
+        repairs.append("wrapped_bare_text")
+
+    content, unclosed = close_unbalanced_tags(content)
+    if unclosed:
+        repairs.append("closed_unbalanced_tags")
+
+    if not mentions_topic(content, topic):
+        heading = TOPIC_HEADING.format(topic=html.escape(topic))
+        # Keep the heading inside the slide's wrapper element when there is one
+        wrapper = re.match(r"^\s*<div\b[^>]*>", content)
+        if wrapper:
+            content = f"{wrapper.group(0)}\n  {heading}{content[wrapper.end():]}"
+        else:
+            content = f"{heading}\n{content}"
+        repairs.append("injected_topic_heading")
+
+    return content, repairs
@@ -0,0 +1,198 @@
+"""
+Deterministic local LLM backend for offline runs and benchmarks.
+
+Returns valid slide HTML (or Manim code for Manim prompts) derived only from the
+prompt, so the same prompt always produces the same output. Latency, token
+counts and failures are configurable so throughput of pre-generation, caching
+and retries can be measured without network access. Enable with LLM_BACKEND=fake.
+
+Configuration:
+- FAKE_LLM_LATENCY: "fixed:0.5", "uniform:0.2,1.5", "normal:0.8,0.2" or
+  "lognormal:-0.3,0.5" (seconds; lognormal takes mu, sigma of the log)
+- FAKE_LLM_FAILURE_RATE: probability a call raises (0.0 - 1.0)
+- FAKE_LLM_TIMEOUT_RATE: probability a call hangs until its timeout, then raises
+- FAKE_LLM_RESPONSE_TOKENS: fixed response token count (default: ~4 chars per token)
+- FAKE_LLM_PROMPT_SECONDS_PER_1K_TOKENS: extra latency per 1000 prompt tokens (prompt processing)
+- FAKE_LLM_SEED: seed for latency and failure sampling
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from typing import Iterator, Optional, Callable
+
+from llm_backend import LLMBackend, LLMResponse, LLMStream
+from prompt_assembly import estimate_tokens
+
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "fixed:0.5")
+FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+FAKE_LLM_TIMEOUT_RATE = float(os.getenv("FAKE_LLM_TIMEOUT_RATE", "0"))
+FAKE_LLM_RESPONSE_TOKENS = os.getenv("FAKE_LLM_RESPONSE_TOKENS")
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED")
+FAKE_LLM_PROMPT_SECONDS_PER_1K_TOKENS = float(os.getenv("FAKE_LLM_PROMPT_SECONDS_PER_1K_TOKENS", "0"))
+FAKE_LLM_CHUNK_CHARS = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "120"))
+
+
+class FakeModelError(RuntimeError):
+    """Injected model failure"""
+
+
+def parse_latency_distribution(spec: str) -> Callable[[random.Random], float]:
+    """Turn a FAKE_LLM_LATENCY spec into a sampler returning seconds"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] if params else []
+
+    if kind == "fixed":
+        return lambda rng: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+def _prompt_field(prompt: str, label: str) -> Optional[str]:
+    match = re.search(rf"\*\*{label}:\*\*\s*(.+)", prompt)
+    return match.group(1).strip() if match else None
+
+
+def fake_html(prompt: str) -> str:
+    """Deterministic slide HTML for a generation prompt"""
+    topic = _prompt_field(prompt, "Topic") or "Generated Slide"
+    objectives = _prompt_field(prompt, "Learning Objectives") or ""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", objectives) if s.strip()] or [f"Key ideas of {topic}."]
+    items = "\n".join(f'    <li>{sentence}</li>' for sentence in sentences[:4])
+
+    return f"""<div class="slide-content" data-fake="{digest}">
+  <h2 class="text-white font-bold text-xl mb-2">{topic}</h2>
+  <p class="text-zinc-200">This slide introduces <span class="text-yellow-300 font-semibold">{topic}</span> step by step.</p>
+  <ul class="list-disc list-inside space-y-2 text-zinc-200">
+{items}
+  </ul>
+  <div class="bg-white/5 p-4 rounded-lg border border-white/10 my-4">
+    <p class="text-zinc-100">[DIAGRAM: overview of {topic}]</p>
+  </div>
+</div>"""
+
+
+def fake_manim(prompt: str) -> str:
+    """Deterministic, renderable Manim scene for a generation prompt"""
+    topic = (_prompt_field(prompt, "Topic") or "Generated Scene").replace('"', "'")
+    return f'''from manim import *
+
+class GeneratedScene(Scene):
+    def construct(self):
+        title = Text("{topic}", font_size=40, color=BLUE)
+        self.play(Write(title))
+        self.wait(1)
+        self.play(FadeOut(title))
+
+        shape = Circle(radius=1, color=RED)
+        target = Square(side_length=2, color=GREEN)
+        self.play(Create(shape))
+        self.play(Transform(shape, target))
+        self.wait(1)
+        self.play(FadeOut(shape))
+'''
+
+
+def fake_batch(prompt: str) -> str:
+    """Deterministic JSON array for a batched chapter prompt"""
+    sections = prompt.split("**Slide ID:**")[1:]
+    slides = []
+    for section in sections:
+        slide_id = section.split("\n", 1)[0].strip()
+        slides.append({"slide_id": slide_id, "html": fake_html(section)})
+    return json.dumps(slides, indent=2)
+
+
+def fake_output(prompt: str) -> str:
+    """Manim code for Manim prompts, a JSON array for batched prompts, slide HTML otherwise"""
+    if "Manim" in prompt.split("\n", 1)[0]:
+        return fake_manim(prompt)
+    if "**Slide ID:**" in prompt:
+        return fake_batch(prompt)
+    return fake_html(prompt)
+
+
+class FakeBackend(LLMBackend):
+    """Local stand-in for Gemini with configurable latency, tokens and failures"""
+
+    name = "fake"
+
+    def __init__(
+        self,
+        model_name: str = "fake-llm",
+        latency: str = FAKE_LLM_LATENCY,
+        failure_rate: float = FAKE_LLM_FAILURE_RATE,
+        timeout_rate: float = FAKE_LLM_TIMEOUT_RATE,
+        response_tokens: Optional[int] = int(FAKE_LLM_RESPONSE_TOKENS) if FAKE_LLM_RESPONSE_TOKENS else None,
+        seed: Optional[int] = int(FAKE_LLM_SEED) if FAKE_LLM_SEED else None,
+        prompt_seconds_per_1k_tokens: float = FAKE_LLM_PROMPT_SECONDS_PER_1K_TOKENS
+    ):
+        super().__init__(model_name)
+        self.sample_latency = parse_latency_distribution(latency)
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.response_tokens = response_tokens
+        self.prompt_seconds_per_1k_tokens = prompt_seconds_per_1k_tokens
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.calls = 0
+
+    def _plan_call(self, prompt: str, timeout: Optional[float]) -> float:
+        """Sample this call's latency and raise injected failures"""
+        with self._rng_lock:
+            self.calls += 1
+            latency = self.sample_latency(self._rng)
+            roll = self._rng.random()
+        latency += estimate_tokens(prompt) / 1000 * self.prompt_seconds_per_1k_tokens
+
+        if roll < self.timeout_rate:
+            time.sleep(timeout if timeout else latency)
+            raise TimeoutError("Fake model call timed out")
+
+        if roll < self.timeout_rate + self.failure_rate:
+            time.sleep(latency / 2)
+            raise FakeModelError("Injected fake model failure")
+
+        if timeout and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Fake model call timed out")
+
+        return latency
+
+    def _usage(self, prompt: str, text: str):
+        return estimate_tokens(prompt), self.response_tokens or estimate_tokens(text)
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        latency = self._plan_call(prompt, timeout)
+        time.sleep(latency)
+
+        text = fake_output(prompt)
+        prompt_tokens, response_tokens = self._usage(prompt, text)
+        return LLMResponse(text, prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> LLMStream:
+        latency = self._plan_call(prompt, timeout)
+        text = fake_output(prompt)
+        pieces = [text[i:i + FAKE_LLM_CHUNK_CHARS] for i in range(0, len(text), FAKE_LLM_CHUNK_CHARS)]
+
+        def chunks() -> Iterator[str]:
+            # Spread the latency over the stream, like a real model emitting tokens
+            for piece in pieces:
+                time.sleep(latency / len(pieces))
+                yield piece
+            stream.prompt_tokens, stream.response_tokens = self._usage(prompt, text)
+
+        stream = LLMStream(chunks())
+        return stream
@@ -0,0 +1,106 @@
+"""
+Background regeneration of slides that were served as fallback content.
+
+When the model is unavailable the API answers immediately with fallback content
+and schedules a regeneration here. A regeneration waits until the circuit
+breaker lets calls through again, generates into the shared cache under the
+scheduling user's background budget, and then runs an optional callback
+(e.g. replacing a stored fallback slide).
+"""
+
+import os
+import time
+import threading
+from typing import Callable, Dict, Any, List, Optional
+
+REGENERATION_POLL_SECONDS = float(os.getenv("REGENERATION_POLL_SECONDS", "10"))
+REGENERATION_MAX_WAIT_SECONDS = float(os.getenv("REGENERATION_MAX_WAIT_SECONDS", "1800"))
+
+
+class FallbackRegenerator:
+    """
+    Regenerates fallback slides once the model recovers: one thread per pending
+    key, which runs the callbacks of every caller that scheduled that key.
+    """
+
+    def __init__(self, cache, admission):
+        self.cache = cache
+        self.admission = admission
+        # key -> callbacks to run when its regeneration succeeds (a worker runs while the key is here)
+        self._pending: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"scheduled": 0, "regenerated": 0, "gave_up": 0}
+
+    def schedule(
+        self,
+        generator,
+        cache_kwargs: Dict[str, Any],
+        user_id: str,
+        on_success: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> bool:
+        """
+        Regenerate in the background, charged to user_id. If this key is already pending,
+        on_success is attached to that regeneration instead of starting another one.
+
+        Returns:
+            False if the key was already pending and no callback was added
+        """
+        key = self.cache.key_for(generator, **cache_kwargs)
+        with self._lock:
+            callbacks = self._pending.get(key)
+            if callbacks is not None:
+                if on_success is None:
+                    return False
+                callbacks.append(on_success)
+                return True
+
+            self._pending[key] = [on_success] if on_success else []
+            self.counters["scheduled"] += 1
+
+        threading.Thread(target=self._run, args=(key, generator, cache_kwargs, user_id), daemon=True).start()
+        return True
+
+    def _run(self, key: str, generator, cache_kwargs: Dict[str, Any], user_id: str) -> None:
+        deadline = time.monotonic() + REGENERATION_MAX_WAIT_SECONDS
+        try:
+            while time.monotonic() < deadline:
+                if not generator.breaker.is_available():
+                    time.sleep(REGENERATION_POLL_SECONDS)
+                    continue
+
+                try:
+                    # Over budget counts as a failed attempt; the next poll tries again
+                    result = self.cache.get_or_generate(
+                        generator,
+                        admit=lambda: self.admission.admit_waiting(user_id, max_wait_seconds=REGENERATION_POLL_SECONDS),
+                        **cache_kwargs
+                    )
+                except Exception as e:
+                    print(f"Background regeneration of '{cache_kwargs.get('topic')}' failed: {e}")
+                    time.sleep(REGENERATION_POLL_SECONDS)
+                    continue
+                self.admission.charge(user_id, result.get("metadata"))
+
+                with self._lock:
+                    callbacks = self._pending.pop(key, [])
+                for on_success in callbacks:
+                    try:
+                        on_success(result)
+                    except Exception as e:
+                        print(f"Callback after regenerating '{cache_kwargs.get('topic')}' failed: {e}")
+                self.counters["regenerated"] += 1
+                print(f"✓ Regenerated fallback slide: {cache_kwargs.get('topic')}")
+                return
+
+            self.counters["gave_up"] += 1
+            print(f"⚠️ Gave up regenerating '{cache_kwargs.get('topic')}' after {REGENERATION_MAX_WAIT_SECONDS:.0f}s")
+            with self._lock:
+                self._pending.pop(key, None)
+        except BaseException:
+            with self._lock:
+                self._pending.pop(key, None)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, "pending": len(self._pending)}
@@ -1,34 +1,192 @@
 import os
-import subprocess
-import tempfile
-import uuid
+import json
+import time
 from pathlib import Path
-import google.generativeai as genai
-from typing import Dict, Any, Optional, Literal
+from typing import Dict, Any, Optional, Literal, Iterator, Tuple, List
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Imported after load_dotenv so LLM_BACKEND / GEMINI_API_KEY can come from .env
+from llm_backend import get_llm_backend, LLMResponse
+from circuit_breaker import CircuitBreaker
+from prompt_assembly import outline_content, compact_prompt, collapse_blank_lines, prompt_stats
+from content_repair import repair_html, mentions_topic
+from render_service import get_render_service, animation_url, RENDER_QUALITY
+from quality_ladder import get_quality_ladder
+
+# Our own deadline for a model call, so provider incidents can't hold requests longer
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# A batched chapter call produces several slides, so it gets a longer deadline
+LLM_BATCH_TIMEOUT_SECONDS = float(os.getenv("LLM_BATCH_TIMEOUT_SECONDS", "120"))
 
 # Manim output directory (should be accessible to frontend)
 MANIM_OUTPUT_DIR = os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")
 Path(MANIM_OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
 
+# Prompt template versions. Cached generations are keyed on the version that produced them,
+# so add a new version whenever prompt templates change.
+# - v1: previous content embedded verbatim, full instruction blocks
+# - v2: previous content sent as a short outline, repeated instructions removed
+PROMPT_VERSIONS = ("v1", "v2")
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "v2")
+
+# Style buckets: generated content only changes when visual_text_score crosses a boundary.
+# Each entry is (upper bound, bucket name); the prompt is built from the bucket, not the raw score.
+STYLE_BUCKETS = [
+    (0.3, "text_heavy"),
+    (float("inf"), "balanced"),
+]
+
+
+# Shared by the single-slide and batched HTML prompts
+HTML_STYLING_RULES = """**Styling Requirements (CRITICAL for Accessibility):**
+- The content is rendered on a DARK BACKGROUND (deep blue/black).
+- You MUST use Tailwind CSS classes for all styling to ensure visibility.
+- KEY RULES:
+  - For normal text: Use `class="text-zinc-100"` or `class="text-zinc-200"`
+  - For headings: Use `class="text-white font-bold text-xl mb-2"` or `class="text-blue-300 font-bold"`
+  - For keywords/emphasis: Use `class="text-yellow-300 font-semibold"` or `class="text-cyan-300"`
+  - For lists: Use `class="list-disc list-inside space-y-2 text-zinc-200"`
+  - NEVER use black or dark gray text (it will be invisible).
+  - Use `class="bg-white/5 p-4 rounded-lg border border-white/10 my-4"` for callout boxes."""
+
+HTML_SLIDE_ELEMENTS = """1. A clear title or heading (use <h2> or 3> tags with appropriate color classes)
+2. Main content following the style instructions above
+3. For visual elements, use detailed placeholder descriptions like:
+   - [DIAGRAM: description of what the diagram shows]
+   - [FLOWCHART: step-by-step flow description]
+   - [GRAPH: description of axes, curves, and important points]
+4. Keep content concise and focused (aim for 150-250 words maximum)
+5. Content should fit within a single slide viewport (no excessive scrolling)"""
+
+HTML_LENGTH_AND_GUIDELINES = """**Length Constraints (CRITICAL):**
+- Maximum 3-4 main bullet points or sections
+- Each section should be 2-3 sentences maximum
+- Total content should be readable in 2-3 minutes
+- Focus on KEY concepts only - avoid excessive detail
+- Think "slide deck" not "textbook chapter"
+
+**Additional Guidelines:**
+- Ensure content is pedagogically sound and academically rigorous
+- Match the cognitive style indicated by the visual-text score
+- Use proper semantic HTML tags (h2, h3, p, ul, li, div, strong, em, etc.) WITH Tailwind classes
+- Maintain educational value while adapting to the preferred learning style
+- Do NOT generate code, equations should use standard notation within text
+- Keep paragraphs short (2-4 lines maximum)
+- Use whitespace effectively for readability"""
+
+
+# v2 folds the length rules into one block and drops guidelines the style section already gives
+HTML_SLIDE_ELEMENTS_COMPACT = """1. A clear title or heading (use <h2> or <h3> tags with appropriate color classes)
+2. Main content following the style instructions above
+3. For visual elements, use detailed placeholder descriptions like:
+   - [DIAGRAM: description of what the diagram shows]
+   - [FLOWCHART: step-by-step flow description]
+   - [GRAPH: description of axes, curves, and important points]"""
+
+HTML_LENGTH_AND_GUIDELINES_COMPACT = """**Length Constraints (CRITICAL):**
+- 150-250 words: at most 3-4 sections of 2-3 sentences each, key concepts only
+- Must fit a single slide viewport - think "slide deck" not "textbook chapter"
+
+**Additional Guidelines:**
+- Pedagogically sound and academically rigorous
+- Semantic HTML tags (h2, h3, p, ul, li, div, strong, em) with the Tailwind classes above
+- Do NOT generate code; write equations in standard notation within text
+- Short paragraphs and generous whitespace"""
+
+# (slide elements, length rules and guidelines) per prompt version
+HTML_PROMPT_BLOCKS = {
+    "v1": (HTML_SLIDE_ELEMENTS, HTML_LENGTH_AND_GUIDELINES),
+    "v2": (HTML_SLIDE_ELEMENTS_COMPACT, HTML_LENGTH_AND_GUIDELINES_COMPACT),
+}
+
+# Closing checklist of the Manim prompt; v1 restates the allowed/forbidden lists three times
+MANIM_CHECKLISTS = {
+    "v1": """**REMEMBER:**
+- Use ONLY the allowed methods listed above
+- Keep animations under 15 seconds
+- Test each line mentally before including it
+- Prefer simple over complex
+
+**ABSOLUTELY REQUIRED:**
+1. Use ONLY basic shapes: Circle, Square, Rectangle, Line, Dot, Arrow
+2. Use ONLY Text() for any text - NO Tex() or MathTex()
+3. Use ONLY simple methods: Create(), Write(), FadeIn(), FadeOut(), Transform()
+4. DO NOT use Axes(), NumberPlane(), or plot() methods
+5. DO NOT use ValueTracker() or updaters
+6. Keep animations simple - under 10 self.play() calls
+7. Every variable must be defined before use
+8. Test that the code is complete and syntactically correct
+
+**Final Check:**
+- No Tex() or MathTex()? ✓
+- No Axes() or NumberPlane()? ✓
+- No plot() or graph functions? ✓
+- Only basic shapes and text? ✓
+- Simple animations only? ✓""",
+    "v2": """**ALSO REQUIRED:**
+- Under 10 self.play() calls, 5-15 seconds in total
+- No ValueTracker() or updaters
+- Every variable must be defined before use
+- The code must be complete and syntactically correct""",
+}
+
+class ModelUnavailableError(RuntimeError):
+    """
+    The model call failed, timed out or was short-circuited by the breaker.
+    Carries fallback content that can be served while the slide is regenerated.
+    """
+    
+    def __init__(self, message: str, fallback: Dict[str, Any]):
+        super().__init__(message)
+        self.fallback = fallback
+
+
+def get_style_bucket(visual_text_score: float) -> str:
+    """Quantize a continuous visual_text_score into the prompt's style bucket"""
+    for upper_bound, bucket in STYLE_BUCKETS:
+        if visual_text_score < upper_bound:
+            return bucket
+    return STYLE_BUCKETS[-1][1]
+
 
 class SlideGenerator:
     """
-    Generates slide content using Gemini API based on user's learning identity
+    Generates slide content using an LLM backend (Gemini by default) based on user's learning identity
     """
     
-    def __init__(self, model_name: str = "gemini-3-flash-preview"):
-        if not GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+    def __init__(self, model_name: str = "gemini-3-flash-preview", prompt_version: str = PROMPT_VERSION):
+        if prompt_version not in PROMPT_VERSIONS:
+            raise ValueError(f"Unknown prompt version '{prompt_version}' (expected one of {PROMPT_VERSIONS})")
+        self.prompt_version = prompt_version
+        
+        # Selected by LLM_BACKEND ("gemini" or "fake")
+        self.backend = get_llm_backend(model_name)
+        self.model_name = self.backend.model_name
         
-        self.model = genai.GenerativeModel(model_name)
+        # Fails fast while the model is erroring or too slow
+        self.breaker = CircuitBreaker(f"llm:{self.model_name}")
+    
+    def _previous_for_prompt(self, previous_content: Optional[str]) -> Optional[str]:
+        """Previous slide content as sent to the model (an outline from v2 on)"""
+        if not previous_content or self.prompt_version == "v1":
+            return previous_content
+        return outline_content(previous_content)
+    
+    def _finish_prompt(self, inputs: str, instructions: str) -> str:
+        """
+        Final assembly step: join the inputs section (user-supplied topic, objectives,
+        context) and the fixed instructions. v2 prompts drop repeated instruction lines
+        and blank gaps; the inputs are never deduplicated.
+        """
+        if self.prompt_version == "v1":
+            return f"{inputs}\n\n{instructions}"
+        return f"{collapse_blank_lines(inputs)}\n\n{compact_prompt(instructions)}"
+    
+    def _call_model(self, prompt: str) -> LLMResponse:
+        """Call the model under the circuit breaker with our own timeout"""
+        return self.breaker.call(lambda: self.backend.generate(prompt, timeout=LLM_TIMEOUT_SECONDS))
     
     def generate_slide_content(
         self,
@@ -99,51 +257,234 @@ class SlideGenerator:
         )
         
         try:
-            response = self.model.generate_content(prompt)
-            
-            # Validate response
-            if not response or not hasattr(response, 'text'):
-                raise ValueError("Empty or invalid response from Gemini API")
-            
-            generated_text = response.text
-            
-            # Validate content length
-            if len(generated_text.strip()) < 50:
-                raise ValueError(f"Generated content too short: {len(generated_text)} characters")
-            
-            # Validate it's actual HTML content (basic check)
-            if '<' not in generated_text or '>' not in generated_text:
-                # Wrap plain text in basic HTML
-                generated_text = f"<div class='slide-content'><h2>{topic}</h2><p>{generated_text}</p></div>"
-            
-            result = {
-                "content": generated_text,
-                "content_type": "html",
-                "visual_text_score": visual_text_score,
-                "topic": topic,
-                "metadata": {
-                    "generated_by": "gemini",
-                    "model": self.model._model_name,
-                    "format": "html",
-                    "prompt_tokens": response.usage_metadata.prompt_token_count if hasattr(response, 'usage_metadata') else None,
-                    "response_tokens": response.usage_metadata.candidates_token_count if hasattr(response, 'usage_metadata') else None
-                }
-            }
-            
-            # Validate content quality
-            if not self._validate_generated_content(generated_text, "html", topic):
-                raise ValueError("Generated content failed quality validation")
-            
-            return result
+            response = self._call_model(prompt)
+        except Exception as e:
+            print(f"Model call failed: {str(e)}")
+            # Hand back fallback content instead of failing completely
+            raise ModelUnavailableError(
+                f"Model unavailable: {str(e)}",
+                self._generate_fallback_content(topic, learning_objectives, visual_text_score)
+            )
+        
+        try:
+            return self._build_html_result(
+                response.text,
+                topic,
+                visual_text_score,
+                response.prompt_tokens,
+                response.response_tokens,
+                prompt_stats(prompt, "html", self.prompt_version)
+            )
         
         except Exception as e:
             error_msg = str(e)
             print(f"Generation error: {error_msg}")
+            raise RuntimeError(f"Failed to generate HTML content: {error_msg}")
+    
+    def _build_html_result(
+        self,
+        generated_text: str,
+        topic: str,
+        visual_text_score: float,
+        prompt_tokens: Optional[int],
+        response_tokens: Optional[int],
+        prompt_info: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Validate raw model HTML output and wrap it in the generation result dict"""
+        # Validate content length
+        if len(generated_text.strip()) < 50:
+            raise ValueError(f"Generated content too short: {len(generated_text)} characters")
+        
+        # Fix near-misses (bare text, missing topic heading, unclosed tags) locally
+        # instead of paying for another model call
+        generated_text, repairs = repair_html(generated_text, topic)
+        if repairs:
+            print(f"🔧 Repaired generated content for '{topic}': {', '.join(repairs)}")
+        
+        result = {
+            "content": generated_text,
+            "content_type": "html",
+            "visual_text_score": visual_text_score,
+            "topic": topic,
+            "metadata": {
+                "generated_by": self.backend.name,
+                "model": self.model_name,
+                "format": "html",
+                "prompt_tokens": prompt_tokens,
+                "response_tokens": response_tokens,
+                "repairs": repairs,
+                **(prompt_info or {})
+            }
+        }
+        
+        # Validate content quality
+        if not self._validate_generated_content(generated_text, "html", topic):
+            raise ValueError("Generated content failed quality validation")
+        
+        return result
+    
+    def stream_html_content(
+        self,
+        topic: str,
+        learning_objectives: str,
+        visual_text_score: float,
+        context: Optional[str] = None,
+        previous_content: Optional[str] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Generate HTML slide content using the model's streaming mode
+        
+        Yields:
+            ("chunk", html_text) for each piece as the model produces it, then
+            ("done", result) with the validated result dict (same shape as generate_slide_content)
+        """
+        prompt = self._build_html_prompt(
+            topic=topic,
+            learning_objectives=learning_objectives,
+            visual_text_score=visual_text_score,
+            context=context,
+            previous_content=previous_content
+        )
+        
+        try:
+            self.breaker.allow()
+        except Exception as e:
+            raise ModelUnavailableError(
+                str(e),
+                self._generate_fallback_content(topic, learning_objectives, visual_text_score)
+            )
+        
+        started = time.monotonic()
+        parts = []
+        try:
+            stream = self.backend.stream(prompt, timeout=LLM_TIMEOUT_SECONDS)
+            for text in stream:
+                parts.append(text)
+                yield "chunk", text
+            self.breaker.record(True, time.monotonic() - started)
+        except GeneratorExit:
+            # Client went away mid-stream; not a model failure, but release a half-open probe
+            self.breaker.record(True, time.monotonic() - started)
+            raise
+        except Exception as e:
+            self.breaker.record(False, time.monotonic() - started)
+            print(f"Streaming model call failed: {str(e)}")
+            raise ModelUnavailableError(
+                f"Model unavailable: {str(e)}",
+                self._generate_fallback_content(topic, learning_objectives, visual_text_score)
+            )
+        
+        try:
+            # Token usage is only complete once the stream has been consumed
+            result = self._build_html_result(
+                "".join(parts),
+                topic,
+                visual_text_score,
+                stream.prompt_tokens,
+                stream.response_tokens,
+                prompt_stats(prompt, "html", self.prompt_version)
+            )
+            result["metadata"]["streamed"] = True
+            yield "done", result
+        
+        except Exception as e:
+            print(f"Streaming generation error: {str(e)}")
+            raise RuntimeError(f"Failed to stream HTML content: {str(e)}")
+    
+    def generate_slide_batch(
+        self,
+        slide_topics: List[Dict[str, Any]],
+        visual_text_score: float
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """
+        Generate HTML for several slides of one chapter in a single model call
+        
+        The shared instructions are sent once and the model returns a JSON array
+        keyed by slide_id. Every slide is validated on its own, so one bad slide
+        does not discard the rest of the batch.
+        
+        Args:
+            slide_topics: Slide topic documents (slide_id, title, learning_objectives, context)
+            visual_text_score: 0.0 (pure text) to 1.0 (pure visual)
+        
+        Returns:
+            Tuple of (results by slide_id, error messages by slide_id). Failed slides
+            should be regenerated individually with generate_slide_content.
+        
+        Raises:
+            Exception: if the model call itself fails
+        """
+        prompt = self._build_batch_html_prompt(slide_topics, visual_text_score)
+        
+        self.breaker.allow()
+        started = time.monotonic()
+        try:
+            response = self.backend.generate(prompt, timeout=LLM_BATCH_TIMEOUT_SECONDS)
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        # A batch is expected to take longer than one slide; judge its latency per slide
+        self.breaker.record(True, (time.monotonic() - started) / len(slide_topics))
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[str, str] = {}
+        
+        try:
+            generated = self._parse_batch_response(response.text)
+        except ValueError as e:
+            print(f"Batch response could not be parsed: {e}")
+            return results, {t["slide_id"]: f"Unparseable batch response: {e}" for t in slide_topics}
+        
+        # Token usage is reported for the whole call; split it so per-slide metadata sums up
+        total_chars = sum(len(html) for html in generated.values()) or 1
+        prompt_share = response.prompt_tokens // len(slide_topics) if response.prompt_tokens else None
+        
+        for slide_topic in slide_topics:
+            slide_id = slide_topic["slide_id"]
+            html = generated.get(slide_id)
+            if not html:
+                errors[slide_id] = "Missing from batch response"
+                continue
             
-            # Return fallback content instead of failing completely
-            fallback_content = self._generate_fallback_content(topic, learning_objectives, visual_text_score)
+            response_share = (
+                round(response.response_tokens * len(html) / total_chars)
+                if response.response_tokens else None
+            )
+            try:
+                result = self._build_html_result(
+                    html,
+                    slide_topic["title"],
+                    visual_text_score,
+                    prompt_share,
+                    response_share,
+                    prompt_stats(prompt, "html_batch", self.prompt_version)
+                )
+            except Exception as e:
+                errors[slide_id] = str(e)
+                continue
             
-            raise RuntimeError(f"Failed to generate HTML content: {error_msg}")
+            result["metadata"]["batched"] = True
+            result["metadata"]["batch_size"] = len(slide_topics)
+            results[slide_id] = result
+        
+        print(f"✓ Batch generated {len(results)}/{len(slide_topics)} slides in one call")
+        return results, errors
+    
+    def _parse_batch_response(self, text: str) -> Dict[str, str]:
+        """Parse the batched JSON array into {slide_id: html}"""
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end <= start:
+            raise ValueError("No JSON array in response")
+        
+        items = json.loads(text[start:end + 1])
+        if not isinstance(items, list):
+            raise ValueError("Response is not a JSON array")
+        
+        return {
+            str(item["slide_id"]): item["html"]
+            for item in items
+            if isinstance(item, dict) and item.get("slide_id") and isinstance(item.get("html"), str)
+        }
     
     def _generate_manim_animation(
         self,
@@ -163,51 +504,65 @@ class SlideGenerator:
         )
         
         try:
-            response = self.model.generate_content(prompt)
+            response = self._call_model(prompt)
+        except Exception as e:
+            raise ModelUnavailableError(
+                f"Model unavailable: {str(e)}",
+                self._generate_fallback_content(topic, learning_objectives, visual_text_score)
+            )
+        
+        try:
             manim_code = response.text
             
             # Extract Python code from markdown code blocks if present
             manim_code = self._extract_code_from_markdown(manim_code)
             
-            # Render the Manim animation
+            # Render the Manim animation at the first quality rung
             video_path, thumbnail_path = self._render_manim(manim_code, topic)
+            video = {
+                "quality": RENDER_QUALITY,
+                "video_url": animation_url(video_path),
+                "thumbnail_url": animation_url(thumbnail_path) if thumbnail_path else None,
+                "video_variants": {RENDER_QUALITY: animation_url(video_path)},
+                "video_renditions": [],
+                "poster_url": None
+            }
+            
+            # Higher qualities render in the background and replace the video when done
+            ladder = get_quality_ladder()
+            video = ladder.best(manim_code) or video
+            upgrade_job_id = ladder.schedule_upgrade(manim_code, topic, video["quality"])
             
             return {
                 "content": manim_code,
                 "content_type": "manim",
-                "video_url": f"/animations/{Path(video_path).name}",
-                "thumbnail_url": f"/animations/{Path(thumbnail_path).name}" if thumbnail_path else None,
+                "video_url": video["video_url"],
+                "thumbnail_url": video["thumbnail_url"],
+                "video_quality": video["quality"],
+                "video_variants": video["video_variants"],
+                "video_renditions": video["video_renditions"],
+                "poster_url": video["poster_url"],
                 "visual_text_score": visual_text_score,
                 "topic": topic,
                 "metadata": {
-                    "generated_by": "gemini",
-                    "model": self.model._model_name,
+                    "generated_by": self.backend.name,
+                    "model": self.model_name,
                     "format": "manim",
                     "video_path": video_path,
-                    "prompt_tokens": response.usage_metadata.prompt_token_count if hasattr(response, 'usage_metadata') else None,
-                    "response_tokens": response.usage_metadata.candidates_token_count if hasattr(response, 'usage_metadata') else None
+                    # Poll /api/animations/render/{id} for the higher-quality video
+                    "video_upgrade_job_id": upgrade_job_id,
+                    "prompt_tokens": response.prompt_tokens,
+                    "response_tokens": response.response_tokens,
+                    **prompt_stats(prompt, "manim", self.prompt_version)
                 }
             }
         
         except Exception as e:
             raise RuntimeError(f"Failed to generate Manim animation: {str(e)}")
     
-    def _build_html_prompt(
-        self,
-        topic: str,
-        learning_objectives: str,
-        visual_text_score: float,
-        context: Optional[str],
-        previous_content: Optional[str]
-    ) -> str:
-        """
-        Build HTML generation prompt for text-heavy slides
-        
-        Used when visual_text_score <= 0.6
-        """
-        
-        # Determine content style based on score
-        if visual_text_score < 0.3:
+    def _html_style_instruction(self, style_bucket: str) -> str:
+        """Content style instructions for a style bucket"""
+        if style_bucket == "text_heavy":
             style_instruction = """
 Generate content that is TEXT-HEAVY and DEFINITION-FOCUSED:
 - Use clear, structured definitions
@@ -247,8 +602,30 @@ Generate content with a BALANCED MIX of text and visual descriptions:
 # - Think infographic-style with icons and visual symbols
 # """
         
+        return style_instruction
+    
+    def _build_html_prompt(
+        self,
+        topic: str,
+        learning_objectives: str,
+        visual_text_score: float,
+        context: Optional[str],
+        previous_content: Optional[str]
+    ) -> str:
+        """
+        Build HTML generation prompt for text-heavy slides
+        
+        Used when visual_text_score <= 0.6
+        """
+        
+        # Determine content style based on the score's bucket
+        style_bucket = get_style_bucket(visual_text_score)
+        style_instruction = self._html_style_instruction(style_bucket)
+        slide_elements, length_rules = HTML_PROMPT_BLOCKS[self.prompt_version]
+        previous_content = self._previous_for_prompt(previous_content)
+        
         # Build the full prompt
-        prompt = f"""You are an expert educational content generator. Create lecture slide content for a lecture.
+        inputs = f"""You are an expert educational content generator. Create lecture slide content for a lecture.
 
 **Topic:** {topic}
 
@@ -256,52 +633,76 @@ Generate content with a BALANCED MIX of text and visual descriptions:
 
 {f"**Course Context:** {context}" if context else ""}
 
-{f"**Previous Slide Content (for continuity):** {previous_content}" if previous_content else ""}
-
-**Content Style Requirements (VISUAL-TEXT SPECTRUM Score: {visual_text_score:.2f}):**
+{f"**Previous Slide Content (for continuity):** {previous_content}" if previous_content else ""}"""
+        
+        instructions = f"""**Content Style Requirements (VISUAL-TEXT SPECTRUM: {style_bucket.replace("_", " ").upper()}):**
 {style_instruction}
 
-**Styling Requirements (CRITICAL for Accessibility):**
-- The content is rendered on a DARK BACKGROUND (deep blue/black).
-- You MUST use Tailwind CSS classes for all styling to ensure visibility.
-- KEY RULES:
-  - For normal text: Use `class="text-zinc-100"` or `class="text-zinc-200"`
-  - For headings: Use `class="text-white font-bold text-xl mb-2"` or `class="text-blue-300 font-bold"`
-  - For keywords/emphasis: Use `class="text-yellow-300 font-semibold"` or `class="text-cyan-300"`
-  - For lists: Use `class="list-disc list-inside space-y-2 text-zinc-200"`
-  - NEVER use black or dark gray text (it will be invisible).
-  - Use `class="bg-white/5 p-4 rounded-lg border border-white/10 my-4"` for callout boxes.
+{HTML_STYLING_RULES}
 
 **Output Format:**
 Generate the slide content as HTML with inline Tailwind classes. Include:
-1. A clear title or heading (use <h2> or 3> tags with appropriate color classes)
-2. Main content following the style instructions above
-3. For visual elements, use detailed placeholder descriptions like:
-   - [DIAGRAM: description of what the diagram shows]
-   - [FLOWCHART: step-by-step flow description]
-   - [GRAPH: description of axes, curves, and important points]
-4. Keep content concise and focused (aim for 150-250 words maximum)
-5. Content should fit within a single slide viewport (no excessive scrolling)
+{slide_elements}
 
-**Length Constraints (CRITICAL):**
-- Maximum 3-4 main bullet points or sections
-- Each section should be 2-3 sentences maximum
-- Total content should be readable in 2-3 minutes
-- Focus on KEY concepts only - avoid excessive detail
-- Think "slide deck" not "textbook chapter"
-
-**Additional Guidelines:**
-- Ensure content is pedagogically sound and academically rigorous
-- Match the cognitive style indicated by the visual-text score
-- Use proper semantic HTML tags (h2, h3, p, ul, li, div, strong, em, etc.) WITH Tailwind classes
-- Maintain educational value while adapting to the preferred learning style
-- Do NOT generate code, equations should use standard notation within text
-- Keep paragraphs short (2-4 lines maximum)
-- Use whitespace effectively for readability
+{length_rules}
 
 Generate the HTML content now:"""
         
-        return prompt
+        return self._finish_prompt(inputs, instructions)
+    
+    def _build_batch_html_prompt(
+        self,
+        slide_topics: List[Dict[str, Any]],
+        visual_text_score: float
+    ) -> str:
+        """Build one HTML generation prompt covering several slides of a chapter"""
+        style_bucket = get_style_bucket(visual_text_score)
+        style_instruction = self._html_style_instruction(style_bucket)
+        slide_elements, length_rules = HTML_PROMPT_BLOCKS[self.prompt_version]
+        
+        # Slides of one chapter usually share their context; send it once
+        contexts = {t.get("context") or "" for t in slide_topics}
+        shared_context = contexts.pop() if len(contexts) == 1 else None
+        
+        slide_sections = []
+        for i, slide_topic in enumerate(slide_topics, start=1):
+            lines = [
+                f"### Slide {i}",
+                f"**Slide ID:** {slide_topic['slide_id']}",
+                f"**Topic:** {slide_topic['title']}",
+                f"**Learning Objectives:** {slide_topic['learning_objectives']}"
+            ]
+            if shared_context is None and slide_topic.get("context"):
+                lines.append(f"**Context:** {slide_topic['context']}")
+            slide_sections.append("\n".join(lines))
+        slides_text = "\n\n".join(slide_sections)
+        
+        inputs = f"""You are an expert educational content generator. Create lecture slide content for {len(slide_topics)} consecutive slides of one chapter.
+
+{f"**Course Context:** {shared_context}" if shared_context else ""}
+
+**Slides:**
+
+{slides_text}"""
+        
+        instructions = f"""**Content Style Requirements (VISUAL-TEXT SPECTRUM: {style_bucket.replace("_", " ").upper()}):**
+{style_instruction}
+
+{HTML_STYLING_RULES}
+
+**Output Format:**
+Return ONLY a JSON array with one object per slide, in the order listed above:
+[{{"slide_id": "<Slide ID>", "html": "<slide HTML>"}}]
+Each "html" value is one complete slide as HTML with inline Tailwind classes. Each slide must include:
+{slide_elements}
+Escape quotes and newlines inside "html" so the array is valid JSON. No markdown fences, no commentary.
+
+{length_rules}
+- Each slide stands on its own, but slides should build on each other in the order given
+
+Generate the JSON array now:"""
+        
+        return self._finish_prompt(inputs, instructions)
     
     def _generate_fallback_content(
         self,
@@ -364,8 +765,9 @@ Generate the HTML content now:"""
         
         Used when visual_text_score > 0.6
         """
+        previous_content = self._previous_for_prompt(previous_content)
         
-        prompt = f"""You are an expert Manim animation developer. Create a simple, short Manim animation for educational content with visual understanding in mind.
+        inputs = f"""You are an expert Manim animation developer. Create a simple, short Manim animation for educational content with visual understanding in mind.
 
 **Topic:** {topic}
 
@@ -373,9 +775,9 @@ Generate the HTML content now:"""
 
 {f"**Course Context:** {context}" if context else ""}
 
-{f"**Previous Content (for continuity):** {previous_content}" if previous_content else ""}
-
-**Animation Style (Visual Score: {visual_text_score:.2f}):**
+{f"**Previous Content (for continuity):** {previous_content}" if previous_content else ""}"""
+        
+        instructions = f"""**Animation Style (Visual):**
 Create a visually-rich animated explanation using Manim library. The animation should:
 - Use dynamic transformations and morphing
 - Include color-coded elements for clarity
@@ -452,32 +854,11 @@ class GeneratedScene(Scene):
         self.wait(0.5)
 ```
 
-**REMEMBER:**
-- Use ONLY the allowed methods listed above
-- Keep animations under 15 seconds
-- Test each line mentally before including it
-- Prefer simple over complex
-
-**ABSOLUTELY REQUIRED:**
-1. Use ONLY basic shapes: Circle, Square, Rectangle, Line, Dot, Arrow
-2. Use ONLY Text() for any text - NO Tex() or MathTex()
-3. Use ONLY simple methods: Create(), Write(), FadeIn(), FadeOut(), Transform()
-4. DO NOT use Axes(), NumberPlane(), or plot() methods
-5. DO NOT use ValueTracker() or updaters
-6. Keep animations simple - under 10 self.play() calls
-7. Every variable must be defined before use
-8. Test that the code is complete and syntactically correct
-
-**Final Check:**
-- No Tex() or MathTex()? ✓
-- No Axes() or NumberPlane()? ✓
-- No plot() or graph functions? ✓
-- Only basic shapes and text? ✓
-- Simple animations only? ✓
+{MANIM_CHECKLISTS[self.prompt_version]}
 
 Generate ONLY the Python code (no markdown, no explanations, just code starting with "from manim import *"):"""
         
-        return prompt
+        return self._finish_prompt(inputs, instructions)
     
     def _validate_generated_content(self, content: str, content_type: str, topic: str) -> bool:
         """
@@ -495,11 +876,7 @@ Generate ONLY the Python code (no markdown, no explanations, just code starting
                 return False
             
             # Check for topic presence (content should mention the topic)
-            topic_words = topic.lower().split()
-            content_lower = content.lower()
-            matches = sum(1 for word in topic_words if word in content_lower and len(word) > 3)
-            
-            if matches == 0:
+            if not mentions_topic(content, topic):
                 print(f"❌ Topic '{topic}' not found in content")
                 return False
         
@@ -542,7 +919,10 @@ Generate ONLY the Python code (no markdown, no explanations, just code starting
     
     def _render_manim(self, manim_code: str, topic: str) -> tuple[str, Optional[str]]:
         """
-        Render Manim code to video file
+        Render Manim code to video file on the render service
+        
+        Blocks the calling thread (generation already runs off the event loop);
+        use render_service.get_render_service().submit/render_async directly to avoid waiting.
         
         Args:
             manim_code: Python code containing Manim scene
@@ -551,116 +931,7 @@ Generate ONLY the Python code (no markdown, no explanations, just code starting
         Returns:
             Tuple of (video_path, thumbnail_path)
         """
-        # Generate unique filename
-        file_id = str(uuid.uuid4())[:8]
-        safe_topic = "".join(c for c in topic if c.isalnum() or c in (' ', '-', '_')).strip()[:50]
-        base_name = f"{safe_topic}_{file_id}".replace(" ", "_")
-        
-        # Save generated code to debug directory for inspection
-        debug_dir = Path(MANIM_OUTPUT_DIR) / "debug"
-        debug_dir.mkdir(parents=True, exist_ok=True)
-        debug_file = debug_dir / f"{base_name}.py"
-        
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            f.write(manim_code)
-        
-        # Create temporary Python file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-            f.write(manim_code)
-            temp_script = f.name
-        
-        try:
-            # Render with Manim
-            # -ql = low quality for faster rendering (change to -qh for high quality)
-            # --disable_caching to avoid cache issues
-            cmd = [
-                "manim",
-                "-ql",  # Low quality (480p, 15fps) - change to -qh for production
-                "--format=mp4",
-                "--disable_caching",
-                f"--output_file={base_name}",
-                f"--media_dir={MANIM_OUTPUT_DIR}",
-                temp_script,
-                "GeneratedScene"
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=180,  # 3 minute timeout for complex animations
-                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
-            )
-            
-            if result.returncode != 0:
-                error_msg = f"Manim rendering failed.\nStderr: {result.stderr}\nStdout: {result.stdout}\nCode saved to: {debug_file}"
-                raise RuntimeError(error_msg)
-            
-            # Find the generated video file
-            # Manim creates: {media_dir}/videos/{script_name}/{quality}/{output_file}.mp4
-            script_stem = Path(temp_script).stem
-            possible_paths = [
-                Path(MANIM_OUTPUT_DIR) / "videos" / script_stem / "480p15" / f"{base_name}.mp4",
-                Path(MANIM_OUTPUT_DIR) / "videos" / script_stem / "480p15" / "GeneratedScene.mp4",
-                Path(MANIM_OUTPUT_DIR) / f"{base_name}.mp4",
-            ]
-            
-            video_path = None
-            for path in possible_paths:
-                if path.exists():
-                    video_path = path
-                    break
-            
-            if not video_path or not video_path.exists():
-                # List what was actually created for debugging
-                media_dir = Path(MANIM_OUTPUT_DIR)
-                if media_dir.exists():
-                    all_files = list(media_dir.rglob("*.mp4"))
-                    files_str = "\n".join([str(f) for f in all_files[:10]])
-                    raise RuntimeError(
-                        f"Generated video not found at expected locations.\n"
-                        f"Tried: {[str(p) for p in possible_paths]}\n"
-                        f"Found MP4 files: {files_str}\n"
-                        f"Code saved to: {debug_file}"
-                    )
-                else:
-                    raise RuntimeError(f"Media directory not created: {media_dir}")
-            
-            # Generate thumbnail (first frame)
-            thumbnail_path = self._generate_thumbnail(video_path)
-            
-            return str(video_path), thumbnail_path
-        
-        finally:
-            # Cleanup temp file
-            try:
-                os.unlink(temp_script)
-            except:
-                pass
-    
-    def _generate_thumbnail(self, video_path: Path) -> Optional[str]:
-        """Generate thumbnail from video first frame using ffmpeg"""
-        try:
-            thumbnail_path = video_path.parent / f"{video_path.stem}_thumb.jpg"
-            
-            cmd = [
-                "ffmpeg",
-                "-i", str(video_path),
-                "-ss", "00:00:00",
-                "-vframes", "1",
-                "-y",  # Overwrite output file
-                str(thumbnail_path)
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, timeout=10)
-            
-            if result.returncode == 0 and thumbnail_path.exists():
-                return str(thumbnail_path)
-            
-        except Exception as e:
-            print(f"Failed to generate thumbnail: {e}")
-        
-        return None
+        return get_render_service().submit(manim_code, topic).wait()
 
 
 # Singleton instance
@@ -677,7 +948,7 @@ def get_slide_generator() -> SlideGenerator:
         try:
             _generator_instance = SlideGenerator()
         except ValueError as e:
-            # API key not configured
+            # API key not configured (or unknown LLM_BACKEND)
             raise RuntimeError(f"Slide generator not available: {str(e)}")
     
     return _generator_instance
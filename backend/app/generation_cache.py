@@ -0,0 +1,613 @@
+"""
+Shared cache for generated slide content.
+
+Generations are keyed on the prompt inputs that actually change the output:
+topic, learning objectives, context, previous content, style bucket, output format,
+model and prompt version. The raw visual_text_score is deliberately not part of
+the key, so every student in the same style bucket shares one generation.
+"""
+
+import os
+import copy
+import time
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, ContextManager, Dict, Any, Optional, List, Tuple
+
+from gemini_generator import PROMPT_VERSION, get_style_bucket
+from single_flight import SingleFlight
+
+GENERATION_CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "1000"))
+
+
+class CacheBackend:
+    """Storage interface for cached generations"""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete_topic(self, topic: str) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryLRUBackend(CacheBackend):
+    """Process-local LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int = GENERATION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def delete_topic(self, topic: str) -> int:
+        with self._lock:
+            keys = [k for k, (_, v) in self._entries.items() if v.get("topic") == topic]
+            for k in keys:
+                del self._entries[k]
+            return len(keys)
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+
+class MongoCacheBackend(CacheBackend):
+    """Cache shared by all API workers, expired by a Mongo TTL index"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        try:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self.collection.create_index("topic")
+        except Exception as e:
+            print(f"Failed to create generation cache indexes: {e}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        # The TTL monitor only runs once a minute, so check expiry on read as well
+        doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now()}})
+        return doc["value"] if doc else None
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: int) -> None:
+        self.collection.replace_one(
+            {"_id": key},
+            {
+                "value": value,
+                "topic": value.get("topic"),
+                "created_at": datetime.now(),
+                "expires_at": datetime.now() + timedelta(seconds=ttl_seconds)
+            },
+            upsert=True
+        )
+
+    def delete(self, key: str) -> bool:
+        return self.collection.delete_one({"_id": key}).deleted_count > 0
+
+    def delete_topic(self, topic: str) -> int:
+        return self.collection.delete_many({"topic": topic}).deleted_count
+
+    def clear(self) -> int:
+        return self.collection.delete_many({}).deleted_count
+
+
+class GenerationCache:
+    """
+    Read-through cache in front of SlideGenerator.generate_slide_content.
+
+    Backends are checked in order (e.g. memory, then Mongo); a hit in a slower
+    backend is copied into the faster ones. Concurrent misses for the same key
+    are coalesced into a single model call.
+    """
+
+    def __init__(self, backends: List[CacheBackend], ttl_seconds: int = GENERATION_CACHE_TTL_SECONDS):
+        self.backends = backends
+        self.ttl_seconds = ttl_seconds
+        self.single_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        topic: str,
+        learning_objectives: str,
+        context: Optional[str],
+        style_bucket: str,
+        model: str,
+        prompt_version: str = PROMPT_VERSION,
+        previous_content: Optional[str] = None,
+        force_format: Optional[str] = None
+    ) -> str:
+        """Stable hash of every input that shapes the generated output"""
+        key_inputs = {
+            "topic": topic.strip(),
+            "learning_objectives": learning_objectives.strip(),
+            "context": (context or "").strip(),
+            "previous_content": (previous_content or "").strip(),
+            "style_bucket": style_bucket,
+            "force_format": force_format or "",
+            "model": model,
+            "prompt_version": prompt_version
+        }
+        encoded = json.dumps(key_inputs, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def key_for(
+        self,
+        generator,
+        topic: str,
+        learning_objectives: str,
+        visual_text_score: float,
+        context: Optional[str] = None,
+        previous_content: Optional[str] = None,
+        force_format: Optional[str] = None
+    ) -> str:
+        return self.make_key(
+            topic=topic,
+            learning_objectives=learning_objectives,
+            context=context,
+            style_bucket=get_style_bucket(visual_text_score),
+            model=generator.model_name,
+            prompt_version=generator.prompt_version,
+            previous_content=previous_content,
+            force_format=force_format
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        for i, backend in enumerate(self.backends):
+            try:
+                value = backend.get(key)
+            except Exception as e:
+                print(f"Generation cache read failed ({type(backend).__name__}): {e}")
+                continue
+
+            if value is not None:
+                # Populate faster tiers
+                for faster in self.backends[:i]:
+                    try:
+                        faster.set(key, value, self.ttl_seconds)
+                    except Exception:
+                        pass
+                return value
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        for backend in self.backends:
+            try:
+                backend.set(key, value, self.ttl_seconds)
+            except Exception as e:
+                print(f"Generation cache write failed ({type(backend).__name__}): {e}")
+
+    def invalidate(self, key: Optional[str] = None, topic: Optional[str] = None, all_entries: bool = False) -> int:
+        """
+        Drop one key, every entry for a topic, or (only with all_entries) the whole cache.
+
+        Raises:
+            ValueError: if neither key, topic nor all_entries is given
+        """
+        if not (key or topic or all_entries):
+            raise ValueError("Pass a key, a topic or all_entries=True")
+        removed = 0
+        for backend in self.backends:
+            try:
+                if key:
+                    removed += int(backend.delete(key))
+                elif topic:
+                    removed += backend.delete_topic(topic)
+                else:
+                    removed += backend.clear()
+            except Exception as e:
+                print(f"Generation cache invalidation failed ({type(backend).__name__}): {e}")
+        return removed
+
+    def stats(self, generator=None) -> Dict[str, Any]:
+        """Counters; the prompt version is the one `generator` keys its entries with"""
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "backends": [type(b).__name__ for b in self.backends],
+                "single_flight": self.single_flight.stats(),
+                "ttl_seconds": self.ttl_seconds,
+                "prompt_version": generator.prompt_version if generator is not None else None
+            }
+
+    def _record(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_or_generate(
+        self,
+        generator,
+        topic: str,
+        learning_objectives: str,
+        visual_text_score: float,
+        context: Optional[str] = None,
+        previous_content: Optional[str] = None,
+        force_format: Optional[str] = None,
+        admit: Optional[Callable[[], ContextManager]] = None
+    ) -> Dict[str, Any]:
+        """
+        Return a cached generation for these inputs, generating and storing it on a miss.
+        The returned dict has the same shape as generate_slide_content's result.
+        admit() (e.g. an admission slot) is only entered by the flight that calls the model,
+        so hits and coalesced waiters are never throttled.
+        """
+        generate_kwargs = dict(
+            topic=topic,
+            learning_objectives=learning_objectives,
+            visual_text_score=visual_text_score,
+            context=context,
+            previous_content=previous_content,
+            force_format=force_format
+        )
+        key = self.key_for(generator, **generate_kwargs)
+
+        cached = self.get(key)
+        if cached is not None:
+            self._record(hit=True)
+            return self._annotate(copy.deepcopy(cached), key, generator, visual_text_score, cache_hit=True, coalesced=False)
+
+        self._record(hit=False)
+        led = []
+        # Identical concurrent misses wait on one in-flight generation
+        result = self.single_flight.do(key, self._generate_once(key, generator, admit, led, generate_kwargs))
+        return self._annotate(
+            copy.deepcopy(result), key, generator, visual_text_score, cache_hit=False, coalesced=not led
+        )
+
+    async def get_or_generate_async(
+        self,
+        generator,
+        topic: str,
+        learning_objectives: str,
+        visual_text_score: float,
+        context: Optional[str] = None,
+        previous_content: Optional[str] = None,
+        force_format: Optional[str] = None,
+        admit: Optional[Callable[[], ContextManager]] = None
+    ) -> Dict[str, Any]:
+        """
+        get_or_generate for the event loop. The lookup and the model call run in worker
+        threads; a request that joins an identical in-flight generation holds no thread.
+        """
+        generate_kwargs = dict(
+            topic=topic,
+            learning_objectives=learning_objectives,
+            visual_text_score=visual_text_score,
+            context=context,
+            previous_content=previous_content,
+            force_format=force_format
+        )
+        key = self.key_for(generator, **generate_kwargs)
+
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            self._record(hit=True)
+            return self._annotate(copy.deepcopy(cached), key, generator, visual_text_score, cache_hit=True, coalesced=False)
+
+        self._record(hit=False)
+        led = []
+        result = await self.single_flight.do_async(key, self._generate_once(key, generator, admit, led, generate_kwargs))
+        return self._annotate(
+            copy.deepcopy(result), key, generator, visual_text_score, cache_hit=False, coalesced=not led
+        )
+
+    def _generate_once(
+        self,
+        key: str,
+        generator,
+        admit: Optional[Callable[[], ContextManager]],
+        led: List[bool],
+        generate_kwargs: Dict[str, Any]
+    ) -> Callable[[], Dict[str, Any]]:
+        """The single-flight leader's work for a miss; it appends to `led` when it runs"""
+        def generate_once():
+            led.append(True)
+            # A flight that finished just before this one may have filled the cache
+            stored = self.get(key)
+            if stored is not None:
+                return stored
+
+            # Only the leader calls the model, so only it takes admission
+            with admit() if admit is not None else nullcontext():
+                generated = generator.generate_slide_content(**generate_kwargs)
+            # Fallback content must never be served from the cache
+            if not generated.get("metadata", {}).get("is_fallback"):
+                self.set(key, copy.deepcopy(generated))
+            return generated
+
+        return generate_once
+
+    def open_stream(
+        self,
+        generator,
+        topic: str,
+        learning_objectives: str,
+        visual_text_score: float,
+        context: Optional[str] = None,
+        previous_content: Optional[str] = None,
+        admit: Optional[Callable[[], ContextManager]] = None
+    ) -> "GenerationStream":
+        """
+        get_or_generate for a streamed response (see GenerationStream). The lookup, the
+        single-flight join and, for the flight that calls the model, admit() all happen
+        here, before the response starts, so a rejection is raised to the caller.
+
+        Raises:
+            SingleFlightOverloaded: if too many requests wait on the same generation
+            AdmissionRejected (or whatever admit() raises): this request would call the model
+        """
+        generate_kwargs = dict(
+            topic=topic,
+            learning_objectives=learning_objectives,
+            visual_text_score=visual_text_score,
+            context=context,
+            previous_content=previous_content
+        )
+        key = self.key_for(generator, **generate_kwargs)
+
+        cached = self.get(key)
+        if cached is not None:
+            self._record(hit=True)
+            return GenerationStream(self, generator, key, generate_kwargs, cached=cached)
+
+        self._record(hit=False)
+        future, leader = self.single_flight.join(key)
+        if not leader:
+            return GenerationStream(self, generator, key, generate_kwargs, flight=future)
+
+        try:
+            # A flight that finished just before this one may have filled the cache
+            stored = self.get(key)
+            if stored is not None:
+                self.single_flight.settle(key, future, result=stored)
+                return GenerationStream(self, generator, key, generate_kwargs, cached=stored, cache_hit=False)
+            # Only the leader calls the model, so only it takes admission; the stream releases it
+            slot = admit() if admit is not None else None
+            if slot is not None:
+                slot.__enter__()
+        except BaseException as e:
+            self.single_flight.settle(key, future, error=e)
+            raise
+        return GenerationStream(self, generator, key, generate_kwargs, flight=future, leader=True, slot=slot)
+
+    def get_or_generate_batch(
+        self,
+        generator,
+        slide_topics: List[Dict[str, Any]],
+        visual_text_score: float,
+        admit: Optional[Callable[[], ContextManager]] = None
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """
+        Cached generations for several slides of a chapter, generating every miss
+        in one batched model call (see SlideGenerator.generate_slide_batch).
+
+        Batched slides are stored under the same keys as single generations, so
+        later per-slide lookups hit them. admit() is only entered for the model call.
+
+        Returns:
+            Tuple of (results by slide_id, error messages by slide_id) for slides the
+            batch could not produce; the caller regenerates those individually.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        misses = []
+        for slide_topic in slide_topics:
+            key = self.key_for(
+                generator, slide_topic["title"], slide_topic["learning_objectives"],
+                visual_text_score, context=slide_topic.get("context")
+            )
+            cached = self.get(key)
+            if cached is not None:
+                self._record(hit=True)
+                results[slide_topic["slide_id"]] = self._annotate(
+                    copy.deepcopy(cached), key, generator, visual_text_score, cache_hit=True, coalesced=False
+                )
+            else:
+                misses.append((slide_topic, key))
+
+        if not misses:
+            return results, {}
+
+        with admit() if admit is not None else nullcontext():
+            generated, errors = generator.generate_slide_batch([t for t, _ in misses], visual_text_score)
+        for slide_topic, key in misses:
+            result = generated.get(slide_topic["slide_id"])
+            if result is None:
+                continue
+            # Only slides the batch produced count as misses; failures are counted when regenerated
+            self._record(hit=False)
+            self.set(key, copy.deepcopy(result))
+            results[slide_topic["slide_id"]] = self._annotate(
+                result, key, generator, visual_text_score, cache_hit=False, coalesced=False
+            )
+
+        return results, errors
+
+    @staticmethod
+    def _annotate(
+        result: Dict[str, Any],
+        key: str,
+        generator,
+        visual_text_score: float,
+        cache_hit: bool,
+        coalesced: bool
+    ) -> Dict[str, Any]:
+        # Cached output is shared by the whole bucket; report the caller's own score
+        result["visual_text_score"] = visual_text_score
+        result.setdefault("metadata", {})
+        result["metadata"]["cache_hit"] = cache_hit
+        result["metadata"]["coalesced"] = coalesced
+        result["metadata"]["cache_key"] = key
+        result["metadata"]["style_bucket"] = get_style_bucket(visual_text_score)
+        result["metadata"]["prompt_version"] = generator.prompt_version
+        return result
+
+
+class GenerationStream:
+    """
+    One streamed generation, opened with GenerationCache.open_stream.
+
+    events() yields ("chunk", html) pieces and then ("done", result), annotated like
+    get_or_generate's results. Only the single-flight leader streams the model's
+    output (and stores it); cache hits and requests that joined an in-flight
+    generation, streamed or not, get the whole document as one chunk. close() must
+    run however the response ends: it releases the leader's admission slot and
+    resolves the flight if the stream never finished, so no waiter is left hanging.
+    """
+
+    def __init__(
+        self,
+        cache: GenerationCache,
+        generator,
+        key: str,
+        generate_kwargs: Dict[str, Any],
+        cached: Optional[Dict[str, Any]] = None,
+        cache_hit: bool = True,
+        flight: Optional[Future] = None,
+        leader: bool = False,
+        slot: Optional[ContextManager] = None
+    ):
+        self.cache = cache
+        self.generator = generator
+        self.key = key
+        self.generate_kwargs = generate_kwargs
+        self.cached = cached
+        self.cache_hit = cache_hit
+        self.flight = flight
+        self.leader = leader
+        self.slot = slot
+        self._settled = not leader
+
+    def _annotate(self, result: Dict[str, Any], cache_hit: bool, coalesced: bool) -> Dict[str, Any]:
+        return GenerationCache._annotate(
+            copy.deepcopy(result), self.key, self.generator,
+            self.generate_kwargs["visual_text_score"], cache_hit=cache_hit, coalesced=coalesced
+        )
+
+    def _settle(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if not self._settled:
+            self._settled = True
+            self.cache.single_flight.settle(self.key, self.flight, result=result, error=error)
+
+    async def events(self) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Raises:
+            ModelUnavailableError: the model failed (shared with every request on the flight)
+        """
+        if self.cached is not None:
+            result = self._annotate(self.cached, cache_hit=self.cache_hit, coalesced=False)
+            yield "chunk", result["content"]
+            yield "done", result
+            return
+
+        if not self.leader:
+            # Shielded: a waiter that goes away must not cancel the flight the others share
+            shared = await asyncio.shield(asyncio.wrap_future(self.flight))
+            result = self._annotate(shared, cache_hit=False, coalesced=True)
+            yield "chunk", result["content"]
+            yield "done", result
+            return
+
+        chunks = self.generator.stream_html_content(**self.generate_kwargs)
+        generated = None
+        try:
+            while True:
+                # Each model chunk is awaited in a worker thread, off the event loop
+                item = await asyncio.to_thread(next, chunks, None)
+                if item is None:
+                    break
+                kind, payload = item
+                if kind == "chunk":
+                    yield kind, payload
+                else:
+                    generated = payload
+        except Exception as e:
+            self._settle(error=e)
+            raise
+        finally:
+            if not self._settled:
+                # Client went away mid-stream: stop the model call (unless a chunk is still being read)
+                try:
+                    chunks.close()
+                except ValueError:
+                    pass
+
+        # Fallback content must never be served from the cache
+        if not generated.get("metadata", {}).get("is_fallback"):
+            await asyncio.to_thread(self.cache.set, self.key, copy.deepcopy(generated))
+        self._settle(result=generated)
+        yield "done", self._annotate(generated, cache_hit=False, coalesced=False)
+
+    def close(self) -> None:
+        """Release the admission slot and resolve an unfinished flight"""
+        self._settle(error=RuntimeError("The streamed generation this request waited on was abandoned"))
+        if self.slot is not None:
+            slot, self.slot = self.slot, None
+            slot.__exit__(None, None, None)
+
+
+# Singleton instance
+_cache_instance: Optional[GenerationCache] = None
+
+
+def get_generation_cache(db=None) -> GenerationCache:
+    """
+    Get or create the generation cache singleton.
+    Uses an in-memory LRU, backed by Mongo when a database is available.
+    """
+    global _cache_instance
+
+    if _cache_instance is None:
+        backends: List[CacheBackend] = [InMemoryLRUBackend()]
+        if db is not None:
+            backends.append(MongoCacheBackend(db.generation_cache))
+        _cache_instance = GenerationCache(backends)
+
+    return _cache_instance
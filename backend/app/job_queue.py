@@ -0,0 +1,347 @@
+"""
+Durable, Mongo-backed job queue for slide generation work.
+
+Jobs live in the `generation_jobs` collection and carry one entry per slide so
+progress can be reported and a job can resume where it stopped. Workers claim
+jobs atomically with find_one_and_update and hold a lease that a heartbeat
+thread keeps extending. If a worker dies, its lease expires and another worker
+picks the job up again, skipping slides that were already completed; a job whose
+workers died JOB_MAX_ATTEMPTS times is failed instead. A worker that loses its
+lease stops recording progress for the job (mark_slide raises LeaseLost).
+"""
+
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+class LeaseLost(RuntimeError):
+    """This worker's lease on the job expired and another worker may own it now"""
+
+
+class JobQueue:
+    """
+    Persistent job queue with leased claims.
+
+    Handlers are registered per job_type and called as handler(job, queue) on a
+    worker thread. They report per-slide progress with mark_slide().
+    """
+
+    def __init__(self, db, collection_name: str = "generation_jobs"):
+        self.db = db
+        self.collection = db[collection_name]
+        self.handlers: Dict[str, Callable[[Dict[str, Any], "JobQueue"], None]] = {}
+        self._workers: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        # job_id -> (worker_id, set when the lease is lost) for jobs running in this process
+        self._leases: Dict[Any, Tuple[str, threading.Event]] = {}
+        self._leases_lock = threading.Lock()
+
+        try:
+            self.collection.create_index([("status", 1), ("created_at", 1)])
+            self.collection.create_index("lease_expires_at")
+        except Exception as e:
+            print(f"Failed to create job queue indexes: {e}")
+
+    def register_handler(self, job_type: str, handler: Callable[[Dict[str, Any], "JobQueue"], None]) -> None:
+        self.handlers[job_type] = handler
+
+    def enqueue(
+        self,
+        job_type: str,
+        slides: List[Dict[str, Any]],
+        payload: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Persist a new job and return its id.
+
+        Args:
+            job_type: Name of a registered handler
+            slides: Slides to process, each with at least slide_id and title
+            payload: Handler-specific parameters (user_id, course_id, ...)
+        """
+        now = datetime.now()
+        job = {
+            "job_type": job_type,
+            "status": "queued",
+            "payload": payload or {},
+            "slides": [
+                {
+                    "slide_id": slide["slide_id"],
+                    "title": slide.get("title"),
+                    "status": "pending",
+                    "attempts": 0,
+                    "error": None,
+                    "updated_at": now
+                }
+                for slide in slides
+            ],
+            "attempts": 0,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        result = self.collection.insert_one(job)
+        return str(result.inserted_id)
+
+    def supersede(self, job_type: str, payload: Dict[str, Any]) -> int:
+        """
+        Mark queued jobs of job_type whose payload matches every given field as
+        superseded, so workers never claim them. Running jobs are not touched.
+
+        Returns:
+            Number of jobs superseded
+        """
+        now = datetime.now()
+        query = {"status": "queued", "job_type": job_type}
+        query.update({f"payload.{field}": value for field, value in payload.items()})
+        return self.collection.update_many(
+            query,
+            {"$set": {"status": "superseded", "finished_at": now, "updated_at": now}}
+        ).modified_count
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.collection.find_one({"_id": ObjectId(job_id)})
+        except Exception:
+            return None
+
+    def _fail_exhausted(self, now: datetime) -> None:
+        """Fail expired jobs that have used up their attempts (their worker died each time)"""
+        self.collection.update_many(
+            {"status": "running", "lease_expires_at": {"$lt": now}, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+            {"$set": {
+                "status": "failed",
+                "error": f"Worker lost the job {JOB_MAX_ATTEMPTS} times",
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "finished_at": now,
+                "updated_at": now
+            }}
+        )
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically claim the oldest queued job, or a running job whose lease expired"""
+        now = datetime.now()
+        self._fail_exhausted(now)
+        return self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "lease_expires_at": {"$lt": now}, "attempts": {"$lt": JOB_MAX_ATTEMPTS}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    "heartbeat_at": now,
+                    "started_at": now,
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def heartbeat(self, job_id, worker_id: str) -> bool:
+        """Extend the lease; returns False if the lease was lost to another worker"""
+        now = datetime.now()
+        result = self.collection.update_one(
+            {"_id": job_id, "lease_owner": worker_id, "status": "running"},
+            {"$set": {
+                "heartbeat_at": now,
+                "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS)
+            }}
+        )
+        return result.matched_count > 0
+
+    def mark_slide(
+        self,
+        job_id,
+        slide_id: str,
+        status: str,
+        attempts: Optional[int] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        Record progress for one slide of a job.
+
+        Raises:
+            LeaseLost: the job runs in this process but its lease was lost
+        """
+        with self._leases_lock:
+            lease = self._leases.get(job_id)
+        query = {"_id": job_id, "slides.slide_id": slide_id}
+        if lease is not None:
+            worker_id, lost = lease
+            if lost.is_set():
+                raise LeaseLost(f"Lease on job {job_id} lost")
+            query["lease_owner"] = worker_id
+
+        update = {
+            "slides.$.status": status,
+            "slides.$.error": error,
+            "slides.$.updated_at": datetime.now(),
+            "updated_at": datetime.now()
+        }
+        if attempts is not None:
+            update["slides.$.attempts"] = attempts
+        result = self.collection.update_one(query, {"$set": update})
+        if lease is not None and result.matched_count == 0:
+            lease[1].set()
+            raise LeaseLost(f"Lease on job {job_id} lost")
+
+    def finish(self, job_id, worker_id: str, status: str, error: Optional[str] = None) -> None:
+        self.collection.update_one(
+            {"_id": job_id, "lease_owner": worker_id},
+            {"$set": {
+                "status": status,
+                "error": error,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "finished_at": datetime.now(),
+                "updated_at": datetime.now()
+            }}
+        )
+
+    def release(self, job_id, worker_id: str, error: str) -> None:
+        """Put a job back in the queue after a handler crash, or fail it after too many attempts"""
+        job = self.collection.find_one({"_id": job_id}, {"attempts": 1})
+        if job and job.get("attempts", 0) >= JOB_MAX_ATTEMPTS:
+            self.finish(job_id, worker_id, "failed", error)
+            return
+
+        self.collection.update_one(
+            {"_id": job_id, "lease_owner": worker_id},
+            {"$set": {
+                "status": "queued",
+                "error": error,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "updated_at": datetime.now()
+            }}
+        )
+
+    @staticmethod
+    def pending_slides(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Slides still to do (a resumed job skips slides that already completed)"""
+        return [s for s in job.get("slides", []) if s.get("status") != "completed"]
+
+    def process_job(self, job: Dict[str, Any], worker_id: str) -> None:
+        handler = self.handlers.get(job["job_type"])
+        if handler is None:
+            self.finish(job["_id"], worker_id, "failed", f"No handler for job type {job['job_type']}")
+            return
+
+        # Keep the lease alive while the handler runs
+        done = threading.Event()
+        lost = threading.Event()
+        with self._leases_lock:
+            self._leases[job["_id"]] = (worker_id, lost)
+
+        def beat():
+            while not done.wait(JOB_LEASE_SECONDS / 3):
+                if not self.heartbeat(job["_id"], worker_id):
+                    print(f"⚠️ Lost lease on job {job['_id']}")
+                    lost.set()
+                    return
+
+        heartbeat_thread = threading.Thread(target=beat, daemon=True)
+        heartbeat_thread.start()
+
+        try:
+            handler(job, self)
+            if lost.is_set():
+                # Another worker owns the job now and reports its outcome
+                print(f"⚠️ Job {job['_id']} abandoned after losing its lease")
+                return
+            refreshed = self.collection.find_one({"_id": job["_id"]}, {"slides.status": 1})
+            failed = [s for s in refreshed.get("slides", []) if s.get("status") == "failed"]
+            self.finish(job["_id"], worker_id, "completed_with_errors" if failed else "completed")
+        except LeaseLost:
+            print(f"⚠️ Job {job['_id']} abandoned after losing its lease")
+        except Exception as e:
+            print(f"✗ Job {job['_id']} crashed: {e}")
+            traceback.print_exc()
+            self.release(job["_id"], worker_id, str(e))
+        finally:
+            done.set()
+            with self._leases_lock:
+                self._leases.pop(job["_id"], None)
+
+    def _worker_loop(self, worker_id: str) -> None:
+        while not self._stop_event.is_set():
+            try:
+                job = self.claim(worker_id)
+            except Exception as e:
+                print(f"Job claim failed: {e}")
+                job = None
+
+            if job is None:
+                self._stop_event.wait(JOB_POLL_INTERVAL_SECONDS)
+                continue
+
+            print(f"[{worker_id}] Processing job {job['_id']} ({job['job_type']})")
+            self.process_job(job, worker_id)
+
+    def start_workers(self, count: int = JOB_WORKERS) -> None:
+        """Start local worker threads (idempotent)"""
+        if self._workers:
+            return
+
+        self._stop_event.clear()
+        host = socket.gethostname()
+        for i in range(count):
+            worker_id = f"{host}:{os.getpid()}:{i}"
+            thread = threading.Thread(target=self._worker_loop, args=(worker_id,), daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+    def stop_workers(self) -> None:
+        self._stop_event.set()
+        for thread in self._workers:
+            thread.join(timeout=5)
+        self._workers = []
+
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job status document for API responses"""
+    slides = job.get("slides", [])
+    counts = {}
+    for slide in slides:
+        counts[slide.get("status")] = counts.get(slide.get("status"), 0) + 1
+
+    return {
+        "job_id": str(job["_id"]),
+        "job_type": job.get("job_type"),
+        "status": job.get("status"),
+        "payload": job.get("payload", {}),
+        "attempts": job.get("attempts", 0),
+        "error": job.get("error"),
+        "progress": {
+            "total": len(slides),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "running": counts.get("running", 0),
+            "pending": counts.get("pending", 0)
+        },
+        "slides": slides,
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at"),
+        "finished_at": job.get("finished_at")
+    }
@@ -0,0 +1,121 @@
+"""
+Pluggable LLM backends for slide generation.
+
+SlideGenerator talks to an LLMBackend instead of google.generativeai directly.
+The backend is selected with the LLM_BACKEND environment variable:
+- "gemini" (default): Google Gemini, requires GEMINI_API_KEY
+- "fake": deterministic local model (see fake_llm.py) for offline runs and benchmarks
+"""
+
+import os
+from typing import Iterator, Optional
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+
+
+class LLMResponse:
+    """Text and token usage of one model call"""
+
+    def __init__(self, text: str, prompt_tokens: Optional[int] = None, response_tokens: Optional[int] = None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+
+
+class LLMStream:
+    """
+    Iterable of text chunks from a streaming call.
+    Token counts are filled in once the stream has been consumed.
+    """
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self.prompt_tokens: Optional[int] = None
+        self.response_tokens: Optional[int] = None
+
+    def __iter__(self) -> Iterator[str]:
+        return self._chunks
+
+
+class LLMBackend:
+    """Interface every model backend implements"""
+
+    # Reported as metadata.generated_by
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> LLMStream:
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google.generativeai"""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    @staticmethod
+    def _request_options(timeout: Optional[float]):
+        return {"timeout": timeout} if timeout else None
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        response = self.model.generate_content(prompt, request_options=self._request_options(timeout))
+
+        # Validate response
+        if not response or not hasattr(response, 'text'):
+            raise ValueError("Empty or invalid response from Gemini API")
+
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMResponse(
+            response.text,
+            prompt_tokens=usage.prompt_token_count if usage else None,
+            response_tokens=usage.candidates_token_count if usage else None
+        )
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> LLMStream:
+        response = self.model.generate_content(
+            prompt,
+            stream=True,
+            request_options=self._request_options(timeout)
+        )
+
+        def chunks():
+            for chunk in response:
+                text = getattr(chunk, 'text', '')
+                if text:
+                    yield text
+            # usage_metadata is only complete once the stream has been consumed
+            usage = getattr(response, 'usage_metadata', None)
+            if usage:
+                stream.prompt_tokens = usage.prompt_token_count
+                stream.response_tokens = usage.candidates_token_count
+
+        stream = LLMStream(chunks())
+        return stream
+
+
+def get_llm_backend(model_name: str) -> LLMBackend:
+    """Create the backend selected by LLM_BACKEND"""
+    if LLM_BACKEND == "fake":
+        from fake_llm import FakeBackend
+        return FakeBackend()
+
+    if LLM_BACKEND != "gemini":
+        raise ValueError(f"Unknown LLM_BACKEND '{LLM_BACKEND}' (expected 'gemini' or 'fake')")
+
+    return GeminiBackend(model_name)
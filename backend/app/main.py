@@ -1,19 +1,42 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any
 from datetime import datetime, timedelta
+from bson import ObjectId
+import base64
+import copy
+import json
+import time
 from database import get_database
 from learning_identity import LearningIdentityExtractor
-from gemini_generator import get_slide_generator
+from gemini_generator import get_slide_generator, get_style_bucket, ModelUnavailableError
+from fallback_regeneration import FallbackRegenerator
+from generation_cache import get_generation_cache
+from single_flight import SingleFlightOverloaded
+from prefetch import SlidePrefetcher
+from style_regeneration import StyleRegenerator, StyleBucketChanged, current_visual_text_score
+from render_service import get_render_service, RenderQueueFull
+from manim_preflight import ScenePreflightError
+from storage_manager import get_storage_manager
+from blob_store import get_blob_store, animation_response
+from quality_ladder import get_quality_ladder, select_video_quality
+from animation_variants import get_variant_stage, client_hints, select_rendition
+from admission import get_admission_controller, AdmissionRejected
+from pregeneration import (
+    pregenerate_slides, PREGEN_MAX_RETRIES, PREGEN_CONCURRENCY, PREGEN_BATCH_SIZE, PREGEN_SLIDE_TIMEOUT_SECONDS
+)
+from job_queue import JobQueue, LeaseLost, serialize_job
+from slide_store import save_generated_slide, hydrate_slides, iter_hydrated_slides, ensure_unique_slide_index
 from understanding_calculator import (
     calculate_understanding_score,
     calculate_expected_time,
     aggregate_focus_scores,
     should_adjust_identity
 )
+import asyncio
 import threading
 from screen_tracker import ScreenTimeTracker
 
@@ -35,14 +58,63 @@ app.add_middleware(
 # Database instance
 db = get_database()
 
-# Mount static files for animations (videos)
-import os
-MANIM_OUTPUT_DIR = os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")
-try:
-    app.mount("/animations", StaticFiles(directory=MANIM_OUTPUT_DIR), name="animations")
-except RuntimeError:
-    # Directory doesn't exist yet, will be created when first animation is generated
-    pass
+# Shared cache of generated slide content (memory + Mongo)
+generation_cache = get_generation_cache(db)
+
+# Durable queue for background generation (chapter pre-generation, retries)
+job_queue = JobQueue(db) if db is not None else None
+
+# Request/token budgets for LLM generation
+admission = get_admission_controller()
+
+# Regenerates slides served as fallback content once the model recovers
+fallback_regenerator = FallbackRegenerator(generation_cache, admission)
+
+# Speculative generation of the slides a student is about to reach
+prefetcher = SlidePrefetcher(db, generation_cache) if db is not None else None
+
+# Rendered media, content-addressed and readable by every API node
+blob_store = get_blob_store(db)
+
+# Manim renders run on a bounded worker pool, cached by scene content
+render_service = get_render_service(db)
+
+# Animations are published at low quality first and upgraded in the background
+quality_ladder = get_quality_ladder(db)
+
+# Smaller renditions and poster frames of every published animation
+variant_stage = get_variant_stage(db)
+
+# Quota, eviction and cleanup of rendered media on disk
+storage_manager = get_storage_manager(db, blob_store)
+
+# Regenerates upcoming slides when an identity update changes the style bucket
+style_regenerator = StyleRegenerator(db, job_queue) if job_queue is not None else None
+
+# Animations (videos, thumbnails, posters) are served from the blob store with
+# Range, ETag and long-lived caching; serving a file marks it as recently used
+@app.api_route("/animations/{path:path}", methods=["GET", "HEAD"])
+def serve_animation(path: str, request: Request):
+    return animation_response(blob_store, path, request.headers, request.method)
+
+
+@app.on_event("startup")
+async def ensure_indexes():
+    """Create the indexes the hot read paths rely on."""
+    if db is None:
+        return
+    
+    try:
+        # Pre-generated slides are paginated by (generated_at, _id) within a user's chapter
+        db.generated_slides.create_index([
+            ("user_id", 1), ("course_id", 1), ("chapter_id", 1), ("generated_at", 1), ("_id", 1)
+        ])
+        # One row per user slide, looked up when a slide is (re)generated
+        ensure_unique_slide_index(db)
+        # Quality upgrades switch every slide showing a scene's lower-quality video
+        db.generated_slides.create_index("video_url", sparse=True)
+    except Exception as e:
+        print(f"Failed to create indexes: {e}")
 
 # Pydantic models for request/response validation
 class UserProfile(BaseModel):
@@ -125,6 +197,7 @@ class SlideChangeRequest(BaseModel):
     new_slide_id: str
     previous_slide_id: Optional[str] = None
     time_on_previous: Optional[float] = None
+    course_id: Optional[str] = None  # Looked up from slide_topics when omitted
 
 class QuizResultRequest(BaseModel):
     user_id: str
@@ -148,8 +221,16 @@ class SlideGenerationResponse(BaseModel):
     topic: str
     video_url: Optional[str] = None  # For manim animations
     thumbnail_url: Optional[str] = None  # For manim animations
+    video_quality: Optional[str] = None  # Manim quality flag of video_url (l, m, h, ...)
+    video_variants: Optional[Dict[str, str]] = None  # Rendered qualities and their URLs
+    video_renditions: Optional[List[Dict[str, Any]]] = None  # Smaller encodings of video_url (360p, WebM, ...)
+    poster_url: Optional[str] = None  # Full-resolution frame to show while the video loads
     metadata: Dict[str, Any]
 
+class RenderRequest(BaseModel):
+    manim_code: str
+    topic: str
+
 
 # Helper function to convert MongoDB ObjectId to string
 def serialize_doc(doc: dict) -> dict:
@@ -158,6 +239,50 @@ def serialize_doc(doc: dict) -> dict:
     return doc
 
 
+# Pagination helpers for pre-generated slides.
+# Cursors are opaque to clients: base64 of the (generated_at, _id) sort key of the last slide returned.
+def encode_slide_cursor(doc: dict) -> str:
+    payload = json.dumps({"t": doc["generated_at"].isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_slide_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        generated_at = datetime.fromisoformat(payload["t"])
+        last_id = ObjectId(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
+    # Everything strictly after the last (generated_at, _id) pair
+    return {
+        "$or": [
+            {"generated_at": {"$gt": generated_at}},
+            {"generated_at": generated_at, "_id": {"$gt": last_id}}
+        ]
+    }
+
+
+def build_slide_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Turn a comma-separated `fields` parameter into a Mongo projection (None = all fields)."""
+    if not fields:
+        return None
+    
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    for field in requested:
+        if field.startswith("$") or not all(c.isalnum() or c in "_." for c in field):
+            raise HTTPException(status_code=400, detail=f"Invalid field name: {field}")
+    
+    # The sort key is always needed to build the next cursor
+    projection = {field: 1 for field in requested}
+    if "content" in projection:
+        # Content lives in slide_contents and is resolved through its hash
+        projection["content_hash"] = 1
+    projection["generated_at"] = 1
+    projection["slide_id"] = 1
+    return projection
+
+
 # ENDPOINT 1: GET User Profile
 @app.get("/api/users/{user_id}/profile", response_model=UserProfile)
 async def get_user_profile(user_id: str):
@@ -419,6 +544,25 @@ async def get_session_state(session_id: str):
         raise HTTPException(status_code=500, detail=f"Error fetching session state: {str(e)}")
 
 
+def regenerate_for_identity_update(
+    user_id: str,
+    old_identity: Optional[Dict[str, Any]],
+    new_identity: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Queue regeneration of upcoming slides if an identity update crossed a style boundary.
+    Never fails the request that updated the identity.
+    """
+    if style_regenerator is None:
+        return None
+    
+    try:
+        return style_regenerator.on_identity_update(user_id, old_identity, new_identity)
+    except Exception as e:
+        print(f"Style regeneration check failed for {user_id}: {e}")
+        return None
+
+
 @app.post("/api/session/{session_id}/slide-change")
 async def track_slide_change(
     session_id: str,
@@ -484,8 +628,9 @@ async def track_slide_change(
         })
         
         # ADJUST LEARNING IDENTITY if confusion detected
+        user = db.users.find_one({"user_id": request.user_id})
+        style_update = None
         if confusion_signals:
-            user = db.users.find_one({"user_id": request.user_id})
             if user and "learning_identity" in user:
                 identity = user["learning_identity"]
                 adjusted_identity = LearningIdentityExtractor.adjust_identity_for_confusion(
@@ -497,12 +642,35 @@ async def track_slide_change(
                     {"user_id": request.user_id},
                     {"$set": {"learning_identity": adjusted_identity}}
                 )
+                style_update = regenerate_for_identity_update(request.user_id, identity, adjusted_identity)
+        
+        # PREFETCH the next slides in the background, paced by the learner
+        prefetch_scheduled = 0
+        try:
+            course_id = request.course_id
+            if not course_id:
+                slide_topic = db.slide_topics.find_one({"slide_id": request.new_slide_id}, {"course_id": 1})
+                course_id = slide_topic["course_id"] if slide_topic else None
+            
+            if course_id:
+                identity = (user or {}).get("learning_identity", {})
+                prefetch_scheduled = prefetcher.schedule(
+                    request.user_id,
+                    course_id,
+                    request.new_slide_id,
+                    pace=identity.get("pace", "moderate"),
+                    visual_text_score=identity.get("visual_text_score", 0.5)
+                )
+        except Exception as e:
+            print(f"Prefetch scheduling failed: {e}")
         
         return {
             "message": "Slide change tracked",
+            "prefetch_scheduled": prefetch_scheduled,
             "confusion_signals_detected": len(confusion_signals),
             "signals": confusion_signals,
-            "identity_adjusted": len(confusion_signals) > 0
+            "identity_adjusted": len(confusion_signals) > 0,
+            "style_update": style_update
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error tracking slide change: {str(e)}")
@@ -573,6 +741,7 @@ async def track_quiz_result(
         })
         
         # ADJUST LEARNING IDENTITY if confusion detected
+        style_update = None
         if confusion_signals:
             user = db.users.find_one({"user_id": request.user_id})
             if user and "learning_identity" in user:
@@ -586,13 +755,15 @@ async def track_quiz_result(
                     {"user_id": request.user_id},
                     {"$set": {"learning_identity": adjusted_identity}}
                 )
+                style_update = regenerate_for_identity_update(request.user_id, identity, adjusted_identity)
         
         return {
             "message": "Quiz result tracked",
             "passed": request.passed,
             "confusion_signals_detected": len(confusion_signals),
             "signals": confusion_signals,
-            "identity_adjusted": len(confusion_signals) > 0
+            "identity_adjusted": len(confusion_signals) > 0,
+            "style_update": style_update
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error tracking quiz result: {str(e)}")
@@ -669,6 +840,9 @@ async def end_session(session_id: str, request: SessionEndRequest):
             # Remove from cache
             del active_sessions[session_id]
         
+        # Student left: stop speculative generation for them
+        prefetcher.cancel_user(request.user_id)
+        
         return {
             "message": "Session ended",
             "session_id": session_id,
@@ -720,6 +894,7 @@ async def extract_learning_identity(user_id: str, lookback_days: int = Query(30,
             },
             upsert=True
         )
+        regenerate_for_identity_update(user_id, current_identity, identity_dict)
         
         return LearningIdentityResponse(
             user_id=user_id,
@@ -808,8 +983,8 @@ async def generate_slide(request: SlideGenerationRequest):
         # Get slide generator
         generator = get_slide_generator()
         
-        # Generate content (HTML or Manim based on visual_text_score)
-        result = generator.generate_slide_content(
+        # Generate content (HTML or Manim based on visual_text_score) off the event loop
+        cache_kwargs = dict(
             topic=request.topic,
             learning_objectives=request.learning_objectives,
             visual_text_score=visual_text_score,
@@ -817,6 +992,17 @@ async def generate_slide(request: SlideGenerationRequest):
             previous_content=request.previous_content,
             force_format=request.force_format
         )
+        try:
+            # Only a cache miss takes an admission slot
+            result = await generation_cache.get_or_generate_async(
+                generator, admit=lambda: admission.admit(request.user_id), **cache_kwargs
+            )
+        except ModelUnavailableError as e:
+            # Serve fallback content now and regenerate once the model recovers; single-flight
+            # waiters share the exception, so each annotates its own copy
+            result = copy.deepcopy(e.fallback)
+            result["metadata"]["regeneration_scheduled"] = fallback_regenerator.schedule(generator, cache_kwargs, request.user_id)
+        admission.charge(request.user_id, result.get("metadata"))
         
         # Log the generation event
         db.slide_generations.insert_one({
@@ -834,11 +1020,19 @@ async def generate_slide(request: SlideGenerationRequest):
             topic=result["topic"],
             video_url=result.get("video_url"),
             thumbnail_url=result.get("thumbnail_url"),
+            video_quality=result.get("video_quality"),
+            video_variants=result.get("video_variants"),
+            video_renditions=result.get("video_renditions"),
+            poster_url=result.get("poster_url"),
             metadata=result.get("metadata", {})
         )
     
     except HTTPException:
         raise
+    except SingleFlightOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating slide: {str(e)}")
 
@@ -868,7 +1062,8 @@ async def complete_chapter(
     """
     Mark a chapter as complete and pre-generate slides for the next chapter.
     - If this is chapter_1 (baseline): Extract learning identity first
-    - Then: Pre-generate ALL slides for the next chapter based on user's profile
+    - Then: Queue a background job that pre-generates ALL slides for the next chapter
+      based on user's profile. Poll GET /api/jobs/{job_id} for progress.
     
     - chapter_id: The chapter being completed (e.g., "chapter_1")
     - course_id: The course this chapter belongs to
@@ -893,8 +1088,8 @@ async def complete_chapter(
         is_baseline = chapter_id == "chapter_1" or "chapter_1" in chapter_id
         
         profile_generated = False
-        slides_generated = 0
         next_chapter_id = None
+        job_id = None
         
         # Extract or update learning identity
         user = db.users.find_one({"user_id": user_id})
@@ -931,87 +1126,18 @@ async def complete_chapter(
             if next_chapter_id == "chapter_1" or "chapter_1" in next_chapter_id:
                 print(f"⚠️ Skipping pre-generation for {next_chapter_id} - baseline chapter uses hardcoded HTML")
             else:
-                print(f"Pre-generating {len(next_chapter_slides)} slides for {next_chapter_id}...")
-                generator = get_slide_generator()
-                
-                failed_slides = []
-                
-                for slide_topic in next_chapter_slides:
-                    max_retries = 2
-                    retry_count = 0
-                    success = False
-                    
-                    while retry_count <= max_retries and not success:
-                        try:
-                            # Generate slide content based on user's profile
-                            print(f"  Generating: {slide_topic['title']}... (attempt {retry_count + 1}/{max_retries + 1})")
-                            result = generator.generate_slide_content(
-                                topic=slide_topic["title"],
-                                learning_objectives=slide_topic["learning_objectives"],
-                                visual_text_score=identity.visual_text_score,
-                                context=slide_topic["context"]
-                            )
-                            
-                            # Validate generated content
-                            if not result.get("content") or len(result.get("content", "")) < 50:
-                                raise ValueError("Generated content is too short or empty")
-                            
-                            # Store generated slide in database
-                            generated_slide = {
-                                "user_id": user_id,
-                                "course_id": course_id,
-                                "chapter_id": next_chapter_id,
-                                "slide_id": slide_topic["slide_id"],
-                                "title": slide_topic["title"],
-                                "content": result["content"],
-                                "content_type": result["content_type"],
-                                "visual_text_score": result["visual_text_score"],
-                                "video_url": result.get("video_url"),
-                                "thumbnail_url": result.get("thumbnail_url"),
-                                "metadata": result.get("metadata", {}),
-                                "generated_at": datetime.now(),
-                                "generation_attempts": retry_count + 1
-                            }
-                            db.generated_slides.insert_one(generated_slide)
-                            slides_generated += 1
-                            success = True
-                            print(f"  ✓ Generated: {slide_topic['title']}")
-                            
-                        except Exception as e:
-                            retry_count += 1
-                            error_msg = str(e)
-                            print(f"  ✗ Attempt {retry_count} failed for '{slide_topic['title']}': {error_msg}")
-                            
-                            if retry_count > max_retries:
-                                # Store failed slide for later retry
-                                failed_slides.append({
-                                    "slide_id": slide_topic["slide_id"],
-                                    "title": slide_topic["title"],
-                                    "error": error_msg
-                                })
-                                
-                                # Store failure in database for tracking
-                                db.generation_failures.insert_one({
-                                    "user_id": user_id,
-                                    "course_id": course_id,
-                                    "chapter_id": next_chapter_id,
-                                    "slide_id": slide_topic["slide_id"],
-                                    "slide_title": slide_topic["title"],
-                                    "error": error_msg,
-                                    "failed_at": datetime.now(),
-                                    "retry_count": retry_count
-                                })
-                            else:
-                                # Wait before retry (exponential backoff)
-                                import time
-                                time.sleep(2 ** retry_count)
-                
-                print(f"✓ Pre-generated {slides_generated}/{len(next_chapter_slides)} slides for {next_chapter_id}")
-                
-                if failed_slides:
-                    print(f"⚠️ {len(failed_slides)} slides failed to generate and will be retried on-demand:")
-                    for failed in failed_slides:
-                        print(f"  - {failed['title']}: {failed['error']}")
+                # Hand the work to the background job queue and return immediately
+                job_id = job_queue.enqueue(
+                    "pregenerate_chapter",
+                    next_chapter_slides,
+                    payload={
+                        "user_id": user_id,
+                        "course_id": course_id,
+                        "chapter_id": next_chapter_id,
+                        "visual_text_score": identity.visual_text_score
+                    }
+                )
+                print(f"Queued pre-generation of {len(next_chapter_slides)} slides for {next_chapter_id} (job {job_id})")
         else:
             print(f"No more chapters found after {chapter_id}")
         
@@ -1021,10 +1147,9 @@ async def complete_chapter(
             "next_chapter_id": next_chapter_id if next_chapter_slides else None,
             "is_baseline": is_baseline,
             "profile_generated": profile_generated,
-            "slides_generated": slides_generated,
+            "job_id": job_id,
+            "job_status": "queued" if job_id else None,
             "slides_total": len(next_chapter_slides),
-            "slides_failed": len(failed_slides) if 'failed_slides' in locals() else 0,
-            "failed_slides": failed_slides if 'failed_slides' in locals() else [],
             "timestamp": datetime.now()
         }
     
@@ -1134,8 +1259,9 @@ async def generate_slide_for_user(request: SlideGenerationRequest):
         # Get slide generator
         generator = get_slide_generator()
         
-        # Generate personalized content
-        result = generator.generate_slide_content(
+        # Generate personalized content off the event loop; identical concurrent
+        # requests share one in-flight generation
+        cache_kwargs = dict(
             topic=request.topic,
             learning_objectives=request.learning_objectives,
             visual_text_score=visual_text_score,
@@ -1143,6 +1269,17 @@ async def generate_slide_for_user(request: SlideGenerationRequest):
             previous_content=request.previous_content,
             force_format=request.force_format
         )
+        try:
+            # Only a cache miss takes an admission slot
+            result = await generation_cache.get_or_generate_async(
+                generator, admit=lambda: admission.admit(request.user_id), **cache_kwargs
+            )
+        except ModelUnavailableError as e:
+            # Serve fallback content now and regenerate once the model recovers; single-flight
+            # waiters share the exception, so each annotates its own copy
+            result = copy.deepcopy(e.fallback)
+            result["metadata"]["regeneration_scheduled"] = fallback_regenerator.schedule(generator, cache_kwargs, request.user_id)
+        admission.charge(request.user_id, result.get("metadata"))
         
         # Log the generation for analytics
         db.slide_generations.insert_one({
@@ -1154,6 +1291,10 @@ async def generate_slide_for_user(request: SlideGenerationRequest):
             "metadata": result.get("metadata", {})
         })
         
+        # Count whether a prefetch had already produced this slide
+        metadata = result.get("metadata", {})
+        prefetcher.record_demand(metadata.get("cache_key"), metadata.get("cache_hit", False))
+        
         return SlideGenerationResponse(
             content=result["content"],
             content_type=result.get("content_type", "html"),
@@ -1161,51 +1302,248 @@ async def generate_slide_for_user(request: SlideGenerationRequest):
             topic=result["topic"],
             video_url=result.get("video_url"),
             thumbnail_url=result.get("thumbnail_url"),
+            video_quality=result.get("video_quality"),
+            video_variants=result.get("video_variants"),
+            video_renditions=result.get("video_renditions"),
+            poster_url=result.get("poster_url"),
             metadata=result.get("metadata", {})
         )
     
     except HTTPException:
         raise
+    except SingleFlightOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": e.retry_after_header})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating slide: {str(e)}")
 
 
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that calls on_close however the response ends. The body
+    generator's own finally never runs if the client disconnects before the first
+    chunk is pulled, so cleanup (e.g. releasing an admission slot) happens here.
+    """
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+
+@app.post("/api/slides/generate-for-user/stream")
+async def stream_slide_for_user(request: SlideGenerationRequest):
+    """
+    Generate personalized slide content and stream it as Server-Sent Events.
+    
+    Events:
+    - chunk: {"html": "..."} partial HTML as the model produces it
+    - fallback: fallback slide to show instead, sent when the model is unavailable
+    - done: the validated result (same fields as /api/slides/generate-for-user)
+    - error: {"detail": "..."} if generation failed
+    
+    Cached generations, and requests that join an identical generation already
+    in flight, are sent as a single chunk followed by done. The final document is
+    stored in the generation cache when the stream finishes.
+    
+    - request: Contains topic, learning_objectives, user_id, context
+    """
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+    
+    # SAFETY CHECK: Prevent generation for chapter_1 (baseline chapter)
+    if request.context and ("chapter_1" in request.context.lower() or "chapter 1" in request.context.lower()):
+        raise HTTPException(
+            status_code=400, 
+            detail="Chapter 1 is the baseline chapter and should use hardcoded HTML content, not LLM generation."
+        )
+    
+    try:
+        user = db.users.find_one({"user_id": request.user_id})
+        if not user or "learning_identity" not in user:
+            visual_text_score = 0.5
+        else:
+            visual_text_score = user["learning_identity"].get("visual_text_score", 0.5)
+        
+        generator = get_slide_generator()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating slide: {str(e)}")
+    
+    cache_kwargs = dict(
+        topic=request.topic,
+        learning_objectives=request.learning_objectives,
+        visual_text_score=visual_text_score,
+        context=request.context,
+        previous_content=request.previous_content
+    )
+    try:
+        # Cache hits and requests joining an in-flight generation are never throttled. The one
+        # that calls the model is admitted now, so an over-budget client gets a 429 rather
+        # than an error event; the response releases its slot when it ends
+        stream = await asyncio.to_thread(
+            generation_cache.open_stream, generator, admit=lambda: admission.admit(request.user_id), **cache_kwargs
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": e.retry_after_header})
+    except SingleFlightOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    def sse(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+    
+    async def event_stream():
+        try:
+            result = None
+            try:
+                # Same result shape and metadata as the non-streaming endpoint
+                async for kind, payload in stream.events():
+                    if kind == "chunk":
+                        yield sse("chunk", {"html": payload})
+                    else:
+                        result = payload
+            except ModelUnavailableError as e:
+                # Replace whatever was streamed with fallback content and regenerate later
+                result = copy.deepcopy(e.fallback)
+                result["metadata"]["regeneration_scheduled"] = fallback_regenerator.schedule(generator, cache_kwargs, request.user_id)
+                yield sse("fallback", result)
+            admission.charge(request.user_id, result.get("metadata"))
+            
+            # Log the generation for analytics
+            await asyncio.to_thread(db.slide_generations.insert_one, {
+                "user_id": request.user_id,
+                "topic": request.topic,
+                "visual_text_score": visual_text_score,
+                "generated_at": datetime.now(),
+                "content_type": result.get("content_type"),
+                "metadata": result.get("metadata", {})
+            })
+            
+            yield sse("done", result)
+        
+        except Exception as e:
+            yield sse("error", {"detail": f"Error generating slide: {str(e)}"})
+    
+    return ClosingStreamingResponse(
+        event_stream(),
+        on_close=stream.close,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Browsers send the hints on later requests once asked; responses differ by them
+CLIENT_HINT_HEADERS = {
+    "Accept-CH": "Save-Data, Downlink, ECT",
+    "Vary": "Save-Data, Downlink, ECT"
+}
+
+
 @app.get("/api/slides/pre-generated")
 async def get_pre_generated_slides(
+    request: Request,
+    response: Response,
     user_id: str = Query(..., description="User ID"),
     course_id: str = Query(..., description="Course ID"),
-    chapter_id: str = Query(..., description="Chapter ID")
+    chapter_id: str = Query(..., description="Chapter ID"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (e.g. 'slide_id,title,content')"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by a previous call"),
+    limit: Optional[int] = Query(None, ge=1, le=100, description="Maximum number of slides to return"),
+    stream: bool = Query(False, description="Stream slides as NDJSON while the cursor yields them"),
+    video_quality: str = Query("best", description="Animation quality: 'best' rendered so far, or a quality flag such as 'l'")
 ):
     """
     Fetch pre-generated slides for a specific user, course, and chapter.
     Returns slides that were generated after completing the previous chapter.
     
+    Slides are ordered by (generated_at, _id). When `limit` is reached the response
+    includes a `next_cursor` to fetch the following page. With `stream=true` each slide
+    is written as one JSON line as soon as it is read, followed by a final
+    {"next_cursor": ...} line when there are more slides.
+    
     - user_id: The user requesting slides
     - course_id: The course ID
     - chapter_id: The chapter ID
+    - fields: Optional projection, e.g. "slide_id,title" to skip content and metadata
+    - cursor: Resume after the last slide of a previous page
+    - limit: Page size (1-100), omit to return every slide
+    - stream: Return application/x-ndjson instead of a single JSON document
+    - video_quality: "best" (default) serves the best rendered animation; "l" keeps the fast low-quality one
+    
+    With video_quality=best the video is also chosen from the Save-Data, Downlink and
+    ECT client hints: constrained connections get the smallest rendition, others get
+    `video_sources` (WebM first, mp4 fallback). The response asks browsers for the hints.
     """
     if db is None:
         raise HTTPException(status_code=503, detail="Database connection unavailable")
     
     try:
-        # Find pre-generated slides
-        slides = list(
-            db.generated_slides.find({
-                "user_id": user_id,
-                "course_id": course_id,
-                "chapter_id": chapter_id
-            }).sort("generated_at", 1)
-        )
+        query = {
+            "user_id": user_id,
+            "course_id": course_id,
+            "chapter_id": chapter_id
+        }
+        if cursor:
+            query.update(decode_slide_cursor(cursor))
+        
+        projection = build_slide_projection(fields)
+        
+        slides_cursor = db.generated_slides.find(query, projection).sort([("generated_at", 1), ("_id", 1)])
+        if limit:
+            slides_cursor = slides_cursor.limit(limit)
+        
+        # Content is only resolved when it was requested
+        needs_content = projection is None or "content" in projection
+        
+        hints = client_hints(request.headers)
+        
+        def select_video(slide: Dict[str, Any]) -> Dict[str, Any]:
+            if video_quality == "best":
+                return select_rendition(slide, hints)
+            return select_video_quality(slide, video_quality)
+        
+        if stream:
+            def ndjson_lines():
+                returned = 0
+                last_slide = None
+                slides_iter = iter_hydrated_slides(db, slides_cursor) if needs_content else slides_cursor
+                for slide in slides_iter:
+                    returned += 1
+                    last_slide = select_video(slide)
+                    yield json.dumps(jsonable_encoder(slide, custom_encoder={ObjectId: str})) + "\n"
+                
+                if limit and returned == limit and last_slide is not None:
+                    yield json.dumps({"next_cursor": encode_slide_cursor(last_slide)}) + "\n"
+            
+            return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson", headers=CLIENT_HINT_HEADERS)
+        
+        slides = list(slides_cursor)
+        if needs_content:
+            hydrate_slides(db, slides)
+        
+        next_cursor = None
+        if limit and len(slides) == limit:
+            next_cursor = encode_slide_cursor(slides[-1])
         
         # Remove MongoDB _id for serialization
         for slide in slides:
             slide["_id"] = str(slide["_id"])
+            select_video(slide)
         
+        response.headers.update(CLIENT_HINT_HEADERS)
         return {
             "slides": slides,
-            "count": len(slides)
+            "count": len(slides),
+            "next_cursor": next_cursor
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching pre-generated slides: {str(e)}")
 
@@ -1218,7 +1556,7 @@ async def retry_failed_generations(
 ):
     """
     Retry generation for slides that failed during pre-generation.
-    This can be called manually or scheduled as a background job.
+    The retries run in the background job queue; poll GET /api/jobs/{job_id} for progress.
     
     - user_id: The user ID
     - course_id: The course ID
@@ -1251,76 +1589,505 @@ async def retry_failed_generations(
         identity = user["learning_identity"]
         visual_text_score = identity.get("visual_text_score", 0.5)
         
-        generator = get_slide_generator()
-        retried_count = 0
-        success_count = 0
-        
+        # Retry in the background job queue, one slide per failure
+        slides = {}
         for failure in failed:
+            slides.setdefault(failure["slide_id"], {
+                "slide_id": failure["slide_id"],
+                "title": failure.get("slide_title")
+            })
+        
+        job_id = job_queue.enqueue(
+            "retry_failed",
+            list(slides.values()),
+            payload={
+                "user_id": user_id,
+                "course_id": course_id,
+                "chapter_id": chapter_id,
+                "visual_text_score": visual_text_score
+            }
+        )
+        
+        return {
+            "message": f"Queued {len(slides)} failed slides for retry",
+            "job_id": job_id,
+            "queued": len(slides)
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrying failed generations: {str(e)}")
+
+
+# ============================================================================
+# BACKGROUND GENERATION JOBS
+# ============================================================================
+
+def generate_and_store_slide(
+    user_id: str,
+    course_id: str,
+    chapter_id: str,
+    slide_topic: Dict[str, Any],
+    visual_text_score: float,
+    attempt: int,
+    is_retry: bool = False,
+    admission_deadline: Optional[float] = None,
+    cancelled: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """
+    Generate one slide for a user (through the cache) and store it in generated_slides.
+    admission_deadline (time.monotonic()) bounds the wait for generation budget; once
+    `cancelled` is set (the caller gave up on this attempt) nothing is stored.
+    """
+    generator = get_slide_generator()
+    cache_kwargs = dict(
+        topic=slide_topic["title"],
+        learning_objectives=slide_topic["learning_objectives"],
+        visual_text_score=visual_text_score,
+        context=slide_topic["context"]
+    )
+    
+    # Background work waits for budget instead of failing the slide (cache hits need none)
+    is_fallback = False
+    try:
+        result = generation_cache.get_or_generate(
+            generator,
+            admit=lambda: admission.admit_waiting(user_id, deadline=admission_deadline),
+            **cache_kwargs
+        )
+    except ModelUnavailableError as e:
+        result = copy.deepcopy(e.fallback)
+        is_fallback = True
+    admission.charge(user_id, result.get("metadata"))
+    
+    if cancelled is not None and cancelled.is_set():
+        # The generation stays cached for the next attempt
+        raise TimeoutError("Attempt abandoned after its timeout")
+    
+    if is_fallback:
+        # Store fallback content now; the real slide replaces it once the model recovers
+        fallback_regenerator.schedule(
+            generator,
+            cache_kwargs,
+            user_id,
+            # Only replaces the fallback; a slide stored since (a retry, a style
+            # regeneration) is newer than this one
+            on_success=lambda regenerated: store_slide_result(
+                user_id, course_id, chapter_id, slide_topic, regenerated, attempt, is_retry,
+                only_if={"metadata.is_fallback": True}
+            )
+        )
+    
+    # Validate generated content
+    if not result.get("content") or len(result.get("content", "")) < 50:
+        raise ValueError("Generated content is too short or empty")
+    
+    store_slide_result(user_id, course_id, chapter_id, slide_topic, result, attempt, is_retry)
+    return result
+
+
+def store_slide_result(
+    user_id: str,
+    course_id: str,
+    chapter_id: str,
+    slide_topic: Dict[str, Any],
+    result: Dict[str, Any],
+    attempt: int,
+    is_retry: bool = False,
+    only_if: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Store a generation result as the user's copy of a slide (replacing any previous one).
+    only_if restricts which previous row may be replaced (see save_generated_slide).
+    
+    Raises:
+        StyleBucketChanged: the user's identity moved to another style bucket since
+            the result was generated
+    """
+    generated_slide = {
+        "user_id": user_id,
+        "course_id": course_id,
+        "chapter_id": chapter_id,
+        "slide_id": slide_topic["slide_id"],
+        "title": slide_topic["title"],
+        "content": result["content"],
+        "content_type": result["content_type"],
+        "visual_text_score": result["visual_text_score"],
+        # Lets identity updates find slides made for another style bucket
+        "style_bucket": get_style_bucket(result["visual_text_score"]),
+        "video_url": result.get("video_url"),
+        "thumbnail_url": result.get("thumbnail_url"),
+        "video_quality": result.get("video_quality"),
+        "video_variants": result.get("video_variants"),
+        "video_renditions": result.get("video_renditions"),
+        "poster_url": result.get("poster_url"),
+        "metadata": result.get("metadata", {}),
+        "generated_at": datetime.now(),
+        "generation_attempts": attempt
+    }
+    if result["content_type"] == "manim":
+        # A background upgrade may have finished since the result was produced (or cached)
+        best = quality_ladder.best(result["content"])
+        if best is not None:
+            generated_slide.update({
+                "video_url": best["video_url"],
+                "thumbnail_url": best["thumbnail_url"] or generated_slide["thumbnail_url"],
+                "video_quality": best["quality"],
+                "video_variants": best["video_variants"],
+                "video_renditions": best["video_renditions"],
+                "poster_url": best["poster_url"]
+            })
+    if is_retry:
+        generated_slide["retry_generation"] = True
+    
+    # A slide for the old bucket must not land after (or instead of) the one for the new
+    current_score = current_visual_text_score(db, user_id, result["visual_text_score"])
+    if get_style_bucket(current_score) != generated_slide["style_bucket"]:
+        raise StyleBucketChanged(
+            f"Style bucket of {user_id} changed to '{get_style_bucket(current_score)}' during generation"
+        )
+    
+    save_generated_slide(db, generated_slide, only_if=only_if)
+
+
+def generate_and_store_batches(job: Dict[str, Any], queue: JobQueue, slide_topics: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Generate a chapter's slides in batched model calls (PREGEN_BATCH_SIZE slides each)
+    and store every slide that passed validation.
+    
+    Returns:
+        Stored results by slide_id; anything missing is left for per-slide generation
+    """
+    payload = job["payload"]
+    generator = get_slide_generator()
+    stored = {}
+    
+    for start in range(0, len(slide_topics), PREGEN_BATCH_SIZE):
+        batch = slide_topics[start:start + PREGEN_BATCH_SIZE]
+        for slide_topic in batch:
+            queue.mark_slide(job["_id"], slide_topic["slide_id"], "running", attempts=1)
+        
+        # The identity may have changed since the job was queued
+        visual_text_score = current_visual_text_score(db, payload["user_id"], payload["visual_text_score"])
+        try:
+            results, errors = generation_cache.get_or_generate_batch(
+                generator, batch, visual_text_score,
+                admit=lambda: admission.admit_waiting(payload["user_id"], max_wait_seconds=PREGEN_SLIDE_TIMEOUT_SECONDS)
+            )
+        except Exception as e:
+            print(f"Batch generation failed for {payload['chapter_id']}, generating slides individually: {e}")
+            continue
+        
+        for slide_topic in batch:
+            result = results.get(slide_topic["slide_id"])
+            if result is None:
+                print(f"  ✗ '{slide_topic['title']}' failed in batch: {errors.get(slide_topic['slide_id'])}")
+                continue
+            
+            admission.charge(payload["user_id"], result.get("metadata"))
             try:
-                # Get slide topic
-                slide_topic = db.slide_topics.find_one({
-                    "course_id": course_id,
-                    "chapter_id": chapter_id,
-                    "slide_id": failure["slide_id"]
-                })
-                
-                if not slide_topic:
-                    print(f"Slide topic not found: {failure['slide_id']}")
-                    continue
-                
-                print(f"Retrying: {failure['slide_title']}...")
-                
-                # Retry generation
-                result = generator.generate_slide_content(
-                    topic=slide_topic["title"],
-                    learning_objectives=slide_topic["learning_objectives"],
-                    visual_text_score=visual_text_score,
-                    context=slide_topic["context"]
+                store_slide_result(
+                    payload["user_id"],
+                    payload["course_id"],
+                    payload["chapter_id"],
+                    slide_topic,
+                    result,
+                    attempt=1
                 )
-                
-                # Store successful generation
-                generated_slide = {
-                    "user_id": user_id,
-                    "course_id": course_id,
-                    "chapter_id": chapter_id,
-                    "slide_id": failure["slide_id"],
-                    "title": failure["slide_title"],
-                    "content": result["content"],
-                    "content_type": result["content_type"],
-                    "visual_text_score": result["visual_text_score"],
-                    "video_url": result.get("video_url"),
-                    "thumbnail_url": result.get("thumbnail_url"),
-                    "metadata": result.get("metadata", {}),
-                    "generated_at": datetime.now(),
-                    "retry_generation": True
-                }
-                db.generated_slides.insert_one(generated_slide)
-                
+            except StyleBucketChanged as e:
+                # Left for per-slide generation, which uses the new score
+                print(f"  ✗ '{slide_topic['title']}' not stored: {e}")
+                continue
+            queue.mark_slide(job["_id"], slide_topic["slide_id"], "completed", attempts=1)
+            stored[slide_topic["slide_id"]] = result
+    
+    return stored
+
+
+def run_generation_job(job: Dict[str, Any], queue: JobQueue) -> None:
+    """
+    Job handler for "pregenerate_chapter" and "retry_failed".
+    Generates the job's remaining slides concurrently and records per-slide progress.
+    """
+    payload = job["payload"]
+    is_retry = job["job_type"] == "retry_failed"
+    pending_ids = [s["slide_id"] for s in queue.pending_slides(job)]
+    
+    slide_topics = list(
+        db.slide_topics.find({
+            "course_id": payload["course_id"],
+            "chapter_id": payload["chapter_id"],
+            "slide_id": {"$in": pending_ids}
+        }).sort("order", 1)
+    )
+    
+    found_ids = {t["slide_id"] for t in slide_topics}
+    for slide_id in pending_ids:
+        if slide_id not in found_ids:
+            print(f"Slide topic not found: {slide_id}")
+            queue.mark_slide(job["_id"], slide_id, "failed", error="Slide topic not found")
+    
+    def generate_fn(slide_topic, attempt, cancelled):
+        # pregenerate_slides abandons the attempt after PREGEN_SLIDE_TIMEOUT_SECONDS; waiting for
+        # budget may take half of that, so an admitted attempt still has time to generate
+        admission_deadline = time.monotonic() + PREGEN_SLIDE_TIMEOUT_SECONDS / 2
+        queue.mark_slide(job["_id"], slide_topic["slide_id"], "running", attempts=attempt)
+        # An identity update since the job was queued changes the style of every later slide;
+        # a store that races an update raises StyleBucketChanged and the slide is retried
+        result = generate_and_store_slide(
+            payload["user_id"],
+            payload["course_id"],
+            payload["chapter_id"],
+            slide_topic,
+            current_visual_text_score(db, payload["user_id"], payload["visual_text_score"]),
+            attempt,
+            is_retry=is_retry,
+            admission_deadline=admission_deadline,
+            cancelled=cancelled
+        )
+        # Recorded right away, so progress is visible and a resumed job skips this slide
+        queue.mark_slide(job["_id"], slide_topic["slide_id"], "completed", attempts=attempt)
+        return result
+    
+    failure_query = {
+        "user_id": payload["user_id"],
+        "course_id": payload["course_id"],
+        "chapter_id": payload["chapter_id"]
+    }
+    
+    def record_outcome(outcome):
+        """Failure bookkeeping for one slide, as soon as its outcome is final"""
+        slide_topic = outcome["slide_topic"]
+        
+        if outcome["error"] is None:
+            if is_retry:
                 # Remove from failures
-                db.generation_failures.delete_one({"_id": failure["_id"]})
-                
-                success_count += 1
-                retried_count += 1
-                print(f"✓ Retry successful: {failure['slide_title']}")
-                
-            except Exception as e:
-                print(f"✗ Retry failed: {failure['slide_title']}: {str(e)}")
-                retried_count += 1
-                # Update failure count
-                db.generation_failures.update_one(
-                    {"_id": failure["_id"]},
-                    {"$inc": {"retry_count": 1}, "$set": {"last_retry": datetime.now()}}
-                )
+                db.generation_failures.delete_many({**failure_query, "slide_id": slide_topic["slide_id"]})
+            return
         
+        queue.mark_slide(
+            job["_id"], slide_topic["slide_id"], "failed",
+            attempts=outcome["attempts"], error=outcome["error"]
+        )
+        
+        if is_retry:
+            # Update failure count
+            db.generation_failures.update_many(
+                {**failure_query, "slide_id": slide_topic["slide_id"]},
+                {"$inc": {"retry_count": 1}, "$set": {"last_retry": datetime.now()}}
+            )
+        else:
+            # Store failure in database for tracking
+            db.generation_failures.insert_one({
+                **failure_query,
+                "slide_id": slide_topic["slide_id"],
+                "slide_title": slide_topic["title"],
+                "error": outcome["error"],
+                "failed_at": datetime.now(),
+                "retry_count": outcome["attempts"]
+            })
+    
+    # Generate the chapter in as few model calls as possible, then only the slides
+    # the batch could not produce one at a time
+    batched = {}
+    if not is_retry and PREGEN_BATCH_SIZE > 1 and len(slide_topics) > 1:
+        batched = generate_and_store_batches(job, queue, slide_topics)
+    remaining = [t for t in slide_topics if t["slide_id"] not in batched]
+    
+    # Retries were already retried during pre-generation; give them a single attempt
+    outcomes = [
+        {"slide_topic": t, "result": batched[t["slide_id"]], "attempts": 1, "error": None}
+        for t in slide_topics if t["slide_id"] in batched
+    ]
+    if remaining:
+        outcomes += asyncio.run(
+            pregenerate_slides(
+                remaining,
+                generate_fn,
+                concurrency=1 if batched else PREGEN_CONCURRENCY,
+                max_retries=0 if is_retry else PREGEN_MAX_RETRIES,
+                on_outcome=record_outcome,
+                # Another worker owns the job now; stop instead of retrying its slides
+                abort_on=(LeaseLost,)
+            )
+        )
+    
+    succeeded = sum(1 for o in outcomes if o["error"] is None)
+    print(f"✓ Job {job['_id']}: generated {succeeded}/{len(pending_ids)} slides for {payload['chapter_id']}")
+
+
+if job_queue is not None:
+    job_queue.register_handler("pregenerate_chapter", run_generation_job)
+    job_queue.register_handler("retry_failed", run_generation_job)
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    """Start local workers for the background job queue."""
+    if job_queue is not None:
+        job_queue.start_workers()
+    storage_manager.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    if job_queue is not None:
+        job_queue.stop_workers()
+    render_service.stop()
+    storage_manager.stop()
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Get the status of a background generation job, with progress per slide.
+    
+    - job_id: Job id returned by /api/chapters/{chapter_id}/complete or /api/slides/retry-failed
+    """
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+    
+    try:
+        job = job_queue.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        
+        return serialize_job(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching job status: {str(e)}")
+
+
+@app.post("/api/animations/render", status_code=202)
+async def submit_render(request: RenderRequest):
+    """
+    Queue a Manim scene for rendering and return immediately.
+    Poll /api/animations/render/{job_id} for the video URL. Scenes that fail the
+    static pre-flight check are rejected with 422 before anything is queued.
+    """
+    try:
+        # The cache lookup may hit Mongo; keep it off the event loop
+        job = await asyncio.to_thread(render_service.submit, request.manim_code, request.topic)
+    except ScenePreflightError as e:
+        raise HTTPException(status_code=422, detail=e.report)
+    except RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    
+    return job.to_dict()
+
+
+@app.get("/api/animations/render/{job_id}")
+async def get_render_status(job_id: str):
+    """Status of a render job, with video and thumbnail URLs once completed."""
+    job = render_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Render job {job_id} not found")
+    return job.to_dict()
+
+
+@app.delete("/api/animations/render/{job_id}")
+async def cancel_render(job_id: str):
+    """
+    Give up on a render. A queued render is cancelled, or a running one stopped,
+    once no other request for the same scene is waiting on it.
+    """
+    job = render_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Render job {job_id} not found")
+    return {"job_id": job_id, "cancelled": job.cancel(), "waiters": job.waiters}
+
+
+@app.get("/api/render/stats")
+async def get_render_stats():
+    """Render workers, queue depth, job outcomes and background quality upgrades."""
+    return {**render_service.stats(), "quality_ladder": quality_ladder.stats(), "variants": variant_stage.stats()}
+
+
+@app.get("/api/storage/stats")
+async def get_storage_stats():
+    """Disk usage against the quota, and what the storage sweeps removed."""
+    return storage_manager.stats()
+
+
+@app.post("/api/storage/sweep")
+async def run_storage_sweep():
+    """Run a storage sweep now instead of waiting for the next interval."""
+    return await asyncio.to_thread(storage_manager.sweep)
+
+
+@app.get("/api/prefetch/stats")
+async def get_prefetch_stats():
+    """Counters and hit rate for speculative slide prefetching."""
+    if prefetcher is None:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+    return prefetcher.stats()
+
+
+@app.get("/api/circuit-breaker/stats")
+async def get_circuit_breaker_stats():
+    """State of the model circuit breaker and pending fallback regenerations."""
+    try:
+        breaker = get_slide_generator().breaker.stats()
+    except Exception as e:
+        breaker = {"error": str(e)}
+    return {
+        "breaker": breaker,
+        "regeneration": fallback_regenerator.stats()
+    }
+
+
+@app.get("/api/style-regeneration/stats")
+async def get_style_regeneration_stats():
+    """Identity updates seen, style bucket changes and slides regenerated because of them."""
+    if style_regenerator is None:
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+    return style_regenerator.stats()
+
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    """Current generation budgets and admission counters."""
+    return admission.stats()
+
+
+@app.get("/api/generation-cache/stats")
+async def get_generation_cache_stats():
+    """Hit/miss counters for the shared generation cache."""
+    try:
+        generator = get_slide_generator()
+    except Exception as e:
+        print(f"⚠️  Slide generator unavailable for cache stats: {e}")
+        generator = None
+    return generation_cache.stats(generator)
+
+
+@app.delete("/api/generation-cache")
+async def invalidate_generation_cache(
+    key: Optional[str] = Query(None, description="Invalidate a single cache key"),
+    topic: Optional[str] = Query(None, description="Invalidate every cached generation for a topic"),
+    all_entries: bool = Query(False, alias="all", description="Clear the whole cache")
+):
+    """
+    Manually invalidate cached generations.
+    Clearing the whole cache has to be asked for explicitly with all=true.
+    
+    - key: Cache key (returned as metadata.cache_key on generations)
+    - topic: Slide topic/title
+    - all: Clear every cached generation
+    """
+    if not (key or topic or all_entries):
+        raise HTTPException(status_code=400, detail="Pass key, topic, or all=true to clear the whole cache")
+    
+    try:
+        removed = generation_cache.invalidate(key=key, topic=topic, all_entries=all_entries)
         return {
-            "message": f"Retry complete: {success_count}/{retried_count} successful",
-            "retried": retried_count,
-            "successful": success_count,
-            "still_failed": retried_count - success_count
+            "message": "Generation cache invalidated",
+            "removed": removed
         }
-    
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrying failed generations: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error invalidating generation cache: {str(e)}")
 
 
 @app.get("/")
@@ -0,0 +1,411 @@
+"""
+Static pre-flight check of generated Manim code.
+
+A render can take minutes and then fail on something visible in the source: a
+forbidden class (Tex/MathTex need LaTeX, which render hosts do not have), an
+undefined variable, or a missing GeneratedScene.construct. check_scene parses the
+code with `ast`, without executing it, and rejects those scenes before they are
+queued. It also estimates the animation length from self.play/self.wait calls and
+their run_time, and the render cost from that length and the render quality, so
+scenes over budget are rejected up front as well.
+
+Usage (checks the saved debug scenes):
+    cd backend/app
+    python manim_preflight.py [files or directories...]
+"""
+
+import os
+import ast
+import sys
+import builtins
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+MANIM_MAX_SCENE_SECONDS = float(os.getenv("MANIM_MAX_SCENE_SECONDS", "60"))
+MANIM_MAX_PLAY_CALLS = int(os.getenv("MANIM_MAX_PLAY_CALLS", "40"))
+# Render cost of one 480p frame; scaled by pixel count for higher qualities
+MANIM_SECONDS_PER_FRAME = float(os.getenv("MANIM_SECONDS_PER_FRAME", "0.05"))
+
+# Loops whose iteration count cannot be read from the source are assumed to run this often
+DEFAULT_LOOP_ITERATIONS = 3
+
+# (frame rate, pixels relative to 480p) per quality flag
+QUALITY_FRAME_COST = {
+    "l": (15, 1.0),
+    "m": (30, 2.25),
+    "h": (60, 9.0),
+    "p": (60, 16.0),
+    "k": (60, 36.0),
+}
+
+# Manim names that fail on render hosts or that the prompt forbids
+FORBIDDEN_NAMES = {
+    "Tex": "needs LaTeX, use Text()",
+    "MathTex": "needs LaTeX, use Text()",
+    "SingleStringMathTex": "needs LaTeX, use Text()",
+    "Title": "needs LaTeX, use Text()",
+    "BulletedList": "needs LaTeX, use Text()",
+    "DecimalNumber": "needs LaTeX, use Text()",
+    "Integer": "needs LaTeX, use Text()",
+    "Variable": "needs LaTeX, use Text()",
+    "Axes": "plotting is not allowed",
+    "ThreeDAxes": "plotting is not allowed",
+    "NumberPlane": "plotting is not allowed",
+    "ComplexPlane": "plotting is not allowed",
+    "ParametricFunction": "plotting is not allowed",
+    "FunctionGraph": "plotting is not allowed",
+    "ValueTracker": "trackers are not allowed",
+    "always_redraw": "updaters are not allowed",
+}
+FORBIDDEN_ATTRIBUTES = {
+    "add_updater": "updaters are not allowed",
+    "plot": "plotting is not allowed",
+    "get_graph": "plotting is not allowed",
+}
+
+# Lower-case names exported by `from manim import *` (class and constant names are
+# capitalized and taken from manim itself when it is installed)
+MANIM_LOWERCASE_EXPORTS = {
+    "np", "config", "tempconfig", "rate_functions", "linear", "smooth", "rush_into",
+    "rush_from", "there_and_back", "there_and_back_with_pause", "double_smooth",
+    "lingering", "wiggle", "ease_in_sine", "ease_out_sine", "ease_in_out_sine",
+    "ease_in_quad", "ease_out_quad", "ease_in_out_quad", "ease_in_cubic",
+    "ease_out_cubic", "ease_in_out_cubic", "ease_out_bounce", "ease_in_out_back",
+    "interpolate", "color_gradient", "interpolate_color", "average_color",
+    "random_color", "random_bright_color", "rgb_to_color", "color_to_rgb",
+    "angle_of_vector", "rotate_vector", "normalize", "always_redraw",
+}
+
+BUILTIN_NAMES = set(dir(builtins))
+
+
+class ScenePreflightError(ValueError):
+    """Generated scene rejected before rendering; `report` has the details"""
+
+    def __init__(self, report: Dict[str, Any]):
+        super().__init__("Scene failed pre-flight: " + "; ".join(report["errors"]))
+        self.report = report
+
+
+def _manim_exports() -> Optional[Set[str]]:
+    """Names from `from manim import *`, or None when manim is not installed"""
+    try:
+        import manim
+    except Exception:
+        return None
+    return set(getattr(manim, "__all__", None) or dir(manim))
+
+
+_MANIM_EXPORTS = _manim_exports()
+
+
+def _is_star_import_name(name: str) -> bool:
+    if _MANIM_EXPORTS is not None:
+        return name in _MANIM_EXPORTS
+    # Without manim, assume every capitalized name (classes, colors, directions) exists
+    return name[:1].isupper() or name in MANIM_LOWERCASE_EXPORTS
+
+
+def _number(node: Optional[ast.AST]) -> Optional[float]:
+    """Value of a numeric literal (including -x and simple arithmetic), else None"""
+    if node is None:
+        return None
+    try:
+        value = ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        if isinstance(node, ast.BinOp):
+            left, right = _number(node.left), _number(node.right)
+            if left is not None and right is not None:
+                if isinstance(node.op, ast.Mult):
+                    return left * right
+                if isinstance(node.op, ast.Div) and right:
+                    return left / right
+                if isinstance(node.op, ast.Add):
+                    return left + right
+                if isinstance(node.op, ast.Sub):
+                    return left - right
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _loop_iterations(loop: ast.AST) -> float:
+    """Iterations of a for loop over range(literal) or a literal sequence"""
+    if isinstance(loop, ast.For):
+        iterable = loop.iter
+        if isinstance(iterable, (ast.List, ast.Tuple, ast.Set)):
+            return float(len(iterable.elts))
+        if isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name) and iterable.func.id == "range":
+            bounds = [_number(arg) for arg in iterable.args]
+            if bounds and all(b is not None for b in bounds):
+                start, stop = (0.0, bounds[0]) if len(bounds) == 1 else (bounds[0], bounds[1])
+                step = bounds[2] if len(bounds) > 2 and bounds[2] else 1.0
+                return max(0.0, (stop - start) / step)
+    return float(DEFAULT_LOOP_ITERATIONS)
+
+
+def _self_call(node: ast.AST, method: str) -> bool:
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == method
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "self"
+    )
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[ast.AST]:
+    for keyword in call.keywords:
+        if keyword.arg == name:
+            return keyword.value
+    return None
+
+
+def _estimate_timeline(body: List[ast.stmt], multiplier: float = 1.0) -> Tuple[float, float, float]:
+    """(animation seconds, play calls, wait calls) of a statement list, loops expanded"""
+    seconds = plays = waits = 0.0
+    for statement in body:
+        if isinstance(statement, (ast.For, ast.While)):
+            inner = _estimate_timeline(statement.body, multiplier * _loop_iterations(statement))
+        elif isinstance(statement, ast.If):
+            # Either branch may run: count the longer one
+            inner = max(
+                _estimate_timeline(statement.body, multiplier),
+                _estimate_timeline(statement.orelse, multiplier)
+            )
+        elif isinstance(statement, (ast.With, ast.Try)):
+            inner = _estimate_timeline(statement.body, multiplier)
+        else:
+            inner = (0.0, 0.0, 0.0)
+            for node in ast.walk(statement):
+                if _self_call(node, "play"):
+                    run_time = _number(_keyword(node, "run_time"))
+                    inner = (inner[0] + (run_time if run_time is not None else 1.0) * multiplier,
+                             inner[1] + multiplier, inner[2])
+                elif _self_call(node, "wait"):
+                    duration = _number(node.args[0] if node.args else _keyword(node, "duration"))
+                    inner = (inner[0] + (duration if duration is not None else 1.0) * multiplier,
+                             inner[1], inner[2] + multiplier)
+        seconds, plays, waits = seconds + inner[0], plays + inner[1], waits + inner[2]
+    return seconds, plays, waits
+
+
+class _BindingCollector(ast.NodeVisitor):
+    """Every name bound anywhere in the module, plus first assignment lines per function"""
+
+    def __init__(self):
+        self.bound: Set[str] = set()
+        # Function node -> {name: line of its first plain assignment}
+        self.first_assignment: Dict[ast.AST, Dict[str, int]] = {}
+        self._function: Optional[ast.AST] = None
+
+    def _bind(self, name: str, lineno: Optional[int] = None) -> None:
+        self.bound.add(name)
+        if self._function is not None and lineno is not None:
+            self.first_assignment[self._function].setdefault(name, lineno)
+
+    def visit_FunctionDef(self, node):
+        self._bind(node.name)
+        for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs:
+            self.bound.add(arg.arg)
+        for arg in (node.args.vararg, node.args.kwarg):
+            if arg is not None:
+                self.bound.add(arg.arg)
+
+        outer, self._function = self._function, node
+        self.first_assignment[node] = {}
+        self.generic_visit(node)
+        self._function = outer
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs:
+            self.bound.add(arg.arg)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        self._bind(node.name)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._bind((alias.asname or alias.name).split(".")[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name != "*":
+                self._bind(alias.asname or alias.name)
+
+    def visit_comprehension(self, node):
+        # Comprehension variables are bound before use on the same line
+        for target in ast.walk(node.target):
+            if isinstance(target, ast.Name):
+                self.bound.add(target.id)
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self._bind(node.name, node.lineno)
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.bound.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, (ast.Store, ast.Del)):
+            self._bind(node.id, node.lineno)
+
+
+def _construct_method(tree: ast.Module) -> Optional[ast.FunctionDef]:
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "GeneratedScene":
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and item.name == "construct":
+                    return item
+    return None
+
+
+def _undefined_names(tree: ast.Module) -> List[str]:
+    """
+    Names that are never bound, or read in a function before their first assignment.
+    A read inside a loop that also contains the assignment is fine: an earlier
+    iteration binds the name (e.g. `prev` holding the previous iteration's object).
+    """
+    collector = _BindingCollector()
+    collector.visit(tree)
+
+    problems = []
+    reported: Set[str] = set()
+    for function, first_assignment in collector.first_assignment.items():
+        loops = [
+            (loop.lineno, loop.end_lineno) for loop in ast.walk(function)
+            if isinstance(loop, (ast.For, ast.AsyncFor, ast.While))
+        ]
+        for node in ast.walk(function):
+            if not isinstance(node, ast.Name) or not isinstance(node.ctx, ast.Load):
+                continue
+            assigned_at = first_assignment.get(node.id)
+            if assigned_at is None or node.lineno >= assigned_at or node.id in reported:
+                continue
+            if any(start <= node.lineno and assigned_at <= end for start, end in loops):
+                continue
+            problems.append(f"'{node.id}' is used on line {node.lineno} before it is assigned (line {assigned_at})")
+            reported.add(node.id)
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Name) or not isinstance(node.ctx, ast.Load) or node.id in reported:
+            continue
+        if node.id in collector.bound or node.id in BUILTIN_NAMES or _is_star_import_name(node.id):
+            continue
+        problems.append(f"'{node.id}' is not defined (line {node.lineno})")
+        reported.add(node.id)
+    return problems
+
+
+def _forbidden_uses(tree: ast.Module) -> List[str]:
+    problems = []
+    reported: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in FORBIDDEN_NAMES:
+            name, reason = node.id, FORBIDDEN_NAMES[node.id]
+        elif isinstance(node, ast.Attribute) and node.attr in FORBIDDEN_ATTRIBUTES:
+            name, reason = f".{node.attr}", FORBIDDEN_ATTRIBUTES[node.attr]
+        else:
+            continue
+        if name not in reported:
+            problems.append(f"{name} on line {node.lineno}: {reason}")
+            reported.add(name)
+    return problems
+
+
+def check_scene(
+    manim_code: str,
+    quality: str = "l",
+    max_seconds: float = MANIM_MAX_SCENE_SECONDS,
+    max_play_calls: int = MANIM_MAX_PLAY_CALLS,
+    max_render_seconds: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Statically check a generated scene and estimate what rendering it costs.
+
+    Returns:
+        Dict with ok, errors, estimated_seconds, play_calls, wait_calls,
+        estimated_frames and estimated_render_seconds
+    """
+    report = {
+        "ok": False,
+        "errors": [],
+        "estimated_seconds": None,
+        "play_calls": None,
+        "wait_calls": None,
+        "estimated_frames": None,
+        "estimated_render_seconds": None
+    }
+
+    try:
+        tree = ast.parse(manim_code)
+    except SyntaxError as e:
+        report["errors"].append(f"Syntax error on line {e.lineno}: {e.msg}")
+        return report
+
+    errors = report["errors"]
+    construct = _construct_method(tree)
+    if construct is None:
+        errors.append("No GeneratedScene class with a construct(self) method")
+    errors.extend(_forbidden_uses(tree))
+    errors.extend(_undefined_names(tree))
+
+    if construct is not None:
+        seconds, plays, waits = _estimate_timeline(construct.body)
+        frame_rate, pixel_factor = QUALITY_FRAME_COST.get(quality, QUALITY_FRAME_COST["l"])
+        frames = seconds * frame_rate
+        render_seconds = frames * pixel_factor * MANIM_SECONDS_PER_FRAME
+        report.update({
+            "estimated_seconds": round(seconds, 2),
+            "play_calls": int(plays),
+            "wait_calls": int(waits),
+            "estimated_frames": int(frames),
+            "estimated_render_seconds": round(render_seconds, 1)
+        })
+
+        if plays == 0:
+            errors.append("The scene never calls self.play()")
+        if seconds > max_seconds:
+            errors.append(f"Animation runs ~{seconds:.0f}s, over the {max_seconds:.0f}s budget")
+        if plays > max_play_calls:
+            errors.append(f"{int(plays)} self.play() calls, over the limit of {max_play_calls}")
+        if max_render_seconds is not None and render_seconds > max_render_seconds:
+            errors.append(
+                f"Estimated render time ~{render_seconds:.0f}s exceeds the {max_render_seconds:.0f}s render timeout"
+            )
+
+    report["ok"] = not errors
+    return report
+
+
+def main(paths: List[str]) -> int:
+    default_dir = Path(os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")) / "debug"
+    files: List[Path] = []
+    for path in map(Path, paths or [str(default_dir)]):
+        files.extend(sorted(path.glob("*.py")) if path.is_dir() else [path])
+
+    rejected = 0
+    for file in files:
+        report = check_scene(file.read_text(encoding="utf-8"))
+        status = "✓" if report["ok"] else "❌"
+        print(f"{status} {file.name}: ~{report['estimated_seconds']}s, {report['play_calls']} plays, "
+              f"~{report['estimated_render_seconds']}s to render")
+        for error in report["errors"]:
+            print(f"    {error}")
+        rejected += not report["ok"]
+
+    print(f"\n{len(files) - rejected}/{len(files)} scenes passed pre-flight")
+    return 1 if rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
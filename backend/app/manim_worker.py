@@ -0,0 +1,281 @@
+"""
+Warm Manim worker processes.
+
+Launching the `manim` CLI costs an interpreter start plus `from manim import *`
+(several seconds) before the first frame is drawn. A warm worker is a long-lived
+process that imports manim once and then renders scenes sent to it over a pipe:
+each scene's source is executed in a fresh namespace and its GeneratedScene is
+rendered into the configured media directory.
+
+Workers are recycled after MANIM_WORKER_MAX_JOBS renders, or once their resident
+memory has grown by more than MANIM_WORKER_MAX_RSS_GROWTH_MB since start-up, so
+leaks in long-running manim state do not accumulate.
+
+Workers run sandboxed (see render_sandbox.py): the largest tier's limits are the
+hard limits of the process, and each job tightens the soft limits to its own tier
+and renders in its own working directory.
+"""
+
+import os
+import time
+import traceback
+import multiprocessing
+from typing import Dict, Any, Optional
+
+import render_sandbox
+
+MANIM_WORKER_MAX_JOBS = int(os.getenv("MANIM_WORKER_MAX_JOBS", "50"))
+MANIM_WORKER_MAX_RSS_GROWTH_MB = float(os.getenv("MANIM_WORKER_MAX_RSS_GROWTH_MB", "512"))
+MANIM_WORKER_STARTUP_TIMEOUT_SECONDS = float(os.getenv("MANIM_WORKER_STARTUP_TIMEOUT_SECONDS", "60"))
+
+# Manim quality flags (-ql, -qm, ...) as config values
+QUALITY_NAMES = {
+    "l": "low_quality",
+    "m": "medium_quality",
+    "h": "high_quality",
+    "p": "production_quality",
+    "k": "fourk_quality",
+}
+
+
+class WorkerUnavailable(RuntimeError):
+    """The warm worker could not be started (e.g. manim is not installed)"""
+
+
+class WorkerTimeout(TimeoutError):
+    """A render on the warm worker took longer than its timeout"""
+
+
+def _rss_bytes() -> int:
+    """Current resident memory of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # Not Linux: fall back to the peak, which only grows
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _job_usage(before, wall_seconds: float) -> Optional[Dict[str, Any]]:
+    """CPU used by one job on this worker (peak RSS is the worker's lifetime peak)"""
+    after = render_sandbox.process_usage()
+    if before is None or after is None:
+        return None
+    report = render_sandbox.usage_report(after, wall_seconds)
+    report["cpu_user_seconds"] = round(after.ru_utime - before.ru_utime, 2)
+    report["cpu_system_seconds"] = round(after.ru_stime - before.ru_stime, 2)
+    return report
+
+
+def _worker_main(conn, media_dir: str) -> None:
+    """Worker process: import manim once, then render scenes until told to stop"""
+    started = time.monotonic()
+    # Before any generated code runs; later jobs can only tighten these limits
+    # (CPU time accumulates over the worker's jobs, so only per-job soft CPU limits apply)
+    hard_limits = {**render_sandbox.max_limits(), "cpu_seconds": None}
+    render_sandbox.apply_limits(render_sandbox.max_limits(), hard_limits)
+    try:
+        import manim
+        from manim import tempconfig
+    except Exception as e:
+        conn.send({"ready": False, "error": f"Cannot import manim: {e}"})
+        return
+
+    conn.send({
+        "ready": True,
+        "manim_version": getattr(manim, "__version__", None),
+        "import_seconds": time.monotonic() - started,
+        "rss_bytes": _rss_bytes()
+    })
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        started = time.monotonic()
+        usage_before = render_sandbox.process_usage()
+        try:
+            if job.get("limits"):
+                render_sandbox.set_job_limits(job["limits"])
+            if job.get("workdir"):
+                os.chdir(job["workdir"])
+
+            # Fresh namespace per scene so nothing leaks between jobs
+            namespace = {"__name__": f"generated_scene_{job['job_id']}"}
+            exec(compile(job["source"], f"<scene {job['output_file']}>", "exec"), namespace)
+            scene_class = namespace.get("GeneratedScene")
+            if scene_class is None:
+                raise RuntimeError("Scene source does not define GeneratedScene")
+
+            with tempconfig({
+                "media_dir": job.get("media_dir") or media_dir,
+                "quality": QUALITY_NAMES.get(job["quality"], QUALITY_NAMES["l"]),
+                "format": job["format"],
+                "output_file": job["output_file"],
+                "disable_caching": True,
+                "write_to_movie": True,
+                "progress_bar": "none",
+                "verbosity": "WARNING"
+            }):
+                scene = scene_class()
+                scene.render()
+                video_path = str(scene.renderer.file_writer.movie_file_path)
+
+            conn.send({
+                "ok": True,
+                "video_path": video_path,
+                "render_seconds": time.monotonic() - started,
+                "usage": _job_usage(usage_before, time.monotonic() - started),
+                "rss_bytes": _rss_bytes()
+            })
+        except Exception:
+            conn.send({
+                "ok": False,
+                "error": traceback.format_exc(),
+                "usage": _job_usage(usage_before, time.monotonic() - started),
+                "rss_bytes": _rss_bytes()
+            })
+
+
+class WarmManimWorker:
+    """Parent-side handle of one warm worker process (not thread-safe; one per render thread)"""
+
+    def __init__(
+        self,
+        media_dir: str,
+        max_jobs: int = MANIM_WORKER_MAX_JOBS,
+        max_rss_growth_mb: float = MANIM_WORKER_MAX_RSS_GROWTH_MB
+    ):
+        self.media_dir = media_dir
+        self.max_jobs = max_jobs
+        self.max_rss_growth_bytes = max_rss_growth_mb * 1024 * 1024
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self.jobs_done = 0
+        self.baseline_rss = 0
+        self.recycled = 0
+        self.import_seconds: Optional[float] = None
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> None:
+        if self.alive:
+            return
+
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.media_dir),
+            name="manim-worker",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+
+        if not parent_conn.poll(MANIM_WORKER_STARTUP_TIMEOUT_SECONDS):
+            process.kill()
+            raise WorkerUnavailable("Manim worker did not start in time")
+        try:
+            hello = parent_conn.recv()
+        except EOFError:
+            hello = {"ready": False, "error": "Manim worker exited during start-up"}
+        if not hello.get("ready"):
+            process.join(timeout=5)
+            raise WorkerUnavailable(hello.get("error", "Manim worker failed to start"))
+
+        self._process, self._conn = process, parent_conn
+        self.jobs_done = 0
+        self.baseline_rss = hello["rss_bytes"]
+        self.import_seconds = hello["import_seconds"]
+        print(f"✓ Warm manim worker {process.pid} ready (import took {self.import_seconds:.1f}s)")
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+            self._process.join(timeout=5)
+        except (OSError, BrokenPipeError):
+            pass
+        if self._process.is_alive():
+            self._process.kill()
+        self._process, self._conn = None, None
+
+    def kill(self) -> None:
+        """Stop a render in progress immediately (cancellation)"""
+        if self._process is not None and self._process.is_alive():
+            self._process.kill()
+
+    def render(
+        self,
+        job_id: str,
+        source: str,
+        output_file: str,
+        quality: str,
+        output_format: str,
+        timeout_seconds: float,
+        media_dir: Optional[str] = None,
+        workdir: Optional[str] = None,
+        limits: Optional[Dict[str, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Render one scene on the warm worker.
+
+        Returns:
+            Dict with video_path, render_seconds and usage
+
+        Raises:
+            WorkerTimeout: the render exceeded timeout_seconds (the worker is killed)
+            RuntimeError: the scene failed to render, or the worker died mid-render
+        """
+        self.start()
+        self._conn.send({
+            "job_id": job_id,
+            "source": source,
+            "output_file": output_file,
+            "quality": quality,
+            "format": output_format,
+            "media_dir": media_dir,
+            "workdir": workdir,
+            "limits": limits
+        })
+
+        try:
+            if not self._conn.poll(timeout_seconds):
+                self.kill()
+                self._discard()
+                raise WorkerTimeout(f"Manim rendering timed out after {timeout_seconds:.0f}s")
+            reply = self._conn.recv()
+        except (EOFError, OSError):
+            # Killed by a cancellation or a resource limit (SIGXCPU, out of memory), or crashed
+            self._discard()
+            raise RuntimeError("Manim worker exited during render (cancelled, crashed or over its resource limits)")
+
+        self.jobs_done += 1
+        self._maybe_recycle(reply.get("rss_bytes", 0))
+
+        if not reply.get("ok"):
+            raise RuntimeError(f"Manim rendering failed.\n{reply.get('error')}")
+        return reply
+
+    def _discard(self) -> None:
+        if self._process is not None:
+            self._process.join(timeout=5)
+        self._process, self._conn = None, None
+
+    def _maybe_recycle(self, rss_bytes: int) -> None:
+        grown = rss_bytes - self.baseline_rss
+        if self.jobs_done >= self.max_jobs or grown > self.max_rss_growth_bytes:
+            reason = f"{self.jobs_done} jobs" if self.jobs_done >= self.max_jobs else f"+{grown / 1024 / 1024:.0f} MB"
+            print(f"Recycling manim worker {self._process.pid} after {reason}")
+            self.stop()
+            self.recycled += 1
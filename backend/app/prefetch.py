@@ -0,0 +1,220 @@
+"""
+Pace-aware speculative prefetch of upcoming slides.
+
+When a student moves to a slide, the next k slides in catalog order are generated
+in the background so they are already in the generation cache when the student
+gets there. k depends on the learning identity's pace. Prefetches are capped per
+user and globally, and are cancelled when the student leaves the course. A
+cancelled prefetch whose generation thread is already running keeps counting
+against the global cap until that thread returns.
+"""
+
+import os
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional, Set
+
+from gemini_generator import get_slide_generator
+from admission import get_admission_controller, AdmissionRejected
+
+PREFETCH_PER_USER_LIMIT = int(os.getenv("PREFETCH_PER_USER_LIMIT", "3"))
+PREFETCH_GLOBAL_LIMIT = int(os.getenv("PREFETCH_GLOBAL_LIMIT", "16"))
+# Prefetched keys remembered for hit-rate reporting
+PREFETCH_TRACKED_KEYS = 10000
+
+# How many slides ahead to prefetch for each pace
+PACE_LOOKAHEAD = {
+    "fast": 3,
+    "moderate": 2,
+    "slow": 1
+}
+
+
+class SlidePrefetcher:
+    """Schedules background generations into the generation cache"""
+
+    def __init__(self, db, cache):
+        self.db = db
+        self.cache = cache
+        # user_id -> {cache_key: task}
+        self._tasks: Dict[str, Dict[str, asyncio.Task]] = {}
+        # Generation threads of cancelled prefetches that have not returned yet
+        self._orphaned: Set[asyncio.Future] = set()
+        # user_id -> course the prefetches belong to
+        self._user_course: Dict[str, str] = {}
+        # cache keys filled by a prefetch and not yet requested (insertion ordered)
+        self._prefetched_keys: Dict[str, None] = {}
+        self._lock = threading.Lock()
+        self.stats_counters = {
+            "scheduled": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "skipped_cap": 0,
+            "skipped_budget": 0,
+            "demand_requests": 0,
+            "prefetch_hits": 0
+        }
+
+    def _in_flight(self) -> int:
+        return sum(len(tasks) for tasks in self._tasks.values()) + len(self._orphaned)
+
+    def upcoming_slides(self, course_id: str, slide_id: str, k: int) -> List[Dict[str, Any]]:
+        """Next k slide topics after slide_id in catalog order (baseline chapter excluded)"""
+        catalog = list(
+            self.db.slide_topics.find(
+                {"course_id": course_id},
+                {"slide_id": 1, "chapter_id": 1, "title": 1, "learning_objectives": 1, "context": 1}
+            ).sort([("chapter_order", 1), ("order", 1)])
+        )
+
+        ids = [s["slide_id"] for s in catalog]
+        if slide_id not in ids:
+            return []
+
+        start = ids.index(slide_id) + 1
+        upcoming = [s for s in catalog[start:] if "chapter_1" not in s["chapter_id"]]
+        return upcoming[:k]
+
+    def schedule(
+        self,
+        user_id: str,
+        course_id: str,
+        slide_id: str,
+        pace: str,
+        visual_text_score: float
+    ) -> int:
+        """
+        Prefetch the slides after slide_id for this user. Must be called from the event loop.
+
+        Returns:
+            Number of prefetches started
+        """
+        # Moving to another course cancels what was prefetched for the old one
+        if self._user_course.get(user_id) not in (None, course_id):
+            self.cancel_user(user_id)
+        self._user_course[user_id] = course_id
+
+        k = PACE_LOOKAHEAD.get(pace, PACE_LOOKAHEAD["moderate"])
+        upcoming = self.upcoming_slides(course_id, slide_id, k)
+        if not upcoming:
+            return 0
+
+        # Slides already pre-generated for this chapter don't need a prefetch
+        pregenerated = {
+            row["slide_id"]
+            for row in self.db.generated_slides.find(
+                {"user_id": user_id, "course_id": course_id, "slide_id": {"$in": [s["slide_id"] for s in upcoming]}},
+                {"slide_id": 1}
+            )
+        }
+
+        generator = get_slide_generator()
+        user_tasks = self._tasks.setdefault(user_id, {})
+        started = 0
+
+        for slide_topic in upcoming:
+            if slide_topic["slide_id"] in pregenerated:
+                continue
+
+            cache_kwargs = dict(
+                topic=slide_topic["title"],
+                learning_objectives=slide_topic["learning_objectives"],
+                visual_text_score=visual_text_score,
+                context=slide_topic["context"]
+            )
+            key = self.cache.key_for(generator, **cache_kwargs)
+            if key in user_tasks:
+                continue
+
+            if len(user_tasks) >= PREFETCH_PER_USER_LIMIT or self._in_flight() >= PREFETCH_GLOBAL_LIMIT:
+                self.stats_counters["skipped_cap"] += 1
+                break
+
+            task = asyncio.create_task(self._prefetch(user_id, key, generator, cache_kwargs))
+            user_tasks[key] = task
+            self.stats_counters["scheduled"] += 1
+            started += 1
+
+        return started
+
+    async def _prefetch(self, user_id: str, key: str, generator, cache_kwargs: Dict[str, Any]) -> None:
+        try:
+            # Already cached (by another student in the same bucket): nothing to do
+            if await asyncio.to_thread(self.cache.get, key) is not None:
+                return
+
+            work = asyncio.ensure_future(asyncio.to_thread(self._generate, user_id, generator, cache_kwargs))
+            try:
+                await asyncio.shield(work)
+            except asyncio.CancelledError:
+                # The thread cannot be interrupted and is still paying for its model call
+                if not work.done():
+                    self._orphaned.add(work)
+                    work.add_done_callback(self._orphan_done)
+                raise
+            with self._lock:
+                self._prefetched_keys[key] = None
+                while len(self._prefetched_keys) > PREFETCH_TRACKED_KEYS:
+                    self._prefetched_keys.pop(next(iter(self._prefetched_keys)))
+            self.stats_counters["completed"] += 1
+        except AdmissionRejected:
+            # Speculative work is the first thing to give up when budgets are tight
+            self.stats_counters["skipped_budget"] += 1
+        except asyncio.CancelledError:
+            # An orphaned thread's result still lands in the cache
+            self.stats_counters["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.stats_counters["failed"] += 1
+            print(f"Prefetch failed for '{cache_kwargs['topic']}': {e}")
+        finally:
+            user_tasks = self._tasks.get(user_id, {})
+            if user_tasks.get(key) is asyncio.current_task():
+                del user_tasks[key]
+            if user_id in self._tasks and not user_tasks:
+                del self._tasks[user_id]
+
+    def _orphan_done(self, work: asyncio.Future) -> None:
+        self._orphaned.discard(work)
+        if not work.cancelled() and work.exception() is not None:
+            print(f"Cancelled prefetch failed: {work.exception()}")
+
+    def _generate(self, user_id: str, generator, cache_kwargs: Dict[str, Any]) -> None:
+        # Admission is only taken for the model call; a cache hit is never throttled
+        admission = get_admission_controller()
+        result = self.cache.get_or_generate(
+            generator, admit=lambda: admission.admit(user_id, interactive=False), **cache_kwargs
+        )
+        admission.charge(user_id, result.get("metadata"))
+
+    def cancel_user(self, user_id: str) -> int:
+        """Cancel all pending prefetches for a user (left the course or ended the session)"""
+        tasks = self._tasks.pop(user_id, {})
+        self._user_course.pop(user_id, None)
+        for task in tasks.values():
+            task.cancel()
+        return len(tasks)
+
+    def record_demand(self, cache_key: Optional[str], cache_hit: bool) -> None:
+        """Count an on-demand generation, and whether a prefetch had already filled it"""
+        self.stats_counters["demand_requests"] += 1
+        if not cache_key or not cache_hit:
+            return
+
+        with self._lock:
+            if cache_key in self._prefetched_keys:
+                del self._prefetched_keys[cache_key]
+                self.stats_counters["prefetch_hits"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        counters = dict(self.stats_counters)
+        demand = counters["demand_requests"]
+        return {
+            **counters,
+            "in_flight": self._in_flight(),
+            "orphaned": len(self._orphaned),
+            "hit_rate": round(counters["prefetch_hits"] / demand, 3) if demand else 0.0,
+            "per_user_limit": PREFETCH_PER_USER_LIMIT,
+            "global_limit": PREFETCH_GLOBAL_LIMIT
+        }
@@ -0,0 +1,134 @@
+"""
+Concurrent chapter pre-generation.
+
+Slide generation is blocking (model call + validation + database write), so each
+attempt runs in a worker thread while the event loop stays free. Slides are
+generated concurrently up to a configurable limit, each attempt has its own
+timeout, and retries back off asynchronously with jitter.
+"""
+
+import os
+import asyncio
+import random
+import threading
+from typing import Callable, Dict, Any, List, Optional, Tuple, Type
+
+PREGEN_CONCURRENCY = int(os.getenv("PREGEN_CONCURRENCY", "4"))
+PREGEN_SLIDE_TIMEOUT_SECONDS = float(os.getenv("PREGEN_SLIDE_TIMEOUT_SECONDS", "120"))
+PREGEN_MAX_RETRIES = int(os.getenv("PREGEN_MAX_RETRIES", "2"))
+PREGEN_BACKOFF_BASE_SECONDS = float(os.getenv("PREGEN_BACKOFF_BASE_SECONDS", "2"))
+# Slides per batched model call during chapter pre-generation (0 or 1 = one call per slide)
+PREGEN_BATCH_SIZE = int(os.getenv("PREGEN_BATCH_SIZE", "8"))
+
+
+def backoff_delay(retry_count: int, base_seconds: float = PREGEN_BACKOFF_BASE_SECONDS) -> float:
+    """Exponential backoff (2, 4, 8... seconds) with +/-50% jitter so retries don't align"""
+    return base_seconds * (2 ** (retry_count - 1)) * random.uniform(0.5, 1.5)
+
+
+async def generate_with_retries(
+    slide_topic: Dict[str, Any],
+    generate_fn: Callable[[Dict[str, Any], int, threading.Event], Any],
+    semaphore: asyncio.Semaphore,
+    max_retries: int = PREGEN_MAX_RETRIES,
+    timeout_seconds: float = PREGEN_SLIDE_TIMEOUT_SECONDS,
+    on_outcome: Optional[Callable[[Dict[str, Any]], None]] = None,
+    abort_on: Tuple[Type[BaseException], ...] = ()
+) -> Dict[str, Any]:
+    """
+    Run generate_fn(slide_topic, attempt, cancelled) in a thread, retrying on failure or timeout.
+    on_outcome(outcome) runs (in a thread) as soon as the slide succeeded or ran out of retries.
+    Exceptions in abort_on (from generate_fn or on_outcome) are not retried but re-raised,
+    e.g. when the work no longer belongs to this worker.
+
+    The concurrency slot is held while an attempt runs, not during backoff. A thread
+    cannot be interrupted, so on timeout `cancelled` is set (generate_fn must not store
+    anything once it is) and the slot is only released when the thread returns.
+
+    Returns:
+        Dict with slide_topic, result (or None), attempts and error (or None)
+    """
+    retry_count = 0
+    error_msg = None
+
+    while retry_count <= max_retries:
+        attempt = retry_count + 1
+        try:
+            async with semaphore:
+                print(f"  Generating: {slide_topic['title']}... (attempt {attempt}/{max_retries + 1})")
+                cancelled = threading.Event()
+                attempt_task = asyncio.ensure_future(asyncio.to_thread(generate_fn, slide_topic, attempt, cancelled))
+                try:
+                    result = await asyncio.wait_for(asyncio.shield(attempt_task), timeout=timeout_seconds)
+                except asyncio.TimeoutError:
+                    cancelled.set()
+                    await asyncio.gather(attempt_task, return_exceptions=True)
+                    raise
+            print(f"  ✓ Generated: {slide_topic['title']}")
+            return await _report(
+                {"slide_topic": slide_topic, "result": result, "attempts": attempt, "error": None}, on_outcome, abort_on
+            )
+
+        except abort_on:
+            raise
+        except asyncio.TimeoutError:
+            error_msg = f"Generation timed out after {timeout_seconds:.0f}s"
+        except Exception as e:
+            error_msg = str(e)
+
+        retry_count += 1
+        print(f"  ✗ Attempt {retry_count} failed for '{slide_topic['title']}': {error_msg}")
+
+        if retry_count <= max_retries:
+            await asyncio.sleep(backoff_delay(retry_count))
+
+    return await _report(
+        {"slide_topic": slide_topic, "result": None, "attempts": retry_count, "error": error_msg}, on_outcome, abort_on
+    )
+
+
+async def _report(
+    outcome: Dict[str, Any],
+    on_outcome: Optional[Callable[[Dict[str, Any]], None]],
+    abort_on: Tuple[Type[BaseException], ...] = ()
+) -> Dict[str, Any]:
+    if on_outcome is not None:
+        try:
+            await asyncio.to_thread(on_outcome, outcome)
+        except abort_on:
+            raise
+        except Exception as e:
+            print(f"  ⚠️ Failed to record outcome of '{outcome['slide_topic']['title']}': {e}")
+    return outcome
+
+
+async def pregenerate_slides(
+    slide_topics: List[Dict[str, Any]],
+    generate_fn: Callable[[Dict[str, Any], int, threading.Event], Any],
+    concurrency: int = PREGEN_CONCURRENCY,
+    max_retries: int = PREGEN_MAX_RETRIES,
+    timeout_seconds: float = PREGEN_SLIDE_TIMEOUT_SECONDS,
+    on_outcome: Optional[Callable[[Dict[str, Any]], None]] = None,
+    abort_on: Tuple[Type[BaseException], ...] = ()
+) -> List[Dict[str, Any]]:
+    """
+    Generate all slides concurrently, at most `concurrency` at a time.
+    on_outcome is called with each slide's outcome as soon as it is final.
+    The first exception in abort_on stops the run and is re-raised.
+
+    Returns:
+        One outcome per slide topic, in the input order
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(*[
+        generate_with_retries(
+            slide_topic,
+            generate_fn,
+            semaphore,
+            max_retries=max_retries,
+            timeout_seconds=timeout_seconds,
+            on_outcome=on_outcome,
+            abort_on=abort_on
+        )
+        for slide_topic in slide_topics
+    ])
@@ -0,0 +1,145 @@
+"""
+Prompt assembly helpers for slide generation.
+
+The generation prompts used to embed the previous slide verbatim (often its full
+HTML) next to long fixed instruction blocks. These helpers keep prompts small:
+- outline_content turns previous slide content into a short text outline
+- compact_prompt drops repeated lines from the fixed instruction blocks
+- collapse_blank_lines removes the gaps left by empty optional sections
+- prompt_stats records the prompt's size so versions can be compared
+"""
+
+import os
+import re
+from html.parser import HTMLParser
+from typing import Dict, Any, List
+
+# Longest outline of the previous slide that is sent for continuity
+PROMPT_PREVIOUS_CONTENT_MAX_CHARS = int(os.getenv("PROMPT_PREVIOUS_CONTENT_MAX_CHARS", "600"))
+
+_BLOCK_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "div", "section", "br", "tr", "blockquote"}
+_HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_SKIPPED_TAGS = {"script", "style"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class _OutlineParser(HTMLParser):
+    """Collects the visible text of an HTML fragment, one line per block element"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines: List[str] = []
+        self._parts: List[str] = []
+        self._prefix = ""
+        self._skipping = 0
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._parts).split())
+        if text:
+            self.lines.append(f"{self._prefix}{text}")
+        self._parts = []
+        self._prefix = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+            if tag in _HEADING_TAGS:
+                self._prefix = "# "
+            elif tag == "li":
+                self._prefix = "- "
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._parts.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def outline_content(content: str, max_chars: int = PROMPT_PREVIOUS_CONTENT_MAX_CHARS) -> str:
+    """
+    Short plain-text outline of slide content (HTML, Manim code or text).
+
+    Tags are stripped, headings and list items keep a marker, whitespace is
+    collapsed and the result is capped at max_chars.
+    """
+    if not content:
+        return ""
+
+    if "from manim import" in content:
+        # Only the on-screen text says what an animation covered
+        labels = re.findall(r'Text\(\s*["\'](.+?)["\']', content)
+        lines = [f"Animation showing: {', '.join(labels)}"] if labels else []
+    elif "<" in content and ">" in content:
+        parser = _OutlineParser()
+        parser.feed(content)
+        parser.close()
+        lines = parser.lines
+    else:
+        lines = [" ".join(content.split())]
+
+    outline = "\n".join(lines)
+    if len(outline) > max_chars:
+        outline = outline[:max_chars - 1].rstrip() + "…"
+    return outline
+
+
+def collapse_blank_lines(text: str) -> str:
+    """Collapse runs of blank lines (left behind by empty optional sections)"""
+    lines: List[str] = []
+    for line in text.splitlines():
+        if line.strip():
+            lines.append(line.rstrip())
+        elif lines and lines[-1] != "":
+            lines.append("")
+    return "\n".join(lines).strip()
+
+
+def compact_prompt(instructions: str) -> str:
+    """
+    Drop instruction lines that repeat earlier ones and collapse runs of blank lines.
+    Code examples are kept as-is. Only for fixed instruction text: user-supplied
+    inputs (objectives, context, previous slide) must never be deduplicated.
+    """
+    lines: List[str] = []
+    seen = set()
+    in_code = False
+
+    for line in instructions.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            in_code = not in_code
+
+        if stripped and not in_code and not stripped.startswith("**"):
+            # Compare without list markers so "- X" and "1. X" count as the same rule
+            normalized = re.sub(r"^(\d+\.|[-*•])\s*", "", stripped).lower()
+            if normalized in seen:
+                continue
+            seen.add(normalized)
+
+        lines.append(line)
+
+    return collapse_blank_lines("\n".join(lines))
+
+
+def prompt_stats(prompt: str, template: str, prompt_version: str) -> Dict[str, Any]:
+    """Prompt size metadata recorded with every generation"""
+    return {
+        "prompt_template": template,
+        "prompt_version": prompt_version,
+        "prompt_chars": len(prompt),
+        "prompt_tokens_estimate": estimate_tokens(prompt)
+    }
@@ -0,0 +1,200 @@
+"""
+Progressive render quality for Manim animations.
+
+Rendering at -qh takes many times longer than -ql, so students would wait far
+longer for every animation. With the ladder, a scene is rendered at the first
+rung (RENDER_QUALITY, 480p15 by default) and published right away; the higher
+rungs are queued on the render service as BACKGROUND jobs, which only run when
+no interactive render is waiting and never on every render worker. When a higher rung finishes, every slide (and
+generation cache entry) still pointing at a lower rung is switched to it in a
+single update, so readers see either the old video or the new one.
+
+The render cache is content-addressed by (scene, quality, format), so the
+variants of a scene are found with cache lookups alone.
+"""
+
+import os
+import threading
+from typing import Dict, Any, List, Optional
+
+from render_service import (
+    get_render_service, animation_url, local_animation_url, RenderService, RenderJob, RenderQueueFull,
+    RENDER_QUALITY, RENDER_FORMAT, BACKGROUND, COMPLETED
+)
+from render_cache import render_key
+from animation_variants import rendition_urls, poster_url
+
+RENDER_PROGRESSIVE = os.getenv("RENDER_PROGRESSIVE", "true").lower() == "true"
+# Qualities from first published to best (manim -q flags)
+RENDER_QUALITY_LADDER = [
+    q.strip() for q in os.getenv("RENDER_QUALITY_LADDER", ",".join(dict.fromkeys([RENDER_QUALITY, "h"]))).split(",")
+]
+# High-quality renders take far longer than the interactive timeout allows
+RENDER_UPGRADE_TIMEOUT_SECONDS = float(os.getenv("RENDER_UPGRADE_TIMEOUT_SECONDS", "900"))
+
+
+class QualityLadder:
+    """Publishes a scene at low quality first and upgrades it in the background"""
+
+    def __init__(self, db, render_service: RenderService, ladder: List[str] = RENDER_QUALITY_LADDER):
+        self.db = db
+        self.render_service = render_service
+        self.ladder = ladder
+        self._lock = threading.Lock()
+        self.counters = {
+            "upgrades_queued": 0,
+            "upgrades_completed": 0,
+            "upgrades_failed": 0,
+            "upgrades_skipped": 0,
+            "slides_upgraded": 0
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def variants(self, manim_code: str) -> Dict[str, Dict[str, Optional[str]]]:
+        """Rendered qualities of a scene: {quality: {video_path, video_url, thumbnail_url, video_renditions, poster_url}}"""
+        cache = self.render_service.cache
+        if cache is None:
+            return {}
+
+        found = {}
+        for quality in self.ladder:
+            entry = cache.lookup(render_key(manim_code, quality, RENDER_FORMAT), record=False)
+            if entry is not None:
+                found[quality] = {
+                    "video_path": entry["video_path"],
+                    "video_url": animation_url(entry["video_path"]),
+                    "thumbnail_url": animation_url(entry["thumbnail_path"]) if entry.get("thumbnail_path") else None,
+                    # Empty until the variant stage has encoded this render
+                    "video_renditions": rendition_urls(entry),
+                    "poster_url": poster_url(entry)
+                }
+        return found
+
+    def best(self, manim_code: str) -> Optional[Dict[str, Any]]:
+        """Highest rendered rung of a scene: {quality, video_url, thumbnail_url, video_renditions, poster_url, video_variants}"""
+        variants = self.variants(manim_code)
+        for quality in reversed(self.ladder):
+            if quality in variants:
+                return {
+                    "quality": quality,
+                    **variants[quality],
+                    "video_variants": {q: v["video_url"] for q, v in variants.items()}
+                }
+        return None
+
+    def schedule_upgrade(self, manim_code: str, topic: str, quality: str) -> Optional[str]:
+        """
+        Queue background renders of the rungs above `quality`.
+
+        Returns:
+            Job id of the top rung's render, or None if nothing was queued
+        """
+        if not RENDER_PROGRESSIVE or quality not in self.ladder:
+            return None
+
+        job_id = None
+        for higher in self.ladder[self.ladder.index(quality) + 1:]:
+            try:
+                job = self.render_service.submit(
+                    manim_code,
+                    topic,
+                    on_done=lambda job, code=manim_code: self._publish_upgrade(job, code),
+                    timeout_seconds=RENDER_UPGRADE_TIMEOUT_SECONDS,
+                    quality=higher,
+                    priority=BACKGROUND
+                )
+            except RenderQueueFull:
+                # The low-quality video stays; a later request for the scene can upgrade it
+                self._count("upgrades_skipped")
+                continue
+            except Exception as e:
+                print(f"⚠️ Could not queue {higher} render of '{topic}': {e}")
+                self._count("upgrades_skipped")
+                continue
+            self._count("upgrades_queued")
+            job_id = job.id
+        return job_id
+
+    def _publish_upgrade(self, job: RenderJob, manim_code: str) -> None:
+        """Point slides and cache entries at the finished rung if they show a lower one"""
+        if job.status != COMPLETED:
+            self._count("upgrades_failed")
+            print(f"⚠️ {job.quality} render of '{job.topic}' did not complete: {job.error}")
+            return
+        self._count("upgrades_completed")
+        if self.db is None:
+            return
+
+        variants = self.variants(manim_code)
+        lower = self.ladder[:self.ladder.index(job.quality)]
+        lower_urls = [variants[q]["video_url"] for q in lower if q in variants]
+        # Slides stored before the blob store link the lower rung by its local path
+        lower_urls += [local_animation_url(variants[q]["video_path"]) for q in lower if q in variants]
+        if not lower_urls:
+            return
+
+        video_path, thumbnail_path = job.future.result()
+        upgraded = variants.get(job.quality, {})
+        upgrade = {
+            "video_url": animation_url(video_path),
+            "video_quality": job.quality,
+            "video_variants": {
+                **{q: v["video_url"] for q, v in variants.items()},
+                job.quality: animation_url(video_path)
+            },
+            # Renditions of the lower rung do not match the new video; the variant
+            # stage records this rung's when they are encoded
+            "video_renditions": upgraded.get("video_renditions", []),
+            "poster_url": upgraded.get("poster_url")
+        }
+        if thumbnail_path:
+            upgrade["thumbnail_url"] = animation_url(thumbnail_path)
+
+        try:
+            result = self.db.generated_slides.update_many(
+                {"video_url": {"$in": lower_urls}},
+                {"$set": upgrade}
+            )
+            self.db.generation_cache.update_many(
+                {"value.video_url": {"$in": lower_urls}},
+                {"$set": {f"value.{field}": value for field, value in upgrade.items()}}
+            )
+        except Exception as e:
+            print(f"⚠️ Failed to publish {job.quality} render of '{job.topic}': {e}")
+            return
+
+        self._count("slides_upgraded", result.modified_count)
+        print(f"✓ Upgraded '{job.topic}' to -q{job.quality} on {result.modified_count} slides")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"progressive": RENDER_PROGRESSIVE, "ladder": self.ladder, **self.counters}
+
+
+def select_video_quality(slide: Dict[str, Any], quality: Optional[str]) -> Dict[str, Any]:
+    """
+    Serve a specific rung of a slide's video when the client asks for one.
+    "best" (or no preference) keeps the stored URL, which is always the best rendered.
+    """
+    variants = slide.get("video_variants") or {}
+    if quality and quality != "best" and quality in variants:
+        slide["video_url"] = variants[quality]
+        slide["video_quality"] = quality
+    return slide
+
+
+# Singleton instance
+_quality_ladder: Optional[QualityLadder] = None
+
+
+def get_quality_ladder(db=None) -> QualityLadder:
+    """Get or create the quality ladder singleton"""
+    global _quality_ladder
+
+    if _quality_ladder is None:
+        _quality_ladder = QualityLadder(db, get_render_service(db))
+
+    return _quality_ladder
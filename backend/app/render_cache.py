@@ -0,0 +1,208 @@
+"""
+Content-addressed cache of rendered Manim animations.
+
+Renders are keyed on a hash of the normalized scene source plus quality and
+format, so the same scene is only ever rendered once. Published files live at
+{MANIM_OUTPUT_DIR}/cache/{key[:2]}/{key}.{format} with a JSON index entry next
+to them, and the index is mirrored in Mongo (render_cache collection) when a
+database is available. Files and index entries are written to a temp file and
+renamed into place, so readers never see a half-written video.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from blob_store import touch_access
+
+MANIM_OUTPUT_DIR = os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")
+
+
+def normalize_scene_source(manim_code: str) -> str:
+    """Scene source with comments, blank lines and trailing whitespace removed"""
+    lines = []
+    for line in manim_code.replace("\r\n", "\n").split("\n"):
+        stripped = line.rstrip()
+        if not stripped.strip() or stripped.lstrip().startswith("#"):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines)
+
+
+def render_key(manim_code: str, quality: str, output_format: str) -> str:
+    """Cache key of a render: normalized source + quality + format"""
+    encoded = json.dumps({
+        "source": normalize_scene_source(manim_code),
+        "quality": quality,
+        "format": output_format
+    }, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _atomic_publish_file(source: Path, destination: Path) -> None:
+    """Move (or copy, across filesystems) source to destination via a temp name"""
+    fd, tmp_path = tempfile.mkstemp(dir=destination.parent, prefix=f".{destination.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.move(str(source), tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class RenderCache:
+    """Disk + Mongo index of published renders"""
+
+    def __init__(self, output_dir: str = MANIM_OUTPUT_DIR, collection=None):
+        self.root = Path(output_dir) / "cache"
+        self.collection = collection
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key[:2]
+
+    def _index_path(self, key: str) -> Path:
+        return self._entry_dir(key) / f"{key}.json"
+
+    @staticmethod
+    def _is_complete(entry: Optional[Dict[str, Any]]) -> bool:
+        return bool(entry) and Path(entry["video_path"]).exists()
+
+    def _record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, key: str, record: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Published render for key, or None (entries whose video is gone count as misses).
+        With record=False the lookup is a peek: it counts neither as hit nor miss.
+        """
+        entry = None
+        try:
+            entry = json.loads(self._index_path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+
+        if not self._is_complete(entry) and self.collection is not None:
+            try:
+                entry = self.collection.find_one({"_id": key}, {"_id": 0})
+            except Exception as e:
+                print(f"Render cache lookup failed: {e}")
+                entry = None
+
+        if not self._is_complete(entry):
+            if record:
+                self._record(hit=False)
+            return None
+        if not record:
+            return entry
+
+        self._record(hit=True)
+        # A reused render counts as recently used for storage eviction
+        touch_access(Path(entry["video_path"]))
+        if self.collection is not None:
+            try:
+                self.collection.update_one({"_id": key}, {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.now()}})
+            except Exception:
+                pass
+        return entry
+
+    def publish(
+        self,
+        key: str,
+        video_path: str,
+        thumbnail_path: Optional[str],
+        quality: str,
+        output_format: str
+    ) -> Dict[str, Any]:
+        """
+        Move a finished render into the cache and index it.
+
+        Returns:
+            The index entry, whose paths point at the published files
+        """
+        entry_dir = self._entry_dir(key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+
+        published_video = entry_dir / f"{key}.{output_format}"
+        _atomic_publish_file(Path(video_path), published_video)
+
+        published_thumbnail = None
+        if thumbnail_path and Path(thumbnail_path).exists():
+            published_thumbnail = entry_dir / f"{key}_thumb.jpg"
+            _atomic_publish_file(Path(thumbnail_path), published_thumbnail)
+
+        entry = {
+            "key": key,
+            "video_path": str(published_video),
+            "thumbnail_path": str(published_thumbnail) if published_thumbnail else None,
+            "quality": quality,
+            "format": output_format,
+            "size_bytes": published_video.stat().st_size,
+            "created_at": datetime.now().isoformat()
+        }
+        # The index entry is written last: its presence means the files are in place
+        _atomic_write_text(self._index_path(key), json.dumps(entry))
+
+        if self.collection is not None:
+            try:
+                self.collection.replace_one({"_id": key}, {**entry, "hits": 0}, upsert=True)
+            except Exception as e:
+                print(f"Render cache index write failed: {e}")
+
+        return entry
+
+    def update_entry(self, key: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Add fields (e.g. derived files) to a published entry; None if it is not published"""
+        try:
+            entry = json.loads(self._index_path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+        entry.update(fields)
+        _atomic_write_text(self._index_path(key), json.dumps(entry))
+        if self.collection is not None:
+            try:
+                self.collection.update_one({"_id": key}, {"$set": fields})
+            except Exception as e:
+                print(f"Render cache index write failed: {e}")
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "mongo_index": self.collection is not None
+            }
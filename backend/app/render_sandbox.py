@@ -0,0 +1,233 @@
+"""
+Resource limits for render processes running LLM-generated Manim code.
+
+Generated scenes used to run with the API's privileges and no limits, so one
+pathological scene could take every core and all memory on the host. Every
+render process (a `manim` CLI run or a warm worker) now:
+
+- runs at lower CPU priority (RENDER_NICE)
+- has rlimits on CPU seconds, address space and open files, per quality tier
+  (DEFAULT_TIER_LIMITS, overridden with e.g. RENDER_LIMITS_H="cpu_seconds=1200,memory_mb=6144")
+- works in its own directory under RENDER_SANDBOX_DIR, removed after the job
+- optionally joins a cgroup v2 group (RENDER_CGROUP, a directory the API user may
+  write to), whose cpu.max / memory.max cap all renders together so the API keeps
+  its share of the machine
+
+Each job reports what it used (CPU time, peak RSS, wall time) from os.wait4 or,
+on warm workers, getrusage.
+
+CLI processes (manim, ffmpeg) are started through this module as a launcher
+(limited_command), which applies the limits in a fresh interpreter and then execs
+the command. Popen's preexec_fn would run Python between fork and exec of the
+multi-threaded API process, where a lock held by another thread can deadlock it.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits
+    resource = None
+
+MANIM_OUTPUT_DIR = os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")
+# Same filesystem as the render cache, so publishing a video is a rename
+RENDER_SANDBOX_DIR = os.getenv("RENDER_SANDBOX_DIR", os.path.join(MANIM_OUTPUT_DIR, "sandbox"))
+RENDER_NICE = int(os.getenv("RENDER_NICE", "10"))
+RENDER_CGROUP = os.getenv("RENDER_CGROUP", "")
+# cgroup v2 formats: cpu.max "200000 100000" = 2 CPUs, memory.max "4G"
+RENDER_CGROUP_CPU_MAX = os.getenv("RENDER_CGROUP_CPU_MAX", "")
+RENDER_CGROUP_MEMORY_MAX = os.getenv("RENDER_CGROUP_MEMORY_MAX", "")
+
+# Limits per manim quality flag; higher tiers render more and larger frames
+DEFAULT_TIER_LIMITS = {
+    "l": {"cpu_seconds": 300, "memory_mb": 4096, "open_files": 256},
+    "m": {"cpu_seconds": 600, "memory_mb": 4096, "open_files": 256},
+    "h": {"cpu_seconds": 1800, "memory_mb": 6144, "open_files": 512},
+    "p": {"cpu_seconds": 3600, "memory_mb": 8192, "open_files": 512},
+    "k": {"cpu_seconds": 7200, "memory_mb": 12288, "open_files": 512},
+}
+
+
+def limits_for(quality: str) -> Dict[str, int]:
+    """Limits of a quality tier, with RENDER_LIMITS_<QUALITY> overrides applied"""
+    limits = dict(DEFAULT_TIER_LIMITS.get(quality, DEFAULT_TIER_LIMITS["l"]))
+    override = os.getenv(f"RENDER_LIMITS_{quality.upper()}", "")
+    for item in filter(None, (part.strip() for part in override.split(","))):
+        name, _, value = item.partition("=")
+        if name.strip() in limits:
+            limits[name.strip()] = int(value)
+    return limits
+
+
+def max_limits() -> Dict[str, int]:
+    """Largest limit of any tier (hard limits of warm workers, which serve every tier)"""
+    tiers = [limits_for(quality) for quality in DEFAULT_TIER_LIMITS]
+    return {name: max(tier[name] for tier in tiers) for name in tiers[0]}
+
+
+def _set_limit(kind: int, soft: int, hard: Optional[int] = None) -> None:
+    """Set an rlimit; hard=None keeps the current hard limit"""
+    _, current_hard = resource.getrlimit(kind)
+    if hard is None:
+        hard = current_hard
+    elif current_hard != resource.RLIM_INFINITY:
+        # An unprivileged process can only lower its hard limit
+        hard = min(hard, current_hard)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(kind, (soft, hard))
+
+
+def apply_limits(limits: Dict[str, int], hard_limits: Optional[Dict[str, Any]] = None, nice: int = RENDER_NICE) -> None:
+    """
+    Limit the calling process (run in the render process itself, before any
+    generated code). hard_limits lets a warm worker tighten soft limits per job
+    later; a hard cpu_seconds of None leaves the CPU hard limit as it is.
+    """
+    if resource is None:
+        return
+    hard_limits = hard_limits or limits
+
+    _set_limit(resource.RLIMIT_CPU, limits["cpu_seconds"], hard_limits["cpu_seconds"])
+    _set_limit(resource.RLIMIT_AS, limits["memory_mb"] * 1024 * 1024, hard_limits["memory_mb"] * 1024 * 1024)
+    _set_limit(resource.RLIMIT_NOFILE, limits["open_files"], hard_limits["open_files"])
+    # No core dumps of scenes killed by a limit
+    _set_limit(resource.RLIMIT_CORE, 0, 0)
+
+    if nice:
+        os.nice(nice)
+    join_cgroup(os.getpid())
+
+
+def limited_command(cmd: List[str], limits: Dict[str, int]) -> List[str]:
+    """Command line that runs `cmd` under `limits` (unchanged where rlimits are unavailable)"""
+    if resource is None:
+        return list(cmd)
+    return [sys.executable, str(Path(__file__).resolve()), json.dumps(limits), *cmd]
+
+
+def _exec_limited(argv: List[str]) -> None:
+    """Launcher: apply the limits in argv[0], then replace this process with argv[1:]"""
+    apply_limits(json.loads(argv[0]))
+    try:
+        os.execvp(argv[1], argv[1:])
+    except OSError as e:
+        sys.stderr.write(f"Cannot run {argv[1]}: {e}\n")
+        sys.exit(127)
+
+
+def set_job_limits(limits: Dict[str, int]) -> None:
+    """
+    Soft limits for the next job on a long-lived warm worker. CPU time is counted
+    over the process lifetime, so the job's budget is added to what was used so far.
+    """
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _set_limit(resource.RLIMIT_CPU, used + limits["cpu_seconds"])
+    _set_limit(resource.RLIMIT_AS, limits["memory_mb"] * 1024 * 1024)
+    _set_limit(resource.RLIMIT_NOFILE, limits["open_files"])
+
+
+def setup_cgroup() -> bool:
+    """Write cpu.max / memory.max of RENDER_CGROUP; False when cgroups are not configured"""
+    if not RENDER_CGROUP:
+        return False
+    cgroup = Path(RENDER_CGROUP)
+    try:
+        cgroup.mkdir(parents=True, exist_ok=True)
+        if RENDER_CGROUP_CPU_MAX:
+            (cgroup / "cpu.max").write_text(RENDER_CGROUP_CPU_MAX)
+        if RENDER_CGROUP_MEMORY_MAX:
+            (cgroup / "memory.max").write_text(RENDER_CGROUP_MEMORY_MAX)
+    except OSError as e:
+        print(f"⚠️ Render cgroup {cgroup} unavailable, using rlimits only: {e}")
+        return False
+    print(f"✓ Render processes limited by cgroup {cgroup}")
+    return True
+
+
+def join_cgroup(pid: int) -> None:
+    """Move a process into RENDER_CGROUP (no-op when not configured)"""
+    if not RENDER_CGROUP:
+        return
+    try:
+        (Path(RENDER_CGROUP) / "cgroup.procs").write_text(str(pid))
+    except OSError:
+        pass
+
+
+def job_workdir(job_id: str) -> Path:
+    """Fresh working directory for one render job"""
+    workdir = Path(RENDER_SANDBOX_DIR).resolve() / job_id
+    workdir.mkdir(parents=True, exist_ok=True)
+    return workdir
+
+
+def remove_workdir(workdir: Path) -> None:
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def process_usage():
+    """getrusage of the calling process, or None without the resource module"""
+    return resource.getrusage(resource.RUSAGE_SELF) if resource is not None else None
+
+
+def usage_report(rusage, wall_seconds: float) -> Dict[str, Any]:
+    """Resource usage of a render from a struct_rusage (ru_maxrss is in KB on Linux)"""
+    max_rss_kb = rusage.ru_maxrss / 1024 if os.uname().sysname == "Darwin" else rusage.ru_maxrss
+    return {
+        "cpu_user_seconds": round(rusage.ru_utime, 2),
+        "cpu_system_seconds": round(rusage.ru_stime, 2),
+        "max_rss_mb": round(max_rss_kb / 1024, 1),
+        "wall_seconds": round(wall_seconds, 2)
+    }
+
+
+def kill_process_group(process: subprocess.Popen) -> None:
+    """Kill a sandboxed process and anything it spawned (manim's ffmpeg, latex); it must run in its own session"""
+    try:
+        if os.name == 'nt':
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def wait_with_usage(process: subprocess.Popen, timeout_seconds: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Wait for a sandboxed process and collect its resource usage.
+
+    Returns:
+        Tuple of (return code, usage report or None where os.wait4 is unavailable)
+
+    Raises:
+        subprocess.TimeoutExpired: the process is still running after timeout_seconds
+    """
+    started = time.monotonic()
+    if not hasattr(os, "wait4"):
+        return process.wait(timeout=timeout_seconds), None
+
+    deadline = started + timeout_seconds
+    while True:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return process.returncode, usage_report(rusage, time.monotonic() - started)
+        if time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout_seconds)
+        time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    _exec_limited(sys.argv[1:])
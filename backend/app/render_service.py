@@ -0,0 +1,713 @@
+"""
+Manim render service.
+
+Rendering a scene takes seconds to minutes of CPU, so it no longer runs inline on
+the thread that generated the code. Jobs go into a bounded queue and are rendered
+by a fixed pool of workers (one per core by default). BACKGROUND jobs (quality
+upgrades) have their own, separately bounded queue and run on at most
+RENDER_BACKGROUND_WORKERS workers at once, so a burst of upgrades can neither
+fill the interactive queue nor take every worker; a worker is always left for
+INTERACTIVE renders. Each worker supervises one
+render process at a time, which lets a job be killed on timeout or cancellation.
+With RENDER_MODE=warm (default) that process is a warm manim worker that already
+imported manim (see manim_worker.py); RENDER_MODE=cli, or a worker that cannot
+start, launches the `manim` CLI per job. Either way the process runs generated
+code under per-tier resource limits in its own directory (see render_sandbox.py).
+
+Callers either await a render (render_async / RenderJob.wait) or submit it and
+move on (submit with an on_done callback); a full queue is rejected immediately
+instead of piling up work. Finished renders are published to the render cache,
+so a scene that was rendered before (or is rendering right now) is not rendered again.
+"""
+
+import os
+import uuid
+import asyncio
+import threading
+import subprocess
+import concurrent.futures
+from collections import deque
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Deque, Dict, Any, List, Optional, Tuple
+
+from render_cache import RenderCache, render_key
+from blob_store import get_blob_store
+from manim_worker import WarmManimWorker, WorkerUnavailable, WorkerTimeout
+from manim_preflight import check_scene, ScenePreflightError
+from thumbnails import generate_thumbnail
+import render_sandbox
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 2)))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "32"))
+# Background renders running at once; the rest of the workers stay free for interactive ones
+RENDER_BACKGROUND_WORKERS = int(os.getenv("RENDER_BACKGROUND_WORKERS", str(max(1, RENDER_WORKERS - 1))))
+RENDER_BACKGROUND_QUEUE_SIZE = int(os.getenv("RENDER_BACKGROUND_QUEUE_SIZE", "32"))
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", "180"))
+# Queue priorities: interactive renders go ahead of background ones (quality upgrades)
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# "warm": long-lived workers that import manim once; "cli": one manim process per job
+RENDER_MODE = os.getenv("RENDER_MODE", "warm").lower()
+# Manim quality flag (-ql, -qm, -qh, ...) and container format of rendered videos
+RENDER_QUALITY = os.getenv("RENDER_QUALITY", "l")
+RENDER_FORMAT = os.getenv("RENDER_FORMAT", "mp4")
+# Finished jobs kept for status lookups
+RENDER_TRACKED_JOBS = 1000
+
+# Directory manim names after each quality flag
+QUALITY_DIRS = {
+    "l": "480p15",
+    "m": "720p30",
+    "h": "1080p60",
+    "p": "1440p60",
+    "k": "2160p60",
+}
+
+MANIM_OUTPUT_DIR = os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+
+class RenderQueueFull(RuntimeError):
+    """The render queue is at capacity; retry later"""
+
+
+class RenderCancelled(RuntimeError):
+    """The render job was cancelled before it finished"""
+
+
+def animation_url(path: str) -> str:
+    """
+    URL of a published media file: its content-addressed blob, which any API node
+    can serve. Falls back to the file's local path if the blob store is unavailable.
+    """
+    try:
+        return get_blob_store().publish(path)
+    except Exception as e:
+        print(f"⚠️ Blob store publish failed for {path}, serving it from this node only: {e}")
+        return local_animation_url(path)
+
+
+def local_animation_url(path: str) -> str:
+    """URL of a file under MANIM_OUTPUT_DIR on this node (how media was linked before the blob store)"""
+    try:
+        relative = Path(path).resolve().relative_to(Path(MANIM_OUTPUT_DIR).resolve())
+    except ValueError:
+        relative = Path(Path(path).name)
+    return f"/animations/{relative.as_posix()}"
+
+
+def safe_base_name(topic: str) -> str:
+    """Unique, filesystem-safe output name for a topic"""
+    file_id = str(uuid.uuid4())[:8]
+    safe_topic = "".join(c for c in topic if c.isalnum() or c in (' ', '-', '_')).strip()[:50]
+    return f"{safe_topic}_{file_id}".replace(" ", "_")
+
+
+class RenderJob:
+    """
+    One scene to render; `future` resolves to (video_path, thumbnail_path).
+    Submits of the same scene share the job, and each counts as one waiter.
+    """
+
+    def __init__(
+        self,
+        manim_code: str,
+        topic: str,
+        timeout_seconds: float,
+        quality: str = RENDER_QUALITY,
+        output_format: str = RENDER_FORMAT,
+        priority: int = INTERACTIVE
+    ):
+        self.id = str(uuid.uuid4())
+        self.manim_code = manim_code
+        self.topic = topic
+        self.base_name = safe_base_name(topic)
+        self.timeout_seconds = timeout_seconds
+        self.quality = quality
+        self.output_format = output_format
+        self.priority = priority
+        self.cache_key = render_key(manim_code, quality, output_format)
+        self.cache_hit = False
+        self.preflight: Optional[Dict[str, Any]] = None
+        # CPU / memory / wall time the render process used (render_sandbox.usage_report)
+        self.usage: Optional[Dict[str, Any]] = None
+        # Blob URLs of the result, resolved once when the job completes (status polls only read them)
+        self.video_url: Optional[str] = None
+        self.thumbnail_url: Optional[str] = None
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        # Kills the process rendering this job (set while it runs)
+        self._kill: Optional[Callable[[], None]] = None
+        self._cancel_requested = False
+        # Callers waiting on this job; it is only cancelled once all of them gave up
+        self.waiters = 1
+        self._lock = threading.Lock()
+
+    def wait(self, timeout: Optional[float] = None) -> Tuple[str, Optional[str]]:
+        """Block until rendered (for callers already off the event loop)"""
+        return self.future.result(timeout=timeout)
+
+    def join(self) -> bool:
+        """Add a waiter to a job that is still going to finish; False if it was cancelled"""
+        with self._lock:
+            if self._cancel_requested or self.status not in (QUEUED, RUNNING):
+                return False
+            self.waiters += 1
+            return True
+
+    def cancel(self, force: bool = False) -> bool:
+        """
+        Drop one waiter. Once none is left (or with force) a queued job is cancelled
+        and the manim process of a running one killed.
+
+        Returns:
+            True if the job was cancelled, False if it finished or others still wait on it
+        """
+        with self._lock:
+            if self.status not in (QUEUED, RUNNING) or self._cancel_requested:
+                return False
+            self.waiters = max(0, self.waiters - 1)
+            if self.waiters and not force:
+                return False
+            self._cancel_requested = True
+            kill = self._kill
+
+        if kill is not None:
+            kill()
+        return True
+
+    def resolve_urls(self, result: Tuple[str, Optional[str]]) -> None:
+        """Publish the rendered files to the blob store and keep their URLs"""
+        video_path, thumbnail_path = result
+        self.video_url = animation_url(video_path)
+        self.thumbnail_url = animation_url(thumbnail_path) if thumbnail_path else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "topic": self.topic,
+            "status": self.status,
+            "error": self.error,
+            "cache_hit": self.cache_hit,
+            "waiters": self.waiters,
+            "quality": self.quality,
+            "estimated_seconds": self.preflight["estimated_seconds"] if self.preflight else None,
+            "resource_usage": self.usage,
+            "video_url": self.video_url,
+            "thumbnail_url": self.thumbnail_url,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+def find_rendered_video(
+    base_name: str,
+    script_stem: str,
+    output_dir: str = MANIM_OUTPUT_DIR,
+    quality: str = RENDER_QUALITY,
+    output_format: str = RENDER_FORMAT
+) -> Optional[Path]:
+    """Locate the video manim wrote for a render"""
+    # Manim creates: {media_dir}/videos/{script_name}/{quality}/{output_file}.{format}
+    quality_dir = QUALITY_DIRS.get(quality, QUALITY_DIRS["l"])
+    possible_paths = [
+        Path(output_dir) / "videos" / script_stem / quality_dir / f"{base_name}.{output_format}",
+        Path(output_dir) / "videos" / script_stem / quality_dir / f"GeneratedScene.{output_format}",
+        Path(output_dir) / f"{base_name}.{output_format}",
+    ]
+    for path in possible_paths:
+        if path.exists():
+            return path
+    return None
+
+
+class RenderService:
+    """Bounded queues of render jobs served by a fixed pool of worker threads"""
+
+    def __init__(
+        self,
+        workers: int = RENDER_WORKERS,
+        queue_size: int = RENDER_QUEUE_SIZE,
+        timeout_seconds: float = RENDER_TIMEOUT_SECONDS,
+        output_dir: str = MANIM_OUTPUT_DIR,
+        cache: Optional[RenderCache] = None,
+        mode: str = RENDER_MODE,
+        background_workers: int = RENDER_BACKGROUND_WORKERS,
+        background_queue_size: int = RENDER_BACKGROUND_QUEUE_SIZE
+    ):
+        self.workers = max(1, workers)
+        self.background_workers = max(1, min(background_workers, self.workers - 1))
+        # A single worker gets a second thread, so one always stays free for interactive renders
+        self.workers = max(self.workers, self.background_workers + 1)
+        self.mode = mode
+        # One warm manim worker per render thread, created on first use
+        self._local = threading.local()
+        self._warm_workers = []
+        self.timeout_seconds = timeout_seconds
+        self.output_dir = output_dir
+        self.cache = cache
+        # FIFO per priority; workers take interactive jobs first
+        self.queue_size = max(1, queue_size)
+        self.background_queue_size = max(1, background_queue_size)
+        self._interactive: Deque[RenderJob] = deque()
+        self._background: Deque[RenderJob] = deque()
+        self._background_running = 0
+        self._stopping = False
+        self.cgroup = False
+        # Called with (job, cache entry) after each render is published (e.g. variant encoding)
+        self._post_publish_hooks: List[Callable[[RenderJob, Dict[str, Any]], None]] = []
+        self._jobs: Dict[str, RenderJob] = {}
+        # cache_key -> job currently queued or rendering that scene
+        self._in_flight: Dict[str, RenderJob] = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        # Signalled when a job is queued, a background slot frees up, or the service stops
+        self._ready = threading.Condition(self._lock)
+        self.counters = {
+            "submitted": 0,
+            "cpu_seconds": 0.0,
+            "rejected": 0,
+            "preflight_rejected": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+            "promoted": 0,
+            COMPLETED: 0,
+            FAILED: 0,
+            CANCELLED: 0,
+            TIMED_OUT: 0
+        }
+
+    def add_post_publish_hook(self, hook: Callable[[RenderJob, Dict[str, Any]], None]) -> None:
+        """Run hook(job, cache_entry) on the render thread after each publish; keep it quick"""
+        self._post_publish_hooks.append(hook)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            self.cgroup = render_sandbox.setup_cgroup()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"render-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"✓ Render service started with {self.workers} workers ({self.background_workers} for background renders)")
+
+    def stop(self) -> None:
+        """Cancel what is still queued or running and stop the workers"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._threads = []
+            # Jobs that never reached a worker are resolved below so nobody waits on them forever
+            queued = list(self._interactive) + list(self._background)
+            self._interactive.clear()
+            self._background.clear()
+            self._stopping = True
+            self._ready.notify_all()
+        for job in jobs:
+            job.cancel(force=True)
+
+        for job in queued:
+            if not job.future.done():
+                self._finish(job, CANCELLED, error=RenderCancelled(f"Render of '{job.topic}' was cancelled"))
+
+        with self._lock:
+            warm_workers, self._warm_workers = self._warm_workers, []
+        for warm_worker in warm_workers:
+            warm_worker.stop()
+
+    def submit(
+        self,
+        manim_code: str,
+        topic: str,
+        on_done: Optional[Callable[[RenderJob], None]] = None,
+        timeout_seconds: Optional[float] = None,
+        quality: str = RENDER_QUALITY,
+        output_format: str = RENDER_FORMAT,
+        priority: int = INTERACTIVE
+    ) -> RenderJob:
+        """
+        Queue a render and return immediately (fire-and-forget).
+
+        A scene that is already cached comes back as a completed job; one that is
+        already queued or rendering returns that job, with one more waiter (see
+        RenderJob.cancel), moved to the interactive queue when an INTERACTIVE submit
+        joins a queued BACKGROUND job. BACKGROUND jobs only run when no INTERACTIVE
+        job is waiting, on at most `background_workers` workers.
+
+        Raises:
+            ScenePreflightError: if static checks reject the scene (see manim_preflight.py)
+            RenderQueueFull: if the job's queue (interactive or background) is at capacity
+        """
+        job = RenderJob(manim_code, topic, timeout_seconds or self.timeout_seconds, quality, output_format, priority)
+
+        job.preflight = check_scene(manim_code, quality, max_render_seconds=job.timeout_seconds)
+        if not job.preflight["ok"]:
+            with self._lock:
+                self.counters["preflight_rejected"] += 1
+            raise ScenePreflightError(job.preflight)
+
+        cached = self.cache.lookup(job.cache_key) if self.cache else None
+        if cached is not None:
+            job.cache_hit = True
+            result = (cached["video_path"], cached.get("thumbnail_path"))
+            job.resolve_urls(result)
+            job.status = COMPLETED
+            job.finished_at = datetime.now()
+            job.future.set_result(result)
+            with self._lock:
+                self._jobs[job.id] = job
+                self.counters["cache_hits"] += 1
+                self._prune_jobs()
+        else:
+            self.start()
+            with self._lock:
+                existing = self._in_flight.get(job.cache_key)
+                if existing is not None and not existing.future.done() and existing.join():
+                    self.counters["coalesced"] += 1
+                    if job.priority < existing.priority:
+                        self._raise_priority(existing, job.priority)
+                    job = existing
+                else:
+                    if job.priority > INTERACTIVE:
+                        lane, capacity, kind = self._background, self.background_queue_size, "Background render"
+                    else:
+                        lane, capacity, kind = self._interactive, self.queue_size, "Render"
+                    if len(lane) >= capacity:
+                        self.counters["rejected"] += 1
+                        raise RenderQueueFull(f"{kind} queue is full ({capacity} jobs waiting)")
+                    lane.append(job)
+                    self._ready.notify()
+                    self._in_flight[job.cache_key] = job
+                    self._jobs[job.id] = job
+                    self.counters["submitted"] += 1
+                    self._prune_jobs()
+
+        if on_done is not None:
+            job.future.add_done_callback(lambda _: on_done(job))
+        return job
+
+    def _raise_priority(self, job: RenderJob, priority: int) -> None:
+        """Move a queued background job to the interactive queue (caller holds the lock)"""
+        job.priority = priority
+        if priority > INTERACTIVE or job not in self._background:
+            # Already running: it keeps its background slot until it finishes
+            return
+        self._background.remove(job)
+        # It already holds a queue slot, so the interactive capacity is not checked again
+        self._interactive.append(job)
+        self.counters["promoted"] += 1
+        self._ready.notify()
+
+    async def render_async(self, manim_code: str, topic: str) -> Tuple[str, Optional[str]]:
+        """Render without blocking the event loop; cancelling the await drops this waiter from the job"""
+        # A cache lookup may hit Mongo; keep it off the event loop
+        job = await asyncio.to_thread(self.submit, manim_code, topic)
+        try:
+            # Shielded: cancelling this await must not cancel the future other waiters share
+            return await asyncio.shield(asyncio.wrap_future(job.future))
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+    def get_job(self, job_id: str) -> Optional[RenderJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get_job(job_id)
+        return job.cancel() if job else False
+
+    def _prune_jobs(self) -> None:
+        """Forget the oldest finished jobs (caller holds the lock)"""
+        overflow = len(self._jobs) - RENDER_TRACKED_JOBS
+        if overflow <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job.future.done()]
+        for job_id in finished[:overflow]:
+            del self._jobs[job_id]
+
+    def _finish(self, job: RenderJob, status: str, result=None, error: Optional[Exception] = None) -> None:
+        if status == COMPLETED:
+            try:
+                job.resolve_urls(result)
+            except Exception as e:
+                status, error = FAILED, e
+        job.status = status
+        job.finished_at = datetime.now()
+        with self._lock:
+            self.counters[status] += 1
+            if self._in_flight.get(job.cache_key) is job:
+                del self._in_flight[job.cache_key]
+
+        if status == COMPLETED:
+            job.future.set_result(result)
+        else:
+            job.error = str(error)
+            job.future.set_exception(error)
+
+    def _next_job(self) -> Tuple[Optional[RenderJob], bool]:
+        """
+        Block until there is a job this worker may run.
+
+        Returns:
+            Tuple of (job or None when the service stops, whether it holds a background slot)
+        """
+        with self._ready:
+            while not self._stopping:
+                if self._interactive:
+                    return self._interactive.popleft(), False
+                if self._background and self._background_running < self.background_workers:
+                    self._background_running += 1
+                    return self._background.popleft(), True
+                self._ready.wait()
+            return None, False
+
+    def _worker(self) -> None:
+        while True:
+            job, background_slot = self._next_job()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            finally:
+                if background_slot:
+                    with self._ready:
+                        self._background_running -= 1
+                        self._ready.notify()
+
+    def _run(self, job: RenderJob) -> None:
+        """Render a job taken off a queue and resolve its future"""
+        with job._lock:
+            if job._cancel_requested:
+                cancelled = True
+            else:
+                cancelled = False
+                job.status = RUNNING
+                job.started_at = datetime.now()
+
+        if cancelled:
+            self._finish(job, CANCELLED, error=RenderCancelled(f"Render of '{job.topic}' was cancelled"))
+            return
+
+        try:
+            result = self._render(job)
+        except (subprocess.TimeoutExpired, WorkerTimeout):
+            self._finish(job, TIMED_OUT, error=RuntimeError(
+                f"Manim rendering timed out after {job.timeout_seconds:.0f}s"
+            ))
+        except RenderCancelled as e:
+            self._finish(job, CANCELLED, error=e)
+        except Exception as e:
+            self._finish(job, FAILED, error=e)
+        else:
+            self._finish(job, COMPLETED, result=result)
+
+    def _warm_worker(self) -> Optional[WarmManimWorker]:
+        """This thread's warm worker, or None when rendering through the CLI"""
+        if self.mode != "warm":
+            return None
+
+        warm_worker = getattr(self._local, "warm_worker", None)
+        if warm_worker is None:
+            warm_worker = WarmManimWorker(self.output_dir)
+            try:
+                warm_worker.start()
+            except WorkerUnavailable as e:
+                print(f"⚠️ Warm manim workers unavailable, rendering with the CLI: {e}")
+                self.mode = "cli"
+                return None
+            self._local.warm_worker = warm_worker
+            with self._lock:
+                self._warm_workers.append(warm_worker)
+        return warm_worker
+
+    def _render(self, job: RenderJob) -> Tuple[str, Optional[str]]:
+        """Render one job's scene to video; returns (video_path, thumbnail_path)"""
+        # Save generated code to debug directory for inspection
+        debug_dir = Path(self.output_dir) / "debug"
+        debug_dir.mkdir(parents=True, exist_ok=True)
+        debug_file = debug_dir / f"{job.base_name}.py"
+        debug_file.write_text(job.manim_code, encoding='utf-8')
+
+        # Renders happen in a per-job sandbox directory; publishing moves the results out
+        workdir = render_sandbox.job_workdir(job.id)
+        try:
+            warm_worker = self._warm_worker()
+            try:
+                if warm_worker is not None:
+                    video_path = self._render_warm(job, warm_worker, workdir)
+                else:
+                    video_path = self._render_cli(job, workdir)
+            except RuntimeError as e:
+                if job._cancel_requested:
+                    raise RenderCancelled(f"Render of '{job.topic}' was cancelled")
+                raise RuntimeError(f"{e}\nCode saved to: {debug_file}")
+            finally:
+                if job.usage:
+                    with self._lock:
+                        self.counters["cpu_seconds"] += job.usage["cpu_user_seconds"] + job.usage["cpu_system_seconds"]
+
+            if job._cancel_requested:
+                raise RenderCancelled(f"Render of '{job.topic}' was cancelled")
+
+            # Thumbnail from a representative frame, extracted in-process
+            thumbnail_path = generate_thumbnail(video_path)
+
+            if self.cache is None:
+                # Nothing to publish to: the files stay in the sandbox directory
+                workdir = None
+                return str(video_path), thumbnail_path
+
+            entry = self.cache.publish(job.cache_key, str(video_path), thumbnail_path, job.quality, job.output_format)
+            for hook in self._post_publish_hooks:
+                try:
+                    hook(job, entry)
+                except Exception as e:
+                    print(f"⚠️ Post-publish step failed for '{job.topic}': {e}")
+            return entry["video_path"], entry["thumbnail_path"]
+        finally:
+            if workdir is not None:
+                render_sandbox.remove_workdir(workdir)
+
+    def _render_warm(self, job: RenderJob, warm_worker: WarmManimWorker, workdir: Path) -> Path:
+        """Render on this thread's warm worker (no interpreter start or manim import)"""
+        with job._lock:
+            job._kill = warm_worker.kill
+            cancel_requested = job._cancel_requested
+        if cancel_requested:
+            raise RenderCancelled(f"Render of '{job.topic}' was cancelled")
+
+        reply = warm_worker.render(
+            job.id,
+            job.manim_code,
+            job.base_name,
+            job.quality,
+            job.output_format,
+            job.timeout_seconds,
+            media_dir=str(workdir),
+            workdir=str(workdir),
+            limits=render_sandbox.limits_for(job.quality)
+        )
+        job.usage = reply.get("usage")
+        video_path = Path(reply["video_path"])
+        if not video_path.exists():
+            raise RuntimeError(f"Generated video not found at {video_path}")
+        return video_path
+
+    def _render_cli(self, job: RenderJob, workdir: Path) -> Path:
+        """Render with a fresh, resource-limited `manim` CLI process"""
+        script = workdir / "scene.py"
+        script.write_text(job.manim_code, encoding='utf-8')
+
+        # --disable_caching to avoid cache issues
+        cmd = render_sandbox.limited_command([
+            "manim",
+            f"-q{job.quality}",  # l = 480p15 (fast), h = 1080p60 (production)
+            f"--format={job.output_format}",
+            "--disable_caching",
+            f"--output_file={job.base_name}",
+            f"--media_dir={workdir}",
+            str(script),
+            "GeneratedScene"
+        ], render_sandbox.limits_for(job.quality))
+
+        # Output goes to files, not pipes: the process is reaped with os.wait4 for its usage
+        with open(workdir / "stdout.log", "w") as stdout, open(workdir / "stderr.log", "w") as stderr:
+            # Own process group so a timeout or cancel also kills manim's children
+            process = subprocess.Popen(
+                cmd,
+                cwd=workdir,
+                stdout=stdout,
+                stderr=stderr,
+                start_new_session=os.name != 'nt',
+                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
+            )
+        with job._lock:
+            job._kill = lambda: render_sandbox.kill_process_group(process)
+            cancel_requested = job._cancel_requested
+        if cancel_requested:
+            render_sandbox.kill_process_group(process)
+
+        try:
+            returncode, job.usage = render_sandbox.wait_with_usage(process, job.timeout_seconds)
+        except subprocess.TimeoutExpired:
+            render_sandbox.kill_process_group(process)
+            process.wait()
+            raise
+
+        if returncode != 0:
+            stderr_text = (workdir / "stderr.log").read_text(encoding="utf-8", errors="replace")[-4000:]
+            stdout_text = (workdir / "stdout.log").read_text(encoding="utf-8", errors="replace")[-2000:]
+            if returncode < 0:
+                # SIGXCPU / SIGKILL: over the tier's CPU limit, out of memory, or cancelled
+                stderr_text = f"Killed by signal {-returncode}\n{stderr_text}"
+            raise RuntimeError(f"Manim rendering failed.\nStderr: {stderr_text}\nStdout: {stdout_text}")
+
+        video_path = find_rendered_video(
+            job.base_name, script.stem, str(workdir), job.quality, job.output_format
+        )
+        if video_path is None:
+            # List what was actually created for debugging
+            all_files = list(workdir.rglob("*.mp4"))
+            files_str = "\n".join([str(f) for f in all_files[:10]])
+            raise RuntimeError(
+                f"Generated video not found for {job.base_name}.\n"
+                f"Found MP4 files: {files_str}"
+            )
+        return video_path
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+            return {
+                "workers": self.workers,
+                "mode": self.mode,
+                "warm_workers_recycled": sum(w.recycled for w in self._warm_workers),
+                "queued": len(self._interactive),
+                "queue_capacity": self.queue_size,
+                "running": running,
+                "background_workers": self.background_workers,
+                "background_queued": len(self._background),
+                "background_queue_capacity": self.background_queue_size,
+                "background_running": self._background_running,
+                "sandbox": {
+                    "nice": render_sandbox.RENDER_NICE,
+                    "cgroup": render_sandbox.RENDER_CGROUP if self.cgroup else None,
+                    "limits": {q: render_sandbox.limits_for(q) for q in render_sandbox.DEFAULT_TIER_LIMITS}
+                },
+                **self.counters,
+                "cache": self.cache.stats() if self.cache else None
+            }
+
+
+# Singleton instance
+_render_service: Optional[RenderService] = None
+_render_service_lock = threading.Lock()
+
+
+def get_render_service(db=None) -> RenderService:
+    """
+    Get or create the render service singleton (workers start on first submit).
+    The render cache index is mirrored in Mongo when a database is available.
+    """
+    global _render_service
+
+    with _render_service_lock:
+        if _render_service is None:
+            collection = db.render_cache if db is not None else None
+            _render_service = RenderService(cache=RenderCache(MANIM_OUTPUT_DIR, collection))
+    return _render_service
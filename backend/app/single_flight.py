@@ -0,0 +1,125 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+The first caller for a key runs the function; concurrent callers with the same
+key wait on the same future and get the same result (or the same exception).
+Callers on the event loop use do_async, which waits without holding a thread, so
+a hot key cannot fill the default executor that asyncio.to_thread work shares.
+The number of waiters per key is capped so one hot key cannot pile up unbounded
+callers behind a slow model call.
+"""
+
+import os
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+SINGLE_FLIGHT_MAX_WAITERS = int(os.getenv("SINGLE_FLIGHT_MAX_WAITERS", "100"))
+
+
+class SingleFlightOverloaded(RuntimeError):
+    """Raised when too many callers are already waiting on the same key"""
+
+
+class _Call:
+    def __init__(self):
+        self.future: Future = Future()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Thread-safe single-flight group"""
+
+    def __init__(self, max_waiters: int = SINGLE_FLIGHT_MAX_WAITERS):
+        self.max_waiters = max_waiters
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Run fn once for all concurrent callers with this key.
+
+        Returns:
+            fn's result; exceptions raised by fn propagate to every waiter
+        """
+        call, leader = self._join(key)
+        if not leader:
+            return call.future.result()
+        return self._lead(key, call, fn)
+
+    async def do_async(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        do() for the event loop: a leader runs fn in a worker thread, and a waiter
+        awaits the shared future without holding a thread.
+        """
+        call, leader = self._join(key)
+        if not leader:
+            # A cancelled waiter must not cancel the flight the other callers share
+            return await asyncio.shield(asyncio.wrap_future(call.future))
+        return await asyncio.to_thread(self._lead, key, call, fn)
+
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """
+        do() for a leader that produces the result itself (e.g. while streaming it).
+
+        Returns:
+            Tuple of (the flight's shared future, whether this caller leads it);
+            a leader must call settle() exactly once, whatever happens
+        """
+        call, leader = self._join(key)
+        return call.future, leader
+
+    def settle(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Resolve a flight led through join() with its result or exception"""
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.future is future:
+                del self._calls[key]
+
+    def _join(self, key: str) -> Tuple[_Call, bool]:
+        """The call in flight for key (joined as a waiter) or a new one this caller leads"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                if call.waiters >= self.max_waiters:
+                    raise SingleFlightOverloaded(f"Too many requests waiting on the same generation ({call.waiters})")
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+        return call, leader
+
+    def _lead(self, key: str, call: _Call, fn: Callable[[], T]) -> T:
+        try:
+            result = fn()
+        except BaseException as e:
+            call.future.set_exception(e)
+            raise
+        else:
+            call.future.set_result(result)
+            return result
+        finally:
+            # Later callers start a new flight (and will usually hit the cache)
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "coalesced": self.coalesced
+            }
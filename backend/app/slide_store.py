@@ -0,0 +1,197 @@
+"""
+Content-addressed storage for generated slides.
+
+Generated content is stored once in `slide_contents`, keyed by a SHA-256 hash of the
+normalized output. Per-user rows in `generated_slides` only keep a `content_hash`
+reference, and each content document counts its references so it can be removed
+when the last row pointing at it goes away.
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+# A user's copy of a slide; generated_slides has a unique index on these fields
+SLIDE_KEY_FIELDS = ("user_id", "course_id", "chapter_id", "slide_id")
+
+
+def normalize_content(content: str) -> str:
+    """Normalize generated output so cosmetic whitespace differences hash the same"""
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def compute_content_hash(content: str, content_type: str = "html") -> str:
+    """Hash of the normalized content, namespaced by content type"""
+    normalized = normalize_content(content)
+    return hashlib.sha256(f"{content_type}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def store_slide_content(db, content: str, content_type: str = "html") -> str:
+    """
+    Store content once and take a reference to it.
+
+    Returns:
+        The content hash to keep on the per-user row
+    """
+    content_hash = compute_content_hash(content, content_type)
+    now = datetime.now()
+
+    # Fast path: content already stored, only bump the reference count (no payload sent)
+    result = db.slide_contents.update_one(
+        {"_id": content_hash},
+        {"$inc": {"ref_count": 1}, "$set": {"last_referenced_at": now}}
+    )
+
+    if result.matched_count == 0:
+        # First copy; $setOnInsert keeps concurrent writers of the same hash safe
+        db.slide_contents.update_one(
+            {"_id": content_hash},
+            {
+                "$setOnInsert": {
+                    "content": normalize_content(content),
+                    "content_type": content_type,
+                    "size_bytes": len(content.encode("utf-8")),
+                    "created_at": now
+                },
+                "$inc": {"ref_count": 1},
+                "$set": {"last_referenced_at": now}
+            },
+            upsert=True
+        )
+
+    return content_hash
+
+
+def release_slide_content(db, content_hash: Optional[str]) -> bool:
+    """
+    Drop one reference to stored content, deleting it once unreferenced.
+
+    Returns:
+        True if the content document was deleted
+    """
+    if not content_hash:
+        return False
+
+    db.slide_contents.update_one({"_id": content_hash}, {"$inc": {"ref_count": -1}})
+    result = db.slide_contents.delete_one({"_id": content_hash, "ref_count": {"$lte": 0}})
+    return result.deleted_count > 0
+
+
+def save_generated_slide(
+    db,
+    generated_slide: Dict[str, Any],
+    only_if: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """
+    Store a per-user generated slide, replacing any previous row for the same slide.
+
+    The `content` field is moved to `slide_contents` and replaced with `content_hash`.
+    The reference held by a replaced row is released. With only_if, the previous row
+    must also match those conditions and no new row is inserted.
+
+    Returns:
+        The content hash of the stored slide, or None if only_if matched no row
+    """
+    row = dict(generated_slide)
+    content = row.pop("content")
+    content_hash = store_slide_content(db, content, row.get("content_type", "html"))
+    row["content_hash"] = content_hash
+
+    query = {field: row[field] for field in SLIDE_KEY_FIELDS}
+    if only_if:
+        query.update(only_if)
+    try:
+        previous = db.generated_slides.find_one_and_replace(query, row, upsert=not only_if)
+    except DuplicateKeyError:
+        # A concurrent first write inserted the row between our match and insert; replace it
+        previous = db.generated_slides.find_one_and_replace(query, row, upsert=not only_if)
+
+    if only_if and previous is None:
+        release_slide_content(db, content_hash)
+        return None
+    if previous:
+        release_slide_content(db, previous.get("content_hash"))
+
+    return content_hash
+
+
+def ensure_unique_slide_index(db) -> None:
+    """
+    Create the unique index on SLIDE_KEY_FIELDS, so two concurrent first writes of the
+    same slide cannot both insert a row. Replaces the non-unique index earlier versions
+    created and removes duplicates that would block the build.
+    """
+    slide_key = [(field, 1) for field in SLIDE_KEY_FIELDS]
+    for _ in range(3):
+        try:
+            db.generated_slides.create_index(slide_key, unique=True)
+            return
+        except OperationFailure as e:
+            if e.code == 86:
+                # IndexKeySpecsConflict: same fields, not unique
+                db.generated_slides.drop_index(slide_key)
+            elif e.code == 11000:
+                print(f"Removed {remove_duplicate_slides(db)} duplicate generated slides")
+            else:
+                raise
+    db.generated_slides.create_index(slide_key, unique=True)
+
+
+def remove_duplicate_slides(db) -> int:
+    """
+    Keep only the newest row per user slide (duplicates left by concurrent first
+    writes before the unique index existed) and release the others' content.
+    """
+    duplicates = db.generated_slides.aggregate([
+        {"$sort": {"generated_at": -1, "_id": -1}},
+        {"$group": {"_id": {field: f"${field}" for field in SLIDE_KEY_FIELDS}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ])
+    removed = 0
+    for group in duplicates:
+        removed += delete_generated_slides(db, {"_id": {"$in": group["ids"][1:]}})
+    return removed
+
+
+def delete_generated_slides(db, query: Dict[str, Any]) -> int:
+    """Delete per-user generated slides matching query and release their content"""
+    deleted = 0
+    for row in db.generated_slides.find(query, {"content_hash": 1}):
+        if db.generated_slides.delete_one({"_id": row["_id"]}).deleted_count:
+            release_slide_content(db, row.get("content_hash"))
+            deleted += 1
+    return deleted
+
+
+def hydrate_slides(db, slides: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill `content` on rows that only carry a `content_hash` (one query per batch)"""
+    hashes = {s["content_hash"] for s in slides if s.get("content_hash") and "content" not in s}
+    if not hashes:
+        return slides
+
+    contents = {
+        doc["_id"]: doc["content"]
+        for doc in db.slide_contents.find({"_id": {"$in": list(hashes)}}, {"content": 1})
+    }
+
+    for slide in slides:
+        if "content" not in slide and slide.get("content_hash") in contents:
+            slide["content"] = contents[slide["content_hash"]]
+
+    return slides
+
+
+def iter_hydrated_slides(db, slides: Iterable[Dict[str, Any]], batch_size: int = 10) -> Iterator[Dict[str, Any]]:
+    """Hydrate slides from a cursor in small batches so streaming stays incremental"""
+    batch = []
+    for slide in slides:
+        batch.append(slide)
+        if len(batch) >= batch_size:
+            yield from hydrate_slides(db, batch)
+            batch = []
+
+    if batch:
+        yield from hydrate_slides(db, batch)
@@ -0,0 +1,376 @@
+"""
+Disk lifecycle of MANIM_OUTPUT_DIR.
+
+Every render leaves a published video and thumbnail in the render cache, a debug
+copy of its scene, and (CLI renders) a videos/<tmpname>/<quality> tree with
+partial movie files; manim also keeps text/SVG caches. Nothing removed any of it,
+so render hosts filled their disks. A background sweep now:
+
+- purges temporary render trees (videos/, texts/, images/, Tex/, sandbox/) once they are
+  older than STORAGE_TEMP_MAX_AGE_SECONDS, so renders in progress are untouched
+  (videos from before the render cache that slides still reference are kept)
+- keeps only the newest STORAGE_DEBUG_MAX_FILES debug scenes
+- removes media that no generated_slides row or live generation cache entry
+  references and that has not been served for STORAGE_ORPHAN_GRACE_SECONDS
+- evicts least recently served media while the directory is over its quota
+
+"Served" is tracked by the /animations route, which stamps the file's atime on
+each request, so recency survives restarts even on noatime filesystems.
+Referenced media is only evicted for quota when STORAGE_EVICT_REFERENCED is
+set; those slides lose their video_url.
+
+Slides link media through the blob store (blob_store.py). Local blobs are hard
+links to render cache files, so a cache file counts as referenced when its blob
+is, and unreferenced blobs (local or GridFS) are removed after the same grace
+period as other orphans. The quota covers MANIM_OUTPUT_DIR without the blob store.
+"""
+
+import os
+import re
+import time
+import threading
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from blob_store import BlobStore, parse_blob_url, BLOB_URL_PREFIX
+
+MANIM_OUTPUT_DIR = os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")
+STORAGE_QUOTA_MB = float(os.getenv("STORAGE_QUOTA_MB", "5120"))
+# Eviction stops once usage is back under this fraction of the quota
+STORAGE_LOW_WATERMARK = float(os.getenv("STORAGE_LOW_WATERMARK", "0.8"))
+STORAGE_SWEEP_INTERVAL_SECONDS = float(os.getenv("STORAGE_SWEEP_INTERVAL_SECONDS", "600"))
+STORAGE_TEMP_MAX_AGE_SECONDS = float(os.getenv("STORAGE_TEMP_MAX_AGE_SECONDS", "3600"))
+STORAGE_ORPHAN_GRACE_SECONDS = float(os.getenv("STORAGE_ORPHAN_GRACE_SECONDS", "86400"))
+STORAGE_DEBUG_MAX_FILES = int(os.getenv("STORAGE_DEBUG_MAX_FILES", "500"))
+STORAGE_EVICT_REFERENCED = os.getenv("STORAGE_EVICT_REFERENCED", "false").lower() == "true"
+
+# Directories manim writes while rendering (and render sandboxes left by a crash);
+# nothing in them is published
+TEMP_DIRS = ("videos", "texts", "images", "Tex", "sandbox")
+
+
+def _file_id(path: Path) -> Optional[Tuple[int, int]]:
+    """(device, inode) of a file: hard links to the same content share it"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+class StorageManager:
+    """Quota, LRU eviction, orphan and temp-file cleanup for rendered media"""
+
+    def __init__(
+        self,
+        db=None,
+        blob_store: Optional[BlobStore] = None,
+        output_dir: str = MANIM_OUTPUT_DIR,
+        quota_mb: float = STORAGE_QUOTA_MB,
+        interval_seconds: float = STORAGE_SWEEP_INTERVAL_SECONDS
+    ):
+        self.db = db
+        self.blob_store = blob_store
+        self.root = Path(output_dir)
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_sweep: Dict[str, Any] = {}
+        self.counters = {
+            "sweeps": 0,
+            "temp_files_removed": 0,
+            "debug_files_removed": 0,
+            "orphans_removed": 0,
+            "blobs_removed": 0,
+            "evicted_files": 0,
+            "evicted_referenced": 0,
+            "bytes_freed": 0
+        }
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, name="storage-manager", daemon=True)
+            self._thread.start()
+        print(f"✓ Storage manager watching {self.root} (quota {self.quota_bytes / 1024 / 1024:.0f} MB)")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def _loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️ Storage sweep failed: {e}")
+            self._stop_event.wait(self.interval_seconds)
+
+    def _blob_dir(self) -> Optional[Path]:
+        """Directory of a local blob store, whose blobs are swept separately"""
+        root = getattr(self.blob_store, "root", None)
+        return Path(root).resolve() if root is not None else None
+
+    def _url_to_path(self, url: Optional[str]) -> Optional[Path]:
+        if not url or not url.startswith("/animations/"):
+            return None
+        blob = parse_blob_url(url)
+        if blob is not None:
+            blob_dir = self._blob_dir()
+            return blob_dir / blob[0][:2] / blob[0] if blob_dir is not None else None
+        return (self.root / url[len("/animations/"):]).resolve()
+
+    def _referenced_urls(self) -> Optional[Set[str]]:
+        """Media URLs referenced by slides or live cache entries; None without a database"""
+        if self.db is None:
+            return None
+
+        urls = set()
+        for field in ("video_url", "thumbnail_url", "poster_url", "video_renditions.url"):
+            urls.update(self.db.generated_slides.distinct(field))
+            urls.update(self.db.generation_cache.distinct(
+                f"value.{field}", {"expires_at": {"$gt": datetime.now()}}
+            ))
+        # Lower-quality renders stay selectable after a quality upgrade
+        for slide in self.db.generated_slides.find({"video_variants": {"$type": "object"}}, {"video_variants": 1}):
+            urls.update(slide["video_variants"].values())
+        urls.discard(None)
+        return urls
+
+    def _referenced_files(self, urls: Set[str]) -> Set[Tuple[int, int]]:
+        """File ids of referenced media (a blob URL also references the cache file it links to)"""
+        return {file_id for file_id in map(_file_id, filter(None, map(self._url_to_path, urls))) if file_id}
+
+    def _media_units(self, referenced: Set[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """
+        Evictable units: a render cache entry (video, thumbnail, index) or a single
+        media file outside the temp trees. Referenced files inside the temp trees
+        (renders from before the cache) count as media too.
+        """
+        blob_dir = self._blob_dir()
+        grouped = defaultdict(list)
+        for path in self.root.rglob("*"):
+            if not path.is_file():
+                continue
+            if blob_dir is not None and blob_dir in path.resolve().parents:
+                continue
+            relative = path.relative_to(self.root)
+            top = relative.parts[0]
+            if top == "debug" or (top in TEMP_DIRS and _file_id(path) not in referenced):
+                continue
+            if top == "cache":
+                if path.name.startswith("."):
+                    # A publish in progress (temp name before the rename)
+                    continue
+                # cache/ab/{key}.mp4, {key}_thumb.jpg, {key}.json and the
+                # entry's variants ({key}_360p.mp4, {key}_poster.jpg, ...)
+                key = path.name[:64]
+                grouped[("cache", key)].append(path)
+            else:
+                grouped[("file", str(relative))].append(path)
+
+        units = []
+        for (kind, name), paths in grouped.items():
+            stats = [p.stat() for p in paths]
+            units.append({
+                "kind": kind,
+                "name": name,
+                "paths": paths,
+                "bytes": sum(st.st_size for st in stats),
+                # Last served, or last written for files that were never served
+                "last_access": max(max(st.st_atime, st.st_mtime) for st in stats),
+                "referenced": any(_file_id(p) in referenced for p in paths)
+            })
+        return units
+
+    def _remove(self, paths: List[Path]) -> int:
+        freed = 0
+        for path in paths:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                freed += size
+            except OSError:
+                pass
+        return freed
+
+    def _forget_cache_entry(self, key: str) -> None:
+        if self.db is not None:
+            try:
+                self.db.render_cache.delete_one({"_id": key})
+            except Exception as e:
+                print(f"Failed to drop render cache index for {key}: {e}")
+
+    def _detach_from_slides(self, unit: Dict[str, Any]) -> None:
+        """Evicted referenced media: clear the URLs that point at it (directly or through its blob)"""
+        blob_dir = self._blob_dir()
+        for path in unit["paths"]:
+            targets = [f"/animations/{path.relative_to(self.root).as_posix()}"]
+            if blob_dir is not None:
+                # Blobs hard-linked to this file (the blob URL carries the file's extension)
+                target_id = _file_id(path)
+                targets += [
+                    {"$regex": f"^{re.escape(BLOB_URL_PREFIX)}{blob.name}"}
+                    for blob in blob_dir.glob("*/*") if _file_id(blob) == target_id
+                ]
+            for url in targets:
+                for field in ("video_url", "thumbnail_url"):
+                    self.db.generated_slides.update_many(
+                        {field: url},
+                        {"$set": {field: None, "media_evicted_at": datetime.now()}}
+                    )
+                    self.db.generation_cache.delete_many({f"value.{field}": url})
+
+    def _purge_temp_trees(self, now: float, referenced: Set[Tuple[int, int]]) -> int:
+        removed = 0
+        for name in TEMP_DIRS:
+            top = self.root / name
+            if not top.is_dir():
+                continue
+            for path in top.rglob("*"):
+                if (
+                    path.is_file()
+                    and now - path.stat().st_mtime > STORAGE_TEMP_MAX_AGE_SECONDS
+                    and _file_id(path) not in referenced
+                ):
+                    removed += 1
+                    self.counters["bytes_freed"] += self._remove([path])
+            # Drop directories the purge emptied, deepest first
+            for directory in sorted((p for p in top.rglob("*") if p.is_dir()), key=lambda p: len(p.parts), reverse=True):
+                try:
+                    directory.rmdir()
+                except OSError:
+                    pass
+        return removed
+
+    def _sweep_blobs(self, now: float, urls: Set[str]) -> int:
+        """Remove blobs no slide or live cache entry links to, once idle for the orphan grace period"""
+        referenced = {blob[0] for blob in map(parse_blob_url, urls) if blob is not None}
+        removed = 0
+        for blob in list(self.blob_store.iter_blobs()):
+            if blob["digest"] in referenced or now - blob["last_access"].timestamp() <= STORAGE_ORPHAN_GRACE_SECONDS:
+                continue
+            self.blob_store.delete(blob["digest"])
+            removed += 1
+            self.counters["bytes_freed"] += blob["bytes"]
+        return removed
+
+    def _trim_debug_scenes(self) -> int:
+        debug_dir = self.root / "debug"
+        if not debug_dir.is_dir():
+            return 0
+        scenes = sorted(debug_dir.glob("*.py"), key=lambda p: p.stat().st_mtime, reverse=True)
+        extra = scenes[STORAGE_DEBUG_MAX_FILES:]
+        self.counters["bytes_freed"] += self._remove(extra)
+        return len(extra)
+
+    def sweep(self) -> Dict[str, Any]:
+        """One pass of temp purge, debug trim, orphan cleanup and quota eviction"""
+        started = time.monotonic()
+        now = time.time()
+        if not self.root.is_dir():
+            return {}
+
+        urls = self._referenced_urls()
+        referenced = self._referenced_files(urls) if urls is not None else None
+        temp_removed = self._purge_temp_trees(now, referenced or set())
+        debug_removed = self._trim_debug_scenes()
+        units = self._media_units(referenced or set())
+
+        orphans_removed = 0
+        # Without a database nothing is known to be referenced, so nothing counts as an orphan
+        if referenced is not None:
+            for unit in [u for u in units if not u["referenced"] and now - u["last_access"] > STORAGE_ORPHAN_GRACE_SECONDS]:
+                self.counters["bytes_freed"] += self._remove(unit["paths"])
+                if unit["kind"] == "cache":
+                    self._forget_cache_entry(unit["name"])
+                units.remove(unit)
+                orphans_removed += len(unit["paths"])
+
+        total = sum(u["bytes"] for u in units)
+        evicted = 0
+        if total > self.quota_bytes:
+            target = self.quota_bytes * STORAGE_LOW_WATERMARK
+            # Unreferenced media goes first, then (if allowed) referenced, least recently served first
+            candidates = sorted(units, key=lambda u: (u["referenced"], u["last_access"]))
+            for unit in candidates:
+                if total <= target:
+                    break
+                if unit["referenced"] and not STORAGE_EVICT_REFERENCED:
+                    break
+                if unit["referenced"]:
+                    self._detach_from_slides(unit)
+                    self.counters["evicted_referenced"] += 1
+                total -= unit["bytes"]
+                self.counters["bytes_freed"] += self._remove(unit["paths"])
+                if unit["kind"] == "cache":
+                    self._forget_cache_entry(unit["name"])
+                evicted += len(unit["paths"])
+            if total > self.quota_bytes:
+                print(f"⚠️ {self.root} still over quota after eviction: {total / 1024 / 1024:.0f} MB of referenced media")
+
+        # After eviction, so blobs of evicted cache entries go in the same sweep once idle
+        blobs_removed = 0
+        if urls is not None and self.blob_store is not None:
+            blobs_removed = self._sweep_blobs(now, urls)
+
+        with self._lock:
+            self.counters["sweeps"] += 1
+            self.counters["temp_files_removed"] += temp_removed
+            self.counters["debug_files_removed"] += debug_removed
+            self.counters["orphans_removed"] += orphans_removed
+            self.counters["blobs_removed"] += blobs_removed
+            self.counters["evicted_files"] += evicted
+            self.last_sweep = {
+                "finished_at": datetime.now().isoformat(),
+                "duration_seconds": round(time.monotonic() - started, 3),
+                "media_bytes": total,
+                "media_units": len(units),
+                "temp_files_removed": temp_removed,
+                "debug_files_removed": debug_removed,
+                "orphans_removed": orphans_removed,
+                "blobs_removed": blobs_removed,
+                "evicted_files": evicted,
+                "orphan_cleanup": referenced is not None
+            }
+
+        if temp_removed or orphans_removed or evicted or blobs_removed:
+            print(f"✓ Storage sweep: {temp_removed} temp files, {orphans_removed} orphans, {blobs_removed} blobs, {evicted} evicted "
+                  f"({total / 1024 / 1024:.0f} MB in use)")
+        return self.last_sweep
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            media_bytes = self.last_sweep.get("media_bytes")
+            return {
+                "output_dir": str(self.root),
+                "blob_store": self.blob_store.name if self.blob_store is not None else None,
+                "quota_bytes": self.quota_bytes,
+                "usage_ratio": round(media_bytes / self.quota_bytes, 3) if media_bytes is not None else None,
+                "evict_referenced": STORAGE_EVICT_REFERENCED,
+                **self.counters,
+                "last_sweep": dict(self.last_sweep)
+            }
+
+
+# Singleton instance
+_storage_manager: Optional[StorageManager] = None
+
+
+def get_storage_manager(db=None, blob_store: Optional[BlobStore] = None) -> StorageManager:
+    """Get or create the storage manager singleton"""
+    global _storage_manager
+
+    if _storage_manager is None:
+        _storage_manager = StorageManager(db, blob_store)
+
+    return _storage_manager
@@ -0,0 +1,132 @@
+"""
+Regeneration of pre-generated slides after a learning identity update.
+
+Generated content only depends on the style bucket of visual_text_score, not on
+the raw score (see gemini_generator.STYLE_BUCKETS). Every generated slide records
+the bucket it was made for; when an identity update moves the score into another
+bucket, the user's slides that are stale and not yet viewed are regenerated
+through the background job queue. A newer update supersedes the queued jobs of an
+earlier one, and generation jobs re-read the current score, so a job that
+finishes late never stores slides for an old bucket. Updates that stay inside
+the bucket cost nothing.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, Any, Optional
+
+from gemini_generator import get_style_bucket
+
+
+class StyleBucketChanged(RuntimeError):
+    """The user's style bucket changed while a slide for the old bucket was being generated"""
+
+
+def current_visual_text_score(db, user_id: str, default: float) -> float:
+    """The user's visual_text_score as stored now (default if they have no identity yet)"""
+    user = db.users.find_one({"user_id": user_id}, {"learning_identity.visual_text_score": 1})
+    if not user or "learning_identity" not in user:
+        return default
+    return user["learning_identity"].get("visual_text_score", default)
+
+
+class StyleRegenerator:
+    """Invalidates and regenerates upcoming slides when the style bucket changes"""
+
+    def __init__(self, db, job_queue):
+        self.db = db
+        self.job_queue = job_queue
+        self._lock = threading.Lock()
+        self.counters = {
+            "identity_updates": 0,
+            "bucket_changes": 0,
+            "slides_invalidated": 0,
+            "jobs_enqueued": 0,
+            "jobs_superseded": 0
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def on_identity_update(
+        self,
+        user_id: str,
+        old_identity: Optional[Dict[str, Any]],
+        new_identity: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Compare style buckets before and after an identity update and, if the bucket
+        changed, queue regeneration of the user's unviewed slides made for another bucket.
+
+        Returns:
+            Dict with style_bucket, style_bucket_changed, slides_invalidated and job_ids
+        """
+        self._count("identity_updates")
+        new_score = new_identity.get("visual_text_score", 0.5)
+        new_bucket = get_style_bucket(new_score)
+        report = {
+            "style_bucket": new_bucket,
+            "style_bucket_changed": False,
+            "slides_invalidated": 0,
+            "job_ids": []
+        }
+
+        if old_identity is not None:
+            old_bucket = get_style_bucket(old_identity.get("visual_text_score", 0.5))
+            if old_bucket == new_bucket:
+                return report
+        report["style_bucket_changed"] = True
+        self._count("bucket_changes")
+
+        # Slides the learner has already opened keep the content they saw
+        viewed = set(self.db.events.distinct(
+            "event_data.to_slide",
+            {"user_id": user_id, "event_type": "slide_change"}
+        ))
+
+        stale_by_chapter = defaultdict(list)
+        for slide in self.db.generated_slides.find(
+            {"user_id": user_id},
+            {"slide_id": 1, "course_id": 1, "chapter_id": 1, "title": 1, "style_bucket": 1, "visual_text_score": 1}
+        ):
+            # Slides generated before buckets were recorded fall back to their score
+            bucket = slide.get("style_bucket") or get_style_bucket(slide.get("visual_text_score", 0.5))
+            if bucket != new_bucket and slide["slide_id"] not in viewed:
+                stale_by_chapter[(slide["course_id"], slide["chapter_id"])].append(slide)
+
+        for (course_id, chapter_id), slides in stale_by_chapter.items():
+            # Stale slides stay readable until their regenerated copy replaces them; a job
+            # queued for an earlier bucket change of this chapter is replaced by this one
+            superseded = self.job_queue.supersede("pregenerate_chapter", {
+                "user_id": user_id,
+                "course_id": course_id,
+                "chapter_id": chapter_id,
+                "reason": "style_bucket_change"
+            })
+            self._count("jobs_superseded", superseded)
+
+            job_id = self.job_queue.enqueue(
+                "pregenerate_chapter",
+                slides,
+                payload={
+                    "user_id": user_id,
+                    "course_id": course_id,
+                    "chapter_id": chapter_id,
+                    "visual_text_score": new_score,
+                    "reason": "style_bucket_change"
+                }
+            )
+            report["job_ids"].append(job_id)
+            report["slides_invalidated"] += len(slides)
+
+        self._count("slides_invalidated", report["slides_invalidated"])
+        self._count("jobs_enqueued", len(report["job_ids"]))
+        if report["slides_invalidated"]:
+            print(f"Style bucket for {user_id} is now '{new_bucket}': regenerating {report['slides_invalidated']} upcoming slides")
+
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters)
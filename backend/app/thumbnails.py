@@ -0,0 +1,175 @@
+"""
+In-process thumbnail extraction for rendered animations.
+
+Thumbnails used to come from an `ffmpeg` subprocess per render, which grabbed the
+first frame, and the first frame of a Manim scene is usually still blank. OpenCV
+(already a dependency for the attention tracker) decodes the video in-process
+instead: a few candidate positions are sampled, the frame with the most visible
+content wins, and it is resized and JPEG-encoded without leaving the process.
+
+extract_thumbnails handles batches on a thread pool (OpenCV releases the GIL
+while decoding); backfill_thumbnails uses it to add thumbnails to videos that
+were published without one.
+
+Usage (backfill):
+    cd backend/app
+    python thumbnails.py [output_dir]
+"""
+
+import os
+import re
+import sys
+import json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from render_cache import _atomic_write_text
+
+# Fractions of the video length tried as thumbnail frames
+THUMBNAIL_SAMPLE_POSITIONS = [
+    float(p) for p in os.getenv("THUMBNAIL_SAMPLE_POSITIONS", "0.35,0.5,0.65,0.8").split(",")
+]
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "480"))
+THUMBNAIL_JPEG_QUALITY = int(os.getenv("THUMBNAIL_JPEG_QUALITY", "80"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "4"))
+
+# Pixels darker than this count as background (Manim scenes are drawn on black)
+BACKGROUND_LEVEL = 16
+
+# Renditions of a render cache entry ({key}_360p.mp4) share its thumbnail
+CACHE_VARIANT_NAME = re.compile(r"[0-9a-f]{64}_\w+")
+
+
+def thumbnail_path_for(video_path: Path) -> Path:
+    """Thumbnail next to its video: {stem}_thumb.jpg"""
+    return video_path.parent / f"{video_path.stem}_thumb.jpg"
+
+
+def _content_score(frame: np.ndarray) -> float:
+    """How much of the frame is drawn on: share of non-background pixels"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return float(np.count_nonzero(gray > BACKGROUND_LEVEL)) / gray.size
+
+
+def representative_frame(video_path: Path) -> Optional[np.ndarray]:
+    """The sampled frame with the most content, or None if the video cannot be read"""
+    capture = cv2.VideoCapture(str(video_path))
+    try:
+        if not capture.isOpened():
+            return None
+
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        positions = [int(frame_count * p) for p in THUMBNAIL_SAMPLE_POSITIONS] if frame_count > 1 else [0]
+
+        best, best_score = None, -1.0
+        for position in positions:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, min(position, max(frame_count - 1, 0)))
+            ok, frame = capture.read()
+            if not ok:
+                continue
+            score = _content_score(frame)
+            if score > best_score:
+                best, best_score = frame, score
+
+        if best is None:
+            # Some containers do not report a frame count or support seeking
+            capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = capture.read()
+            best = frame if ok else None
+        return best
+    finally:
+        capture.release()
+
+
+def generate_thumbnail(
+    video_path: Path,
+    thumbnail_path: Optional[Path] = None,
+    width: Optional[int] = THUMBNAIL_WIDTH
+) -> Optional[str]:
+    """
+    Write a JPEG thumbnail for a video; returns its path, or None on failure.
+    width=None keeps the video's resolution (poster frames).
+    """
+    video_path = Path(video_path)
+    thumbnail_path = Path(thumbnail_path) if thumbnail_path else thumbnail_path_for(video_path)
+    try:
+        frame = representative_frame(video_path)
+        if frame is None:
+            print(f"Failed to generate thumbnail: cannot read frames from {video_path}")
+            return None
+
+        height, frame_width = frame.shape[:2]
+        if width is not None and frame_width > width:
+            frame = cv2.resize(frame, (width, round(height * width / frame_width)), interpolation=cv2.INTER_AREA)
+
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+        if not ok:
+            print(f"Failed to generate thumbnail: JPEG encoding failed for {video_path}")
+            return None
+        thumbnail_path.write_bytes(encoded.tobytes())
+        return str(thumbnail_path)
+
+    except Exception as e:
+        print(f"Failed to generate thumbnail: {e}")
+        return None
+
+
+def extract_thumbnails(video_paths: List[Path], workers: int = THUMBNAIL_WORKERS) -> Dict[str, Optional[str]]:
+    """Thumbnails for many videos at once: {video_path: thumbnail_path or None}"""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        thumbnails = pool.map(generate_thumbnail, video_paths)
+        return {str(video): thumbnail for video, thumbnail in zip(video_paths, thumbnails)}
+
+
+def backfill_thumbnails(output_dir: str, db=None) -> Dict[str, int]:
+    """
+    Add thumbnails to videos under output_dir that have none, and point render
+    cache entries and slides without a thumbnail at the new file.
+
+    Returns:
+        Dict with videos (missing a thumbnail), created and failed counts
+    """
+    root = Path(output_dir)
+    missing = [
+        video for video in root.rglob("*.mp4")
+        if "partial_movie_files" not in video.parts
+        and not CACHE_VARIANT_NAME.fullmatch(video.stem)
+        and not thumbnail_path_for(video).exists()
+    ]
+    results = extract_thumbnails(missing)
+
+    created = 0
+    for video, thumbnail in results.items():
+        if thumbnail is None:
+            continue
+        created += 1
+        video = Path(video)
+
+        # Render cache entry: cache/ab/{key}.mp4 with its index at {key}.json
+        index_path = video.with_suffix(".json")
+        if index_path.exists():
+            entry = json.loads(index_path.read_text(encoding="utf-8"))
+            entry["thumbnail_path"] = thumbnail
+            _atomic_write_text(index_path, json.dumps(entry))
+            if db is not None:
+                db.render_cache.update_one({"_id": video.stem}, {"$set": {"thumbnail_path": thumbnail}})
+
+        if db is not None:
+            db.generated_slides.update_many(
+                {"video_url": f"/animations/{video.relative_to(root).as_posix()}", "thumbnail_url": None},
+                {"$set": {"thumbnail_url": f"/animations/{Path(thumbnail).relative_to(root).as_posix()}"}}
+            )
+
+    return {"videos": len(missing), "created": created, "failed": len(missing) - created}
+
+
+if __name__ == "__main__":
+    from database import get_database
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.getenv("MANIM_OUTPUT_DIR", "./generated_animations")
+    report = backfill_thumbnails(directory, get_database())
+    print(f"✓ Thumbnails: {report['created']} created, {report['failed']} failed ({report['videos']} videos without one)")
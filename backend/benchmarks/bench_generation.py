@@ -0,0 +1,103 @@
+"""
+Offline throughput benchmark for slide generation against the fake LLM backend.
+
+Measures, for one chapter of slide topics:
+- sequential generation (the old complete_chapter loop)
+- concurrent pre-generation (pregeneration.pregenerate_slides)
+- batched pre-generation (one model call for the whole chapter)
+- a second cohort member hitting the generation cache
+
+Set FAKE_LLM_FAILURE_RATE to see the cost of retries with backoff.
+
+Usage:
+    cd backend
+    python benchmarks/bench_generation.py
+    FAKE_LLM_LATENCY=lognormal:0,0.5 FAKE_LLM_FAILURE_RATE=0.2 python benchmarks/bench_generation.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# Must be set before the app modules read their configuration
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "uniform:0.3,0.9")
+os.environ.setdefault("FAKE_LLM_SEED", "42")
+os.environ.setdefault("PREGEN_BACKOFF_BASE_SECONDS", "0.1")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "app"))
+sys.path.insert(0, str(BACKEND_DIR))
+
+from gemini_generator import SlideGenerator  # noqa: E402
+from generation_cache import GenerationCache, InMemoryLRUBackend  # noqa: E402
+from pregeneration import pregenerate_slides  # noqa: E402
+from app.seed_slides import SLIDE_TOPICS  # noqa: E402
+
+
+def chapter_topics(chapter_index: int = 1):
+    chapter = SLIDE_TOPICS[chapter_index]
+    return [
+        {**slide, "slide_id": f"{chapter['chapter_id']}_{slide['slide_id']}"}
+        for slide in chapter["slides"]
+    ]
+
+
+def timed(label: str, fn, slides: int):
+    started = time.perf_counter()
+    outcome = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed:7.2f}s  {slides / elapsed:6.2f} slides/s")
+    return outcome
+
+
+def main():
+    topics = chapter_topics()
+    generator = SlideGenerator()
+    print(f"Backend: {generator.backend.name}  latency: {os.environ['FAKE_LLM_LATENCY']}  "
+          f"failure rate: {os.getenv('FAKE_LLM_FAILURE_RATE', '0')}")
+    print(f"Chapter size: {len(topics)} slides\n")
+
+    def generate(cache, score):
+        def generate_fn(slide_topic, attempt, cancelled=None):
+            return cache.get_or_generate(
+                generator,
+                topic=slide_topic["title"],
+                learning_objectives=slide_topic["learning_objectives"],
+                visual_text_score=score,
+                context=slide_topic["context"]
+            )
+        return generate_fn
+
+    # 1. Sequential, no cache (baseline behaviour)
+    def sequential():
+        cache = GenerationCache([InMemoryLRUBackend()])
+        fn = generate(cache, 0.5)
+        for topic in topics:
+            try:
+                fn(topic, 1)
+            except Exception:
+                pass
+    timed("sequential, cold", sequential, len(topics))
+
+    # 2. Concurrent pre-generation, cold cache
+    cache = GenerationCache([InMemoryLRUBackend()])
+    timed("concurrent pre-generation, cold", lambda: asyncio.run(pregenerate_slides(topics, generate(cache, 0.5))), len(topics))
+
+    # 3. Whole chapter in one batched call
+    batch_cache = GenerationCache([InMemoryLRUBackend()])
+    calls_before = generator.backend.calls
+    timed("batched pre-generation, cold", lambda: batch_cache.get_or_generate_batch(generator, topics, 0.5), len(topics))
+    print(f"{'':<40} {generator.backend.calls - calls_before} model call(s)")
+
+    # 4. Another student in the same style bucket
+    timed("concurrent pre-generation, warm cache", lambda: asyncio.run(pregenerate_slides(topics, generate(cache, 0.55))), len(topics))
+
+    print(f"\nCache: {cache.stats(generator)}")
+    print(f"Model calls: {generator.backend.calls}")
+
+
+if __name__ == "__main__":
+    main()
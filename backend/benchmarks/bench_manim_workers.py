@@ -0,0 +1,97 @@
+"""
+Cold CLI renders vs. warm manim worker renders.
+
+Renders every sample scene in app/generated_animations/debug twice: once with a
+fresh `manim` CLI process per scene (interpreter start + manim import each time)
+and once on a single WarmManimWorker, which pays the import once at start-up.
+Scenes that fail to render are reported and excluded from the averages.
+
+Needs manim (and its system dependencies) installed.
+
+Usage:
+    cd backend
+    python benchmarks/bench_manim_workers.py
+    RENDER_QUALITY=m python benchmarks/bench_manim_workers.py
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import importlib.util
+from pathlib import Path
+from statistics import mean
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "app"))
+
+from manim_worker import WarmManimWorker  # noqa: E402
+
+SCENES_DIR = BACKEND_DIR / "app" / "generated_animations" / "debug"
+QUALITY = os.getenv("RENDER_QUALITY", "l")
+
+
+def render_cold(scene: Path, media_dir: str) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        ["manim", f"-q{QUALITY}", "--disable_caching", f"--media_dir={media_dir}",
+         f"--output_file={scene.stem}", str(scene), "GeneratedScene"],
+        capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - started
+
+
+def main():
+    if importlib.util.find_spec("manim") is None or shutil.which("manim") is None:
+        print("manim is not installed; install it to run this benchmark")
+        sys.exit(1)
+
+    scenes = sorted(SCENES_DIR.glob("*.py"))
+    print(f"{len(scenes)} sample scenes from {SCENES_DIR}, quality -q{QUALITY}\n")
+
+    media_dir = tempfile.mkdtemp(prefix="bench_manim_")
+    try:
+        cold, warm, failed = {}, {}, []
+        for scene in scenes:
+            try:
+                cold[scene.name] = render_cold(scene, media_dir)
+            except subprocess.CalledProcessError:
+                failed.append(scene.name)
+
+        worker = WarmManimWorker(media_dir)
+        started = time.perf_counter()
+        worker.start()
+        startup = time.perf_counter() - started
+        for index, scene in enumerate(scenes):
+            if scene.name in failed:
+                continue
+            started = time.perf_counter()
+            try:
+                worker.render(str(index), scene.read_text(encoding="utf-8"), f"warm_{scene.stem}", QUALITY, "mp4", 300)
+            except RuntimeError:
+                failed.append(scene.name)
+                cold.pop(scene.name, None)
+                continue
+            warm[scene.name] = time.perf_counter() - started
+        worker.stop()
+    finally:
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+    print(f"{'scene':<36} {'cold (s)':>9} {'warm (s)':>9}")
+    for name in warm:
+        print(f"{name:<36} {cold[name]:>9.2f} {warm[name]:>9.2f}")
+    if failed:
+        print(f"\nFailed to render: {', '.join(sorted(set(failed)))}")
+    if not warm:
+        return
+
+    cold_avg, warm_avg = mean(cold[n] for n in warm), mean(warm.values())
+    print(f"\nWarm worker start-up (one-off manim import): {startup:.2f}s")
+    print(f"Average per scene: cold {cold_avg:.2f}s, warm {warm_avg:.2f}s "
+          f"({1 - warm_avg / cold_avg:.0%} faster)")
+
+
+if __name__ == "__main__":
+    main()
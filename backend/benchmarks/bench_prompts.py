@@ -0,0 +1,106 @@
+"""
+Prompt size and latency per prompt version, against the fake LLM backend.
+
+Generates one chapter slide by slide, passing each slide's output as the next
+slide's previous content (as the frontend does), once per prompt version.
+Reports average prompt tokens per template and the wall time per version.
+
+The fake model charges FAKE_LLM_PROMPT_SECONDS_PER_1K_TOKENS on top of its base
+latency, so smaller prompts also show up as lower latency.
+
+Usage:
+    cd backend
+    python benchmarks/bench_prompts.py
+    FAKE_LLM_PROMPT_SECONDS_PER_1K_TOKENS=0.5 python benchmarks/bench_prompts.py
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from statistics import mean
+
+# Must be set before the app modules read their configuration
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "fixed:0.2")
+os.environ.setdefault("FAKE_LLM_PROMPT_SECONDS_PER_1K_TOKENS", "0.2")
+os.environ.setdefault("FAKE_LLM_SEED", "42")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "app"))
+sys.path.insert(0, str(BACKEND_DIR))
+
+from gemini_generator import SlideGenerator, PROMPT_VERSIONS  # noqa: E402
+from prompt_assembly import estimate_tokens  # noqa: E402
+from app.seed_slides import SLIDE_TOPICS  # noqa: E402
+
+# A realistic previous slide: model output is usually much longer than the fake model's
+SAMPLE_PREVIOUS_SLIDE = """<div class="slide-content">
+  <h2 class="text-white font-bold text-xl mb-2">Limits and Continuity</h2>
+  <p class="text-zinc-200">A <span class="text-yellow-300 font-semibold">limit</span> describes the value a function
+  approaches as its input approaches a point, whether or not the function is defined there.</p>
+  <div class="bg-white/5 p-4 rounded-lg border border-white/10 my-4">
+    <p class="text-zinc-100">[GRAPH: f(x) approaching L as x approaches a from both sides, with an open circle at x = a]</p>
+  </div>
+  <ul class="list-disc list-inside space-y-2 text-zinc-200">
+    <li><span class="text-cyan-300">One-sided limits</span> look at x approaching a from the left or the right only.</li>
+    <li>The two-sided limit exists only when both one-sided limits exist and are equal.</li>
+    <li>A function is <span class="text-yellow-300 font-semibold">continuous</span> at a when the limit equals f(a).</li>
+  </ul>
+  <h3 class="text-blue-300 font-bold">Worked Example</h3>
+  <p class="text-zinc-200">For f(x) = (x² - 1)/(x - 1), f(1) is undefined, but factoring gives x + 1, so the limit as x → 1 is 2.</p>
+</div>"""
+
+
+def run_version(prompt_version: str, slides):
+    generator = SlideGenerator(prompt_version=prompt_version)
+    prompt_tokens = {"html": [], "manim": []}
+    previous = SAMPLE_PREVIOUS_SLIDE
+
+    started = time.perf_counter()
+    for slide in slides:
+        result = generator.generate_slide_content(
+            topic=slide["title"],
+            learning_objectives=slide["learning_objectives"],
+            visual_text_score=0.5,
+            context=slide["context"],
+            previous_content=previous
+        )
+        prompt_tokens["html"].append(result["metadata"]["prompt_tokens_estimate"])
+        previous = result["content"]
+    elapsed = time.perf_counter() - started
+
+    # Manim prompts are only built here (rendering needs manim installed)
+    for slide in slides:
+        prompt = generator._build_manim_prompt(
+            slide["title"], slide["learning_objectives"], 0.8, slide["context"], SAMPLE_PREVIOUS_SLIDE
+        )
+        prompt_tokens["manim"].append(estimate_tokens(prompt))
+
+    return {
+        "html_tokens": mean(prompt_tokens["html"]),
+        "manim_tokens": mean(prompt_tokens["manim"]),
+        "seconds": elapsed,
+        "seconds_per_slide": elapsed / len(slides)
+    }
+
+
+def main():
+    chapter = SLIDE_TOPICS[1]
+    slides = chapter["slides"]
+    print(f"Chapter: {chapter['chapter_title']} ({len(slides)} slides)  "
+          f"latency: {os.environ['FAKE_LLM_LATENCY']} + {os.environ['FAKE_LLM_PROMPT_SECONDS_PER_1K_TOKENS']}s/1k prompt tokens\n")
+
+    reports = {version: run_version(version, slides) for version in PROMPT_VERSIONS}
+    baseline = reports[PROMPT_VERSIONS[0]]
+
+    print(f"{'version':<8} {'html tokens':>12} {'manim tokens':>13} {'s/slide':>9} {'html saved':>11} {'manim saved':>12}")
+    for version, report in reports.items():
+        html_saved = 1 - report["html_tokens"] / baseline["html_tokens"]
+        manim_saved = 1 - report["manim_tokens"] / baseline["manim_tokens"]
+        print(f"{version:<8} {report['html_tokens']:>12.0f} {report['manim_tokens']:>13.0f} "
+              f"{report['seconds_per_slide']:>9.3f} {html_saved:>10.0%} {manim_saved:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Test setup: the app modules live in backend/app and are imported by name, and
+slide generation runs against the deterministic fake model (see fake_llm.py).
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Must be set before the app modules read their configuration
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "fixed:0")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "app"))
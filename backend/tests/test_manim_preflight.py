@@ -0,0 +1,130 @@
+"""Static pre-flight check of generated Manim scenes (manim_preflight.check_scene)"""
+
+from pathlib import Path
+
+import pytest
+
+from manim_preflight import check_scene
+
+# Scenes the generator produced and the render service saved for inspection
+DEBUG_CORPUS = Path(__file__).resolve().parent.parent / "app" / "generated_animations" / "debug"
+
+HEADER = "from manim import *\n\nclass GeneratedScene(Scene):\n    def construct(self):\n"
+
+
+def scene(*lines: str) -> str:
+    return HEADER + "".join(f"        {line}\n" for line in lines)
+
+
+def errors_of(manim_code: str, **kwargs) -> str:
+    report = check_scene(manim_code, **kwargs)
+    assert not report["ok"]
+    return "\n".join(report["errors"])
+
+
+@pytest.mark.parametrize("path", sorted(DEBUG_CORPUS.glob("*.py")), ids=lambda path: path.name)
+def test_debug_corpus_passes(path):
+    report = check_scene(path.read_text(encoding="utf-8"))
+    assert report["ok"], report["errors"]
+    assert report["play_calls"] > 0
+    assert report["estimated_seconds"] > 0
+
+
+def test_debug_corpus_is_not_empty():
+    assert list(DEBUG_CORPUS.glob("*.py"))
+
+
+def test_estimates_loops_and_run_time():
+    report = check_scene(scene(
+        "dot = Dot()",
+        "self.play(Create(dot), run_time=2)",
+        "for i in range(4):",
+        "    self.play(dot.animate.shift(RIGHT))",
+        "self.wait(0.5)"
+    ))
+    assert report["ok"], report["errors"]
+    assert report["play_calls"] == 5
+    assert report["wait_calls"] == 1
+    assert report["estimated_seconds"] == 6.5
+
+
+def test_variable_assigned_later_in_a_loop_is_allowed():
+    report = check_scene(scene(
+        "for i in range(3):",
+        "    square = Square().shift(RIGHT * i)",
+        "    if i > 0:",
+        "        self.play(Transform(prev, square))",
+        "    prev = square",
+        "    self.play(Create(square))"
+    ))
+    assert report["ok"], report["errors"]
+
+
+def test_use_before_assignment_outside_a_loop():
+    errors = errors_of(scene(
+        "self.play(Create(circle))",
+        "circle = Circle()"
+    ))
+    assert "'circle' is used on line" in errors
+
+
+@pytest.mark.parametrize("name, reason", [
+    ("Tex", "needs LaTeX"),
+    ("MathTex", "needs LaTeX"),
+    ("Axes", "plotting is not allowed"),
+])
+def test_forbidden_names(name, reason):
+    errors = errors_of(scene(f"label = {name}('x')", "self.play(Create(label))"))
+    assert f"{name} on line" in errors
+    assert reason in errors
+
+
+def test_forbidden_updaters():
+    errors = errors_of(scene(
+        "dot = Dot()",
+        "dot.add_updater(lambda mob: mob.shift(UP))",
+        "self.play(Create(dot))"
+    ))
+    assert ".add_updater" in errors
+
+
+def test_undefined_name():
+    errors = errors_of(scene("self.play(Create(undefined_shape))"))
+    assert "'undefined_shape' is not defined" in errors
+
+
+def test_missing_construct():
+    errors = errors_of(
+        "from manim import *\n\nclass GeneratedScene(Scene):\n    def setup(self):\n        self.play(Create(Dot()))\n"
+    )
+    assert "No GeneratedScene class with a construct(self) method" in errors
+
+
+def test_scene_without_play():
+    errors = errors_of(scene("self.wait(1)"))
+    assert "never calls self.play()" in errors
+
+
+def test_syntax_error():
+    errors = errors_of(scene("self.play(Create(Dot())"))
+    assert "Syntax error" in errors
+
+
+def test_over_the_length_budget():
+    errors = errors_of(scene("self.play(Create(Dot()))", "self.wait(90)"), max_seconds=60)
+    assert "over the 60s budget" in errors
+
+
+def test_over_the_play_call_limit():
+    errors = errors_of(scene(
+        "for i in range(50):",
+        "    self.play(Create(Dot()))"
+    ), max_play_calls=40)
+    assert "50 self.play() calls" in errors
+
+
+def test_render_estimate_scales_with_quality():
+    code = scene("self.play(Create(Dot()), run_time=20)")
+    assert check_scene(code, quality="l", max_render_seconds=60)["ok"]
+    errors = errors_of(code, quality="h", max_render_seconds=60)
+    assert "exceeds the 60s render timeout" in errors
@@ -0,0 +1,143 @@
+"""POST /api/slides/generate-for-user/stream against the fake streaming model"""
+
+import json
+import asyncio
+from contextlib import contextmanager
+
+import httpx
+import pytest
+
+import main
+from admission import AdmissionRejected
+from fake_llm import FakeBackend
+from gemini_generator import SlideGenerator, get_style_bucket
+from generation_cache import GenerationCache, InMemoryLRUBackend
+
+STREAM_URL = "/api/slides/generate-for-user/stream"
+VISUAL_TEXT_SCORE = 0.2
+SLIDE = {
+    "topic": "Newton's Second Law",
+    "learning_objectives": "Relate force, mass and acceleration. Solve for any one of them.",
+    "user_id": "student-1",
+    "context": "chapter_2: Dynamics"
+}
+
+
+class FakeCollection:
+    def __init__(self, documents=None):
+        self.documents = list(documents or [])
+
+    def find_one(self, query):
+        for document in self.documents:
+            if all(document.get(field) == value for field, value in query.items()):
+                return document
+        return None
+
+    def insert_one(self, document):
+        self.documents.append(document)
+
+
+class FakeDatabase:
+    """The collections the streaming endpoint reads and writes"""
+
+    def __init__(self):
+        self.users = FakeCollection([
+            {"user_id": SLIDE["user_id"], "learning_identity": {"visual_text_score": VISUAL_TEXT_SCORE}}
+        ])
+        self.slide_generations = FakeCollection()
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    generator = SlideGenerator()
+    # Slow enough for concurrent requests to overlap, split into several chunks
+    generator.backend = FakeBackend(latency="fixed:0.3", seed=0)
+    monkeypatch.setattr(main, "db", FakeDatabase())
+    monkeypatch.setattr(main, "generation_cache", GenerationCache([InMemoryLRUBackend()]))
+    monkeypatch.setattr(main, "get_slide_generator", lambda: generator)
+    return generator
+
+
+def parse_events(body: str):
+    events = []
+    for block in filter(None, body.split("\n\n")):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def post_streams(count: int):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.post(STREAM_URL, json=SLIDE) for _ in range(count)))
+    for response in responses:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+    return [parse_events(response.text) for response in responses]
+
+
+def test_miss_streams_chunks_then_annotated_result(generator):
+    (events,) = asyncio.run(post_streams(1))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "done"
+    assert kinds.count("chunk") > 1
+    result = events[-1][1]
+    assert "".join(data["html"] for kind, data in events if kind == "chunk") == result["content"]
+
+    metadata = result["metadata"]
+    assert metadata["cache_hit"] is False
+    assert metadata["coalesced"] is False
+    assert metadata["style_bucket"] == get_style_bucket(VISUAL_TEXT_SCORE)
+    assert metadata["prompt_version"] == generator.prompt_version
+    assert metadata["cache_key"] == main.generation_cache.key_for(
+        generator, SLIDE["topic"], SLIDE["learning_objectives"], VISUAL_TEXT_SCORE, context=SLIDE["context"]
+    )
+    assert result["visual_text_score"] == VISUAL_TEXT_SCORE
+    assert len(main.db.slide_generations.documents) == 1
+
+    # Annotations are per response; the cached entry stays as generated
+    cached = main.generation_cache.get(metadata["cache_key"])
+    assert cached["content"] == result["content"]
+    assert "cache_key" not in cached["metadata"]
+
+
+def test_hit_is_sent_as_one_chunk(generator):
+    asyncio.run(post_streams(1))
+    (events,) = asyncio.run(post_streams(1))
+
+    assert [kind for kind, _ in events] == ["chunk", "done"]
+    assert events[0][1]["html"] == events[1][1]["content"]
+    assert events[1][1]["metadata"]["cache_hit"] is True
+    assert generator.backend.calls == 1
+
+
+def test_concurrent_streams_share_one_model_call(generator):
+    streams = asyncio.run(post_streams(3))
+
+    assert generator.backend.calls == 1
+    results = [events[-1][1] for events in streams]
+    assert len({result["content"] for result in results}) == 1
+    assert sorted(result["metadata"]["coalesced"] for result in results) == [False, True, True]
+    assert all(result["metadata"]["cache_hit"] is False for result in results)
+    assert main.generation_cache.single_flight.stats()["in_flight"] == 0
+
+
+def test_over_budget_miss_is_rejected_before_streaming(generator, monkeypatch):
+    @contextmanager
+    def reject(user_id, interactive=True):
+        raise AdmissionRejected("Too many generations in flight", retry_after=2)
+        yield
+
+    monkeypatch.setattr(main.admission, "admit", reject)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def post():
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(STREAM_URL, json=SLIDE)
+
+    response = asyncio.run(post())
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert generator.backend.calls == 0
+    assert main.generation_cache.single_flight.stats()["in_flight"] == 0
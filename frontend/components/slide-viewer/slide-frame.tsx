@@ -169,14 +169,19 @@ export function SlideFrame({
                 courseId,
                 userId,
                 'session_' + Date.now()
-            ).then(result => {
+            ).then(async result => {
                 console.log(`✓ Chapter complete!`);
                 console.log(`  - Profile generated: ${result.profile_generated}`);
                 console.log(`  - Next chapter: ${result.next_chapter_id}`);
-                console.log(`  - Pre-generated ${result.slides_generated}/${result.slides_total} slides`);
+                if (!result.job_id) return;
 
-                if (result.slides_generated > 0) {
-                    console.log(`🎉 Next chapter personalized with ${result.slides_generated} slides!`);
+                // Slides are pre-generated by a background job; follow it until it finishes
+                console.log(`  - Pre-generating ${result.slides_total} slides (job ${result.job_id})`);
+                const job = await slidesAPI.waitForJob(result.job_id);
+                console.log(`  - Pre-generated ${job.progress.completed}/${job.progress.total} slides (${job.status})`);
+
+                if (job.progress.completed > 0) {
+                    console.log(`🎉 Next chapter personalized with ${job.progress.completed} slides!`);
                 }
             }).catch(error => {
                 console.error('Background chapter completion failed:', error);
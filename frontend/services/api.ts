@@ -159,6 +159,22 @@ export const sessionAPI = {
     }
 };
 
+interface GenerationJob {
+    job_id: string;
+    job_type: string;
+    status: string; // queued, running, completed, completed_with_errors, failed
+    error: string | null;
+    progress: {
+        total: number;
+        completed: number;
+        failed: number;
+        running: number;
+        pending: number;
+    };
+}
+
+const FINISHED_JOB_STATUSES = ['completed', 'completed_with_errors', 'failed'];
+
 export const slidesAPI = {
     /**
      * Fetch the complete course structure (chapters and slide topics) from backend
@@ -260,7 +276,8 @@ export const slidesAPI = {
                 next_chapter_id: string | null;
                 is_baseline: boolean;
                 profile_generated: boolean;
-                slides_generated: number;
+                job_id: string | null; // Background pre-generation job, see getJob
+                job_status: string | null;
                 slides_total: number;
                 timestamp: string;
             }>(response);
@@ -270,6 +287,27 @@ export const slidesAPI = {
         }
     },
 
+    /**
+     * Status and per-slide progress of a background generation job
+     */
+    getJob: async (jobId: string): Promise<GenerationJob> => {
+        const response = await fetchWithTimeout(`${BASE_URL}/api/jobs/${jobId}`, { timeout: 5000 });
+        return await handleResponse<GenerationJob>(response);
+    },
+
+    /**
+     * Poll a background generation job until it finishes (or maxWaitMs passes)
+     */
+    waitForJob: async (jobId: string, intervalMs = 3000, maxWaitMs = 600000): Promise<GenerationJob> => {
+        const deadline = Date.now() + maxWaitMs;
+        let job: GenerationJob = await slidesAPI.getJob(jobId);
+        while (!FINISHED_JOB_STATUSES.includes(job.status) && Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+            job = await slidesAPI.getJob(jobId);
+        }
+        return job;
+    },
+
     /**
      * Fetch pre-generated slides for a user and chapter
      */